@@ -0,0 +1,611 @@
+"""
+CARVE Benchmarks
+This module generates synthetic annotated C and Python source trees of a configurable size, and measures how quickly
+each debloating engine processes them.  It also provides an end-to-end benchmark that debloats a copy of the sources
+named in a debloating configuration (by default the shipped sample/debloat-config.yaml on sample/libmodbus).
+
+Run it with `carve bench`.
+"""
+
+# Standard Library Imports
+import abc
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+# Third Party Imports
+import yaml
+
+# Local Imports
+from carve.utility import compile_hierarchy, load_config, resolve_features
+from carve.languages import LANGUAGE_DEBLOATERS
+from carve.runner import collect_files, run_files
+from carve.walk import library_filters
+from carve.resource_debloater.ResourceDebloater import ResourceDebloater
+
+DEFAULT_BENCH_CONFIG = "sample/debloat-config.yaml"
+
+
+class CorpusStats(NamedTuple):
+    """
+    Size of a generated source tree.
+    """
+    files: int
+    lines: int
+    annotations: int
+
+
+class BenchResult(NamedTuple):
+    """
+    Timings for one benchmark run.  Stage timings are summed over all files; None when the stage was not timed
+    separately.
+    """
+    name: str
+    files: int
+    lines: int
+    annotations: int
+    read: Optional[float]
+    debloat: Optional[float]
+    write: Optional[float]
+    total: float
+
+    @property
+    def lines_per_second(self) -> float:
+        """
+        Throughput of the run in source lines.
+        :return: Lines debloated per second of total time, 0 if no time was measured.
+        """
+        return self.lines / self.total if self.total > 0 else 0.0
+
+    @property
+    def annotations_per_second(self) -> float:
+        """
+        Throughput of the run in annotations.
+        :return: Annotations processed per second of total time, 0 if no time was measured.
+        """
+        return self.annotations / self.total if self.total > 0 else 0.0
+
+
+class CorpusGenerator(abc.ABC):
+    """
+    Abstract base class of the synthetic corpus generators.  A generator produces source files made of the constructs its
+    debloater supports, preceding a fraction (the density) of them with an annotation naming one or two features from a
+    pool of Feature_0 .. Feature_N-1.  Output only depends on the seed, so benchmark runs are comparable.
+    """
+    EXTENSION = None
+    ANNOTATION_SEQUENCE = None
+    INDENT = "    "
+
+    def __init__(self, seed: int = 0, density: float = 0.2, depth: int = 2, features: int = 8):
+        """
+        CorpusGenerator constructor
+        :param int seed: Seed of the random number generator.
+        :param float density: Fraction of constructs (between 0 and 1) preceded by an annotation.
+        :param int depth: Maximum nesting depth of blocks.
+        :param int features: Number of features in the feature pool.
+        """
+        self.random = random.Random(seed)
+        self.density = density
+        self.depth = depth
+        self.features = [f"Feature_{index}" for index in range(features)]
+        self.annotations = 0
+
+    def target_features(self) -> Set[str]:
+        """
+        Features debloated when benchmarking the generated corpus: the first half of the pool, so annotations both
+        are and are not debloated.
+        :return: Set of feature names.
+        """
+        return set(self.features[:max(1, len(self.features) // 2)])
+
+    def annotated(self) -> bool:
+        """
+        Decides whether the next construct is annotated.
+        :return: True if the construct should be preceded by an annotation.
+        """
+        return self.random.random() < self.density
+
+    def annotation(self, indent: str, ending: str = "") -> str:
+        """
+        Generates an annotation line.
+        :param str indent: Indentation of the line.
+        :param str ending: Annotation type suffix ("~" or "!" for explicit annotations).
+        :return: The annotation line.
+        """
+        self.annotations += 1
+        features = self.random.sample(self.features, self.random.randint(1, min(2, len(self.features))))
+        return indent + self.ANNOTATION_SEQUENCE + "".join(f"[{feature}]" for feature in features) + ending + "\n"
+
+    def generate_file(self, lines: int) -> str:
+        """
+        Generates a source file.
+        :param int lines: Approximate number of lines in the file; top level constructs are added until it is reached.
+        :return: Contents of the file.
+        """
+        output = self.header()
+        while len(output) < lines:
+            output.extend(self.top_level())
+        return "".join(output)
+
+    def generate_tree(self, directory: str, files: int, lines: int) -> CorpusStats:
+        """
+        Writes a generated source tree to disk, spreading the files over a few subdirectories.
+        :param str directory: Root of the tree.
+        :param int files: Number of files to generate.
+        :param int lines: Approximate number of lines per file.
+        :return: Size of the generated tree.
+        """
+        self.annotations = 0
+        total_lines = 0
+        for index in range(files):
+            subdirectory = Path(directory) / f"module_{index % 4}"
+            subdirectory.mkdir(parents=True, exist_ok=True)
+            contents = self.generate_file(lines)
+            total_lines += contents.count("\n")
+            (subdirectory / f"file_{index}.{self.EXTENSION}").write_text(contents)
+        return CorpusStats(files, total_lines, self.annotations)
+
+    @abc.abstractmethod
+    def header(self) -> List[str]:
+        """
+        Generates the lines every file starts with, before its first top level construct.
+        :return: List of lines.
+        """
+
+    @abc.abstractmethod
+    def top_level(self) -> List[str]:
+        """
+        Generates a top level construct, possibly annotated.
+        :return: List of lines.
+        """
+
+
+class CCorpusGenerator(CorpusGenerator):
+    """
+    Generates C files containing the constructs CResourceDebloater supports: function definitions, structs, if / else
+    if / else chains, switch statements with case and default labels, statements and explicit segments (with and
+    without replacement code).
+    """
+    EXTENSION = "c"
+    ANNOTATION_SEQUENCE = ResourceDebloater.C_ANNOTATION_SEQUENCE
+
+    def header(self) -> List[str]:
+        """
+        Generates the include directives every C file starts with.
+        :return: List of lines.
+        """
+        return ["#include <stdio.h>\n", "#include <stdlib.h>\n", "\n"]
+
+    def top_level(self) -> List[str]:
+        """
+        Generates a struct definition or a function definition, possibly annotated.
+        :return: List of lines.
+        """
+        if self.random.random() < 0.2:
+            return self.struct()
+        return self.function()
+
+    def struct(self) -> List[str]:
+        """
+        Generates a struct definition, possibly annotated.
+        :return: List of lines.
+        """
+        output = [self.annotation("")] if self.annotated() else []
+        name = f"record_{self.random.randint(0, 9999)}"
+        output += [f"struct {name} {{\n", f"{self.INDENT}int id;\n", f"{self.INDENT}char *name;\n", "};\n", "\n"]
+        return output
+
+    def function(self) -> List[str]:
+        """
+        Generates a function definition with a nested block of constructs, possibly annotated.
+        :return: List of lines.
+        """
+        output = [self.annotation("")] if self.annotated() else []
+        name = f"handle_{self.random.randint(0, 9999)}"
+        output += [f"static int {name}(int value, char *buffer)\n", "{\n"]
+        output += self.block(self.INDENT, self.depth)
+        output += [f"{self.INDENT}return value;\n", "}\n", "\n"]
+        return output
+
+    def statement(self, indent: str) -> List[str]:
+        """
+        Generates a single statement, possibly annotated.
+        :param str indent: Indentation of the statement.
+        :return: List of lines.
+        """
+        output = [self.annotation(indent)] if self.annotated() else []
+        statement = self.random.choice(["value = value + 1;", "buffer[value] = 0;",
+                                        "fprintf(stderr, \"value: %d\\n\", value);", "value = process(buffer, value);"])
+        return output + [indent + statement + "\n"]
+
+    def block(self, indent: str, depth: int) -> List[str]:
+        """
+        Generates the body of a block: a plain statement followed by a few constructs, nesting further blocks while
+        depth allows.
+        :param str indent: Indentation of the block's lines.
+        :param int depth: Remaining nesting depth.
+        :return: List of lines.
+        """
+        output = [f"{indent}value++;\n"]
+        for _ in range(self.random.randint(1, 4)):
+            choice = self.random.random()
+            if depth > 0 and choice < 0.25:
+                output += self.if_chain(indent, depth)
+            elif depth > 0 and choice < 0.4:
+                output += self.switch(indent, depth)
+            elif choice < 0.5:
+                output += self.segment(indent)
+            else:
+                output += self.statement(indent)
+        return output
+
+    def if_chain(self, indent: str, depth: int) -> List[str]:
+        """
+        Generates an if statement followed by else if and else branches, each possibly annotated.
+        :param str indent: Indentation of the statement.
+        :param int depth: Remaining nesting depth.
+        :return: List of lines.
+        """
+        output = [self.annotation(indent)] if self.annotated() else []
+        output += [f"{indent}if (value == {self.random.randint(0, 9)}) {{\n"]
+        output += self.block(indent + self.INDENT, depth - 1)
+        output += [f"{indent}}}\n"]
+        for branch in range(self.random.randint(0, 2)):
+            if self.annotated():
+                output.append(self.annotation(indent))
+            output += [f"{indent}else if (value == {10 + branch}) {{\n"]
+            output += self.block(indent + self.INDENT, depth - 1)
+            output += [f"{indent}}}\n"]
+        if self.random.random() < 0.5:
+            output += [f"{indent}else {{\n"] + self.block(indent + self.INDENT, depth - 1) + [f"{indent}}}\n"]
+        return output
+
+    def switch(self, indent: str, depth: int) -> List[str]:
+        """
+        Generates a switch statement whose case labels are possibly annotated, with an optional default label.
+        :param str indent: Indentation of the statement.
+        :param int depth: Remaining nesting depth.
+        :return: List of lines.
+        """
+        output = [f"{indent}switch (value) {{\n"]
+        case_indent = indent + self.INDENT
+        for case in range(self.random.randint(1, 4)):
+            if self.annotated():
+                output.append(self.annotation(case_indent))
+            output += [f"{case_indent}case {case}:\n"]
+            output += self.block(case_indent + self.INDENT, depth - 1)
+            output += [f"{case_indent}{self.INDENT}break;\n"]
+        if self.random.random() < 0.5:
+            output += [f"{case_indent}default:\n", f"{case_indent}{self.INDENT}value = 0;\n"]
+        output += [f"{indent}}}\n"]
+        return output
+
+    def segment(self, indent: str) -> List[str]:
+        """
+        Generates an explicit segment annotation around a few statements, with optional replacement code.
+        :param str indent: Indentation of the segment.
+        :return: List of lines.
+        """
+        output = [self.annotation(indent, "~")]
+        if self.random.random() < 0.3:
+            output += [f"{indent}///^\n", f"{indent}///value = -1;\n", f"{indent}///^\n"]
+        # Segments end at the first end marker, so they hold statements rather than blocks that may contain segments.
+        for _ in range(self.random.randint(1, 3)):
+            output += self.statement(indent)
+        output += [f"{indent}///~\n"]
+        return output
+
+
+class PythonCorpusGenerator(CorpusGenerator):
+    """
+    Generates Python files containing the constructs PythonImplicitDebloater supports: function definitions, class
+    definitions, if statements (with and without else branches), statements and explicit segments (with and without
+    replacement code).
+    """
+    EXTENSION = "py"
+    ANNOTATION_SEQUENCE = ResourceDebloater.PYTHON_ANNOTATION_SEQUENCE
+
+    def header(self) -> List[str]:
+        """
+        Generates the imports every Python file starts with.  Implicit annotations in the module header are ignored,
+        so files start with code.
+        :return: List of lines.
+        """
+        return ["import os\n", "import sys\n", "\n"]
+
+    def top_level(self) -> List[str]:
+        """
+        Generates a class definition or a function definition, possibly annotated.
+        :return: List of lines.
+        """
+        if self.random.random() < 0.2:
+            return self.class_def()
+        return self.function("")
+
+    def class_def(self) -> List[str]:
+        """
+        Generates a class definition with a few methods, possibly annotated.
+        :return: List of lines.
+        """
+        output = [self.annotation("")] if self.annotated() else []
+        output += [f"class Record{self.random.randint(0, 9999)}(object):\n", f"{self.INDENT}size = 0\n"]
+        for _ in range(self.random.randint(1, 3)):
+            output += ["\n"] + self.function(self.INDENT)
+        return output + ["\n"]
+
+    def function(self, indent: str) -> List[str]:
+        """
+        Generates a function definition with a nested block of constructs, possibly annotated.
+        :param str indent: Indentation of the definition.
+        :return: List of lines.
+        """
+        output = [self.annotation(indent)] if self.annotated() else []
+        output += [f"{indent}def handle_{self.random.randint(0, 9999)}(value, buffer):\n"]
+        output += self.block(indent + self.INDENT, self.depth)
+        output += [f"{indent}{self.INDENT}return value\n", "\n"]
+        return output
+
+    def statement(self, indent: str) -> List[str]:
+        """
+        Generates a single statement, possibly annotated.
+        :param str indent: Indentation of the statement.
+        :return: List of lines.
+        """
+        output = [self.annotation(indent)] if self.annotated() else []
+        statement = self.random.choice(["value = value + 1", "buffer[value] = 0",
+                                        "print(f\"value: {value}\", file=sys.stderr)", "value = len(buffer)"])
+        return output + [indent + statement + "\n"]
+
+    def block(self, indent: str, depth: int) -> List[str]:
+        """
+        Generates the body of a block: a plain statement, so the block is never left empty by debloating, followed by
+        a few constructs, nesting further blocks while depth allows.
+        :param str indent: Indentation of the block's lines.
+        :param int depth: Remaining nesting depth.
+        :return: List of lines.
+        """
+        output = [f"{indent}value += 1\n"]
+        for _ in range(self.random.randint(1, 4)):
+            choice = self.random.random()
+            if depth > 0 and choice < 0.3:
+                output += self.if_statement(indent, depth)
+            elif choice < 0.4:
+                output += self.segment(indent)
+            else:
+                output += self.statement(indent)
+        return output
+
+    def if_statement(self, indent: str, depth: int) -> List[str]:
+        """
+        Generates an if statement with an optional else branch, each possibly annotated.
+        :param str indent: Indentation of the statement.
+        :param int depth: Remaining nesting depth.
+        :return: List of lines.
+        """
+        output = [self.annotation(indent)] if self.annotated() else []
+        output += [f"{indent}if value == {self.random.randint(0, 9)}:\n"]
+        output += self.block(indent + self.INDENT, depth - 1)
+        if self.random.random() < 0.5:
+            if self.annotated():
+                output.append(self.annotation(indent))
+            output += [f"{indent}else:\n"] + self.block(indent + self.INDENT, depth - 1)
+        return output
+
+    def segment(self, indent: str) -> List[str]:
+        """
+        Generates an explicit segment annotation around a few statements, with optional replacement code.
+        :param str indent: Indentation of the segment.
+        :return: List of lines.
+        """
+        output = [self.annotation(indent, "~")]
+        if self.random.random() < 0.3:
+            output += [f"{indent}###^\n", f"{indent}###value = -1\n", f"{indent}###^\n"]
+        # Segments end at the first end marker, so they hold statements rather than blocks that may contain segments.
+        for _ in range(self.random.randint(1, 3)):
+            output += self.statement(indent)
+        output += [f"{indent}###~\n"]
+        return output
+
+
+# Corpus generator for each benchmarked engine, keyed by the language name used in configuration files.
+GENERATORS = {"C": CCorpusGenerator, "Python": PythonCorpusGenerator}
+
+
+def bench_engine(language: str, directory: str, stats: CorpusStats, target_features: Set[str]) -> BenchResult:
+    """
+    Debloats every file of a generated tree in the calling process, timing the read, debloat and write stages.
+    :param str language: Language of the tree, a key of LANGUAGE_DEBLOATERS.
+    :param str directory: Root of the tree; its files are debloated in place.
+    :param CorpusStats stats: Size of the tree.
+    :param set target_features: Features to debloat.
+    :return: Timings of the run.
+    """
+    language_type = LANGUAGE_DEBLOATERS[language]
+    extension = GENERATORS[language].EXTENSION
+    files = collect_files([directory], [extension])
+
+    read = debloat = write = 0.0
+    for location in files:
+        debloater = language_type(str(location), target_features)
+        start = time.perf_counter()
+        debloater.read_from_disk()
+        read_end = time.perf_counter()
+        debloater.debloat()
+        debloat_end = time.perf_counter()
+        debloater.write_to_disk()
+        write_end = time.perf_counter()
+
+        read += read_end - start
+        debloat += debloat_end - read_end
+        write += write_end - debloat_end
+
+    return BenchResult(language, stats.files, stats.lines, stats.annotations, read, debloat, write,
+                       read + debloat + write)
+
+
+def count_annotations(files: List[Path], annotation_sequence: str) -> CorpusStats:
+    """
+    Counts the lines and annotations in a set of files.
+    :param list files: Files to count.
+    :param str annotation_sequence: Annotation sequence of the files' language.
+    :return: Size of the files.
+    """
+    lines = annotations = 0
+    marker = annotation_sequence + "["
+    for location in files:
+        with open(location, "r", errors="replace") as source:
+            for line in source:
+                lines += 1
+                if line.lstrip().startswith(marker):
+                    annotations += 1
+    return CorpusStats(len(files), lines, annotations)
+
+
+def select_libraries(config: Dict, library_name: Optional[str] = None) -> Tuple[List[Dict], List[str]]:
+    """
+    Selects the libraries of a debloating configuration benchmarked end to end.  Libraries debloated into variants
+    (which have no debloat entry) are skipped, as the benchmark debloats each library for a single set of features.
+    :param dict config: The debloating configuration.
+    :param str library_name: Name of the only library to benchmark, or None to benchmark every library.
+    :return: Tuple of the libraries to benchmark and the names of the libraries skipped.
+    :raises: ValueError if library_name is not a library of the configuration.
+    """
+    libraries = [library for library in config.get("Libraries")
+                 if library_name in (None, library.get("name"))]
+    if library_name is not None and not libraries:
+        raise ValueError(f"library {library_name} is not in the debloating configuration")
+    selected = [library for library in libraries if library.get("debloat") is not None]
+    skipped = [library.get("name") for library in libraries if library.get("debloat") is None]
+    return selected, skipped
+
+
+def bench_config(config_path: str, jobs: int = 1, library_name: Optional[str] = None) -> List[BenchResult]:
+    """
+    End-to-end benchmark: debloats a copy of every library in a debloating configuration, the same way the CLI does.
+    Library locations are resolved relative to the current directory, as in a debloating run.  Libraries debloated
+    into variants are skipped (see select_libraries).
+    :param str config_path: Path of the debloating configuration.
+    :param int jobs: Number of worker processes.
+    :param str library_name: Name of the only library to benchmark, or None to benchmark every library.
+    :return: Timings of each library.
+    """
+    config = load_config(config_path)
+    libraries, skipped = select_libraries(config, library_name)
+    for name in skipped:
+        logging.warning("Library %s is debloated into variants, which the end-to-end benchmark does not support; "
+                        "skipping it.", name)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="carve-bench-") as workspace:
+        for library in libraries:
+            language_type = LANGUAGE_DEBLOATERS[library.get("language")]
+            target_features = resolve_features(library.get("debloat"),
+                                               compile_hierarchy(library.get("debloatable_features")))
+
+            locations = []
+            for index, location in enumerate(library.get("locations")):
+                copy = os.path.join(workspace, library.get("name"), str(index))
+                shutil.copytree(location, copy)
+                locations.append(copy)
+
+            files = collect_files(locations, library.get("extensions"), library_filters(library))
+            stats = count_annotations(files, language_type.ANNOTATION_SEQUENCE)
+
+            start = time.perf_counter()
+            run_files(language_type, files, target_features, jobs)
+            total = time.perf_counter() - start
+
+            results.append(BenchResult(library.get("name"), stats.files, stats.lines, stats.annotations, None, None,
+                                       None, total))
+    return results
+
+
+def format_result(result: BenchResult) -> str:
+    """
+    Formats a benchmark result as a row of the report.
+    :param BenchResult result: Result to format.
+    :return: Report row.
+    """
+    def stage(seconds: Optional[float]) -> str:
+        """
+        Formats the time of a stage.
+        :param float seconds: Time of the stage, or None if it was not timed separately.
+        :return: The time, or "-".
+        """
+        return "-" if seconds is None else f"{seconds:.3f}"
+
+    return (f"{result.name:<12} {result.files:>6} {result.lines:>9} {result.annotations:>8} {stage(result.read):>8} "
+            f"{stage(result.debloat):>8} {stage(result.write):>8} {result.total:>8.3f} "
+            f"{result.lines_per_second:>12,.0f} {result.annotations_per_second:>10,.0f}")
+
+
+REPORT_HEADER = (f"{'Benchmark':<12} {'Files':>6} {'Lines':>9} {'Annots':>8} {'Read s':>8} {'Debloat s':>8} "
+                 f"{'Write s':>8} {'Total s':>8} {'Lines/s':>12} {'Annots/s':>10}")
+
+
+def bench_main(argv) -> None:
+    """
+    `carve bench` subcommand: measure debloating throughput on synthetic corpora and on a debloating configuration.
+    """
+    log_opts = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR,
+                "CRITICAL": logging.CRITICAL}
+
+    parser = argparse.ArgumentParser(prog="carve bench", description="Measure debloating throughput.")
+    parser.add_argument("--engine", help="Engines to benchmark on synthetic corpora.", type=str, nargs="*",
+                        choices=GENERATORS.keys(), default=list(GENERATORS.keys()))
+    parser.add_argument("--files", help="Number of files in each synthetic corpus.", type=int, default=50)
+    parser.add_argument("--lines", help="Approximate number of lines per synthetic file.", type=int, default=400)
+    parser.add_argument("--density", help="Fraction of constructs preceded by an annotation.", type=float,
+                        default=0.2)
+    parser.add_argument("--depth", help="Maximum nesting depth of generated blocks.", type=int, default=2)
+    parser.add_argument("--seed", help="Seed of the corpus generators.", type=int, default=0)
+    parser.add_argument("--repeat", help="Number of runs of each benchmark; the fastest is reported.", type=int,
+                        default=3)
+    parser.add_argument("--config", help="Debloating configuration used for the end-to-end benchmark.", type=str,
+                        default=DEFAULT_BENCH_CONFIG)
+    parser.add_argument("--no_config", help="Skip the end-to-end benchmark.", action="store_true")
+    parser.add_argument("--library", help="Name of the only library of the configuration benchmarked end to end (all "
+                        "libraries by default; libraries debloated into variants are always skipped).", type=str,
+                        default=None)
+    parser.add_argument("-j", "--jobs", help="Number of worker processes used by the end-to-end benchmark.", type=int,
+                        default=1)
+    parser.add_argument("-ll", "--log_level", help="Verbosity of logging.", type=str, default="ERROR",
+                        choices=log_opts.keys())
+
+    args = parser.parse_args(argv)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    repeat = max(1, args.repeat)
+    logging.basicConfig(level=log_opts.get(args.log_level))
+
+    print(REPORT_HEADER)
+    for language in args.engine:
+        with tempfile.TemporaryDirectory(prefix="carve-bench-") as workspace:
+            generator = GENERATORS[language](seed=args.seed, density=args.density, depth=args.depth)
+            corpus = os.path.join(workspace, "corpus")
+            stats = generator.generate_tree(corpus, args.files, args.lines)
+
+            runs = []
+            for run in range(repeat):
+                tree = os.path.join(workspace, f"run_{run}")
+                shutil.copytree(corpus, tree)
+                runs.append(bench_engine(language, tree, stats, generator.target_features()))
+            print(format_result(min(runs, key=lambda result: result.total)))
+
+    if not args.no_config:
+        if not os.path.isfile(args.config):
+            sys.exit(f"Debloating configuration {args.config} not found; run from the repository root, pass --config or "
+                     "--no_config.")
+        try:
+            for name in select_libraries(load_config(args.config), args.library)[1]:
+                print(f"{name:<12} skipped: debloated into variants, which the end-to-end benchmark does not support")
+            runs = [bench_config(args.config, jobs, args.library) for _ in range(repeat)]
+        except (yaml.YAMLError, ValueError, KeyError, OSError) as err:
+            sys.exit(f"End-to-end benchmark of {args.config} failed: {err!r}")
+        for library_runs in zip(*runs):
+            print(format_result(min(library_runs, key=lambda result: result.total)))
@@ -0,0 +1,168 @@
+"""
+CARVE Result Cache
+A persistent, content-addressed cache of debloating results.  Entries are keyed by the contents of the input file, the
+debloater used and the resolved set of features to debloat, so repeated runs over the same sources can reuse earlier
+results without parsing or debloating the file again.  The cache is bounded in size and evicts the least recently used
+entries first.
+"""
+
+# Standard Library Imports
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+# Third Party Imports
+
+# Local Imports
+from carve import __version__
+from carve.utility import write_file_atomic
+
+
+DEFAULT_CACHE_DIR = "results/cache"
+DEFAULT_CACHE_SIZE = 512 * (1 << 20)
+
+# Entry headers distinguishing debloated output from inputs that debloating left unchanged
+UNCHANGED_ENTRY = b"="
+OUTPUT_ENTRY = b"+"
+
+
+class CacheStats(NamedTuple):
+    """
+    Summary of the contents of a result cache.
+    """
+    entries: int
+    size: int
+    max_size: int
+
+
+class ResultCache(object):
+    """
+    On-disk cache of debloated file contents.  Each entry is stored in its own file, named after its key and grouped
+    into subdirectories by the first two characters of the key.  Entry modification times record their last use and
+    drive least recently used eviction.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_size: int = DEFAULT_CACHE_SIZE):
+        """
+        ResultCache constructor
+        :param str directory: Directory holding the cache entries.  Created on first write.
+        :param int max_size: Size in bytes the cache is pruned to.
+        """
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    @staticmethod
+    def make_key(contents: bytes, language: str, target_features: Iterable[str]) -> str:
+        """
+        Computes the cache key for debloating a file.
+        :param bytes contents: Raw contents of the input file.
+        :param str language: Name of the debloater used for the file.
+        :param target_features: Resolved set of features to debloat.
+        :return: Hex digest identifying the debloating result.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"carve {__version__}\0{language}\0".encode())
+        digest.update("\0".join(sorted(target_features)).encode())
+        digest.update(b"\0\0")
+        digest.update(contents)
+        return digest.hexdigest()
+
+    def entry_path(self, key: str) -> Path:
+        """
+        Returns the path of the file holding the entry for the key.
+        :param str key: Cache key.
+        :return: Path of the entry.
+        """
+        return self.directory / key[:2] / key
+
+    def get(self, key: str) -> Tuple[bool, Optional[bytes]]:
+        """
+        Looks up an entry, marking it as recently used.
+        :param str key: Cache key.
+        :return: Tuple of whether the key was found, and the debloated output (None if the input was left unchanged).
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as file:
+                entry = file.read()
+            os.utime(path)
+        except OSError:
+            return False, None
+
+        if entry[:1] == UNCHANGED_ENTRY:
+            return True, None
+        if entry[:1] == OUTPUT_ENTRY:
+            return True, entry[1:]
+
+        logging.warning("Ignoring corrupt result cache entry %s", path)
+        return False, None
+
+    def put(self, key: str, output: Optional[bytes]) -> None:
+        """
+        Stores an entry.
+        :param str key: Cache key.
+        :param bytes output: Debloated output, or None if debloating left the input unchanged.
+        :return: None
+        """
+        path = self.entry_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_file_atomic(path, UNCHANGED_ENTRY if output is None else OUTPUT_ENTRY + output)
+        except OSError as err:
+            logging.warning("Could not store result cache entry %s: %s", path, err)
+
+    def entries(self) -> List[Tuple[float, int, Path]]:
+        """
+        Lists the entries in the cache.
+        :return: List of (last use time, size, path) tuples, least recently used first.
+        """
+        found = []
+        if not self.directory.is_dir():
+            return found
+
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+
+        found.sort()
+        return found
+
+    def stats(self) -> CacheStats:
+        """
+        Summarizes the contents of the cache.
+        :return: CacheStats for the cache.
+        """
+        entries = self.entries()
+        return CacheStats(len(entries), sum(size for _, size, _ in entries), self.max_size)
+
+    def prune(self, max_size: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Evicts least recently used entries until the cache is no larger than max_size.
+        :param int max_size: Size in bytes to prune the cache to.  Defaults to the cache's configured maximum size.
+        :return: Tuple of the number of entries removed and the number of bytes freed.
+        """
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = self.entries()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        removed = 0
+        freed = 0
+        for _, entry_size, path in entries:
+            if size <= max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            size -= entry_size
+            freed += entry_size
+            removed += 1
+
+        return removed, freed
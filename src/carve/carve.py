@@ -11,9 +11,11 @@ debloat any kind of source code.
 
 # Standard Library Imports
 import argparse
+import atexit
 import logging
 import shutil
 import sys
+import time
 from pathlib import Path
 
 # Third Party Imports
@@ -21,10 +23,53 @@ import yaml
 
 # Local Imports
 from carve.utility import *
-from carve.resource_debloater.CResourceDebloater import CResourceDebloater
-from carve.resource_debloater.PythonResourceDebloater import PythonResourceDebloater
+from carve.bench import bench_main
+from carve.cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE, ResultCache
+from carve.index import DEFAULT_INDEX_PATH, AnnotationIndex, index_main, library_signature
+from carve.log import SUMMARY_LOGGER, setup_logging
+from carve.profiling import DEFAULT_PROFILE_TOP, RunProfiler, profile_stage
+from carve.report import REPORT_FORMATS, RunReport
+from carve.trace import start_tracing, stop_tracing, trace_span, write_trace
+from carve.output import LINK_MODES, OutputTree
+from carve.server import client_main, serve_main
+from carve.variants import load_variants, run_variants
+from carve.walk import library_filters
+from carve.languages import LANGUAGE_DEBLOATERS
+from carve.runner import collect_files, run_files
+
+
+def cache_main(argv) -> None:
+    """
+    `carve cache` subcommand: report on or prune the debloating result cache.
+    """
+    parser = argparse.ArgumentParser(prog="carve cache", description="Inspect or prune the debloating result cache.")
+    parser.add_argument("action", help="Report cache statistics, or evict least recently used entries.", type=str,
+                        choices=["stats", "prune"])
+    parser.add_argument("--cache_dir", help="Directory holding the result cache.", type=str, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache_size", help="Maximum size of the result cache in MiB.", type=int,
+                        default=DEFAULT_CACHE_SIZE >> 20)
+
+    args = parser.parse_args(argv)
+    cache = ResultCache(args.cache_dir, args.cache_size << 20)
+
+    if args.action == "prune":
+        removed, freed = cache.prune()
+        print(f"Removed {removed} entries ({freed} bytes) from {args.cache_dir}")
+
+    stats = cache.stats()
+    print(f"{args.cache_dir}: {stats.entries} entries, {stats.size} bytes (limit {stats.max_size} bytes)")
+
+
+# Subcommands are selected by the first command line argument; anything else is treated as a debloat run.
+SUBCOMMANDS = {"bench": bench_main, "cache": cache_main, "client": client_main, "index": index_main,
+               "serve": serve_main}
+
 
 def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     # Parse command line options
     log_opts = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR,
                 "CRITICAL": logging.CRITICAL}
@@ -33,8 +78,47 @@ def main() -> None:
     parser.add_argument("debloat_config", help="File containing debloating configuration.", type=str)
     parser.add_argument("-ll", "--log_level", help="Verbosity of logging.", type=str, default='INFO',
                         choices=log_opts.keys())
+    parser.add_argument("--log_compact", help="Log one summary line per file instead of every step (warnings and "
+                        "errors are still logged as they happen).", action="store_true")
+    parser.add_argument("-j", "--jobs", help="Number of worker processes used to debloat files (0 uses all CPUs).  "
+                        "On a failure, files not started yet are cancelled, but files debloated before it (or "
+                        "alongside it) may already be written to disk.", type=int, default=1)
+    parser.add_argument("--cache", help="Reuse debloating results for unchanged files from earlier runs.",
+                        action="store_true")
+    parser.add_argument("--cache_dir", help="Directory holding the result cache (implies --cache).", type=str,
+                        default=None)
+    parser.add_argument("--cache_size", help="Maximum size of the result cache in MiB.", type=int,
+                        default=DEFAULT_CACHE_SIZE >> 20)
+    parser.add_argument("--index", help="Only debloat the files the annotation index (see `carve index`) lists as "
+                        "holding annotations to debloat, instead of walking every location.", action="store_true")
+    parser.add_argument("--index_path", help="Filepath of the annotation index (implies --index).", type=str,
+                        default=None)
+    parser.add_argument("--output_dir", help="Write the debloated libraries to this directory, leaving their source "
+                        "code untouched, instead of debloating in place.", type=str, default=None)
+    parser.add_argument("--link_mode", help="How files left unchanged are created in output directories (--output_dir "
+                        "and variants).", type=str, default="hardlink", choices=LINK_MODES)
+    parser.add_argument("--profile", help="Profile each stage of the run, writing .pstats files and a summary to the "
+                        "results directory.", action="store_true")
+    parser.add_argument("--profile_top", help="Number of functions listed for each profile in the summary.", type=int,
+                        default=DEFAULT_PROFILE_TOP)
+    parser.add_argument("--profile_slowest", help="Also keep individual profiles of the N slowest files (implies "
+                        "--profile).", type=int, default=0)
+    parser.add_argument("--report", help="Format of the per-file run report written to the results directory.",
+                        type=str, default="both", choices=REPORT_FORMATS)
+    parser.add_argument("--trace", help="Write a timeline of the run (Chrome trace-event JSON, for Perfetto or "
+                        "chrome://tracing) to the results directory.", action="store_true")
 
     args = parser.parse_args()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    cache = None
+    if args.cache or args.cache_dir is not None:
+        cache = ResultCache(args.cache_dir or DEFAULT_CACHE_DIR, args.cache_size << 20)
+
+    index = None
+    if args.index or args.index_path is not None:
+        index = AnnotationIndex(args.index_path or DEFAULT_INDEX_PATH)
+        atexit.register(index.close)
 
     # Create a timestamped results folder and pre-populate it with a copy of the campaign file
     try:
@@ -45,69 +129,163 @@ def main() -> None:
 
     # Initialize the logger
     log_level = log_opts.get(args.log_level)
-    logging.basicConfig(filename=directory_name + "/debloating_log.txt", level=log_level)
+    listener = setup_logging(directory_name + "/debloating_log.txt", log_level, args.log_compact)
+    # Flush the log when the run ends, including when it is aborted
+    atexit.register(listener.stop)
 
     # Copy the debloating configuration used to the results directory for posterity
     shutil.copy2(args.debloat_config, directory_name)
 
+    profiler = None
+    if args.profile or args.profile_slowest > 0:
+        profiler = RunProfiler(directory_name, args.profile_top, args.profile_slowest)
+    report = RunReport() if args.report != "none" else None
+    if args.trace:
+        start_tracing()
+
     # Parse Configuration File
     try:
-        config = yaml.safe_load(open(args.debloat_config, "r"))
+        with profile_stage(profiler, "config"), trace_span("config"):
+            config = load_config(args.debloat_config)
     except yaml.YAMLError as err:
-        logging.error("An error occurred when parsing the debloat config file: {err}".format(err=err))
+        logging.error("An error occurred when parsing the debloat config file: %s", err)
         sys.exit("Debloating configuration cannot be parsed, aborting operation...")
 
     # Iterate through the specified libraries and debloat them according to the configuration file
     libraries = config.get("Libraries")
     for library in libraries:
-        logging.info("Starting debloating operation on library: " + library.get("name"))
+        logging.info("Starting debloating operation on library: %s", library.get("name"))
 
         # Create total list of features to debloat (expand categories to leaf features)
         logging.info("Identifying features to debloat.")
 
         debloatable_features = library.get("debloatable_features")
         features_to_debloat = library.get("debloat")
+        variants_config = library.get("variants")
 
-        if features_to_debloat is None:
+        if features_to_debloat is None and variants_config is None:
             logging.error("No features selected to debloat. Terminating.")
             sys.exit("No features selected to debloat. Terminating.")
 
-        target_features = set(features_to_debloat)
-
-        for feature in features_to_debloat:
-            search_results = search_hierarchy(feature, debloatable_features)
+        try:
+            with profile_stage(profiler, "config"):
+                hierarchy_index = compile_hierarchy(debloatable_features)
+        except ValueError as err:
+            logging.error("Invalid hierarchy of debloatable features: %s", err)
+            sys.exit("Hierarchy of debloatable features is invalid.  Please ensure the configuration is correct.")
 
-            if len(search_results) == 0:
-                logging.error("Feature to debloat: " + feature + " was not found in the hierarchy of debloatable "
-                            "features.")
-                sys.exit("Specified feature to debloat not specified in feature hierarchy.  Please ensure the configuration"
-                        + " is correct.")
-
-            target_features = set(search_results).union(target_features)
+        try:
+            with profile_stage(profiler, "config"):
+                if variants_config is not None:
+                    variants = load_variants(variants_config, hierarchy_index, os.path.join(directory_name, "variants"))
+                else:
+                    target_features = resolve_features(features_to_debloat, hierarchy_index)
+        except ValueError as err:
+            logging.error("Invalid variants of library %s: %s", library.get("name"), err)
+            sys.exit("Variants of the library are invalid.  Please ensure the configuration is correct.")
+        except KeyError as err:
+            logging.error("Feature to debloat: %s was not found in the hierarchy of debloatable features.", err.args[0])
+            sys.exit("Specified feature to debloat not specified in feature hierarchy.  Please ensure the configuration"
+                    + " is correct.")
 
         # Pull relevant configuration entries
         locations = library.get("locations")
         extensions = library.get("extensions")
+        filters = library_filters(library)
         language = library.get("language")
 
-        # Currently only supports C/C++ - If new debloating modules are created the opts dict below must be updated.
-        language_opts = {"C": CResourceDebloater, "Python": PythonResourceDebloater}
-        language_type = language_opts.get(language)
+        language_type = LANGUAGE_DEBLOATERS.get(language)
 
         if language_type is None:
-            logging.error("Specified language:" + language + " is not supported.")
+            logging.error("Specified language:%s is not supported.", language)
             sys.exit("Specified language:" + language + " is not supported. Exiting...")
 
-        # Iterate through library source code locations
-        for location in locations:
-            for dirpath, dirnames, filenames in os.walk(location):
-                # Iterate through files in the location
-                for filename in filenames:
-                    file = Path(dirpath) / filename
-                    if get_extension(file.name) in extensions:
-                        logging.info(f"Processing file: {file}")
-                        # Process the file
-                        resource_debloater = language_type(file, target_features)
-                        resource_debloater.read_from_disk()
-                        resource_debloater.debloat()
-                        resource_debloater.write_to_disk()
+        # Debloat the library into the output tree of each of its variants, leaving its source code untouched
+        if variants_config is not None:
+            logging.info("Debloating library %s into variants: %s", library.get("name"),
+                         ", ".join(variant.name for variant in variants))
+            with trace_span(library.get("name"), "library", language=language, variants=len(variants)):
+                summary = run_variants(language_type, locations, extensions, variants, args.link_mode, filters)
+            summary_message = (f"Library {library.get('name')}: {summary.files} files written to {len(variants)} "
+                               f"variants, {summary.debloated} debloated outputs, {summary.linked} linked.")
+            SUMMARY_LOGGER.info(summary_message)
+            print(summary_message)
+            continue
+
+        # Collect the library's source files (from the annotation index, if the library is indexed), then debloat them
+        signature = library_signature(language, locations, extensions, filters)
+        indexed = index is not None and index.has_library(library.get("name"), signature)
+        if index is not None and not indexed:
+            logging.warning("Library %s is not in the annotation index, or its configuration changed since it was "
+                            "indexed; walking its locations instead.  Run `carve index` to update the index.",
+                            library.get("name"))
+        library_start = time.perf_counter()
+        if report is not None:
+            report.start_library(library.get("name"), language)
+        try:
+            with trace_span(library.get("name"), "library", language=language):
+                with profile_stage(profiler, "walk"), trace_span("walk"):
+                    if indexed:
+                        changed = index.changed_directories(library.get("name"))
+                        if changed:
+                            # Files may have been added since the library was indexed; walk it again to find them
+                            logging.info("%d directories of library %s changed since it was indexed (such as %s); "
+                                         "updating the annotation index.", len(changed), library.get("name"),
+                                         changed[0])
+                            rescanned = index.update_library(library.get("name"), language, locations, extensions,
+                                                             filters).scanned
+                        else:
+                            rescanned = index.refresh_library(library.get("name"), language_type)
+                        files = index.target_files(library.get("name"), target_features)
+                        logging.info("Annotation index: %d of %d files hold annotations to debloat (%d rescanned).",
+                                     len(files), index.file_count(library.get("name")), rescanned)
+                    else:
+                        files = collect_files(locations, extensions, filters)
+                output = None
+                if args.output_dir is not None:
+                    output = OutputTree(Path(args.output_dir), locations, args.link_mode)
+                    with trace_span("mirror"):
+                        mirrored = output.mirror(skip=files)
+                    logging.info("Linked %d files without annotations into %s", len(mirrored), args.output_dir)
+                summary = run_files(language_type, files, target_features, jobs, cache, profiler, report, output)
+                if output is not None:
+                    output.copy_modes()
+        except SystemExit:
+            # Keep the report and trace of the files debloated before the failure
+            if report is not None:
+                report.finish_library(time.perf_counter() - library_start)
+                report.write(directory_name, args.report)
+            if args.trace:
+                write_trace(os.path.join(directory_name, "trace.json"), stop_tracing())
+            raise
+        if report is not None:
+            report.finish_library(time.perf_counter() - library_start)
+
+        summary_message = (f"Library {library.get('name')}: {summary.files} files processed, {summary.skipped} "
+                           f"skipped (no annotations).")
+        if indexed:
+            summary_message += (f" {index.file_count(library.get('name')) - summary.files} files without annotations "
+                                f"to debloat skipped using the annotation index.")
+        if cache is not None:
+            summary_message += f" {summary.cache_hits} results reused from cache."
+        SUMMARY_LOGGER.info(summary_message)
+        print(summary_message)
+
+    if cache is not None:
+        removed, freed = cache.prune()
+        if removed > 0:
+            logging.info("Evicted %s entries (%s bytes) from the result cache.", removed, freed)
+
+    if report is not None:
+        written = report.write(directory_name, args.report)
+        logging.info("Run report written: %s", ", ".join(written))
+
+    if args.trace:
+        trace_path = os.path.join(directory_name, "trace.json")
+        write_trace(trace_path, stop_tracing())
+        logging.info("Trace written: %s", trace_path)
+
+    if profiler is not None:
+        written = profiler.write()
+        logging.info("Profiles written: %s", ", ".join(written))
+        print(f"Profiles written to {directory_name} (summary in {written[-1]})")
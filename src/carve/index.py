@@ -0,0 +1,385 @@
+"""
+CARVE Annotation Index
+A local SQLite database recording every annotation in the configured libraries: the file and line it is on, whether it
+is a file, segment or implicit annotation, the construct it debloats and its feature set, along with the hash,
+modification time and size of each file.
+
+A debloat run using the index only visits the files holding at least one annotation it would debloat, instead of
+walking and reading the whole tree.  Indexed files whose modification time or size changed are rescanned (when their
+hash changed too) before each lookup.  The modification time of every directory walked is recorded as well: adding,
+removing or renaming an entry changes it, so a library whose directories changed since it was indexed is walked again
+(and its new files indexed) instead of being looked up.
+"""
+
+# Standard Library Imports
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+# Third Party Imports
+import yaml
+
+# Local Imports
+from carve.languages import LANGUAGE_DEBLOATERS
+from carve.utility import load_config
+from carve.walk import FileWalker, library_filters
+
+DEFAULT_INDEX_PATH = "results/annotation_index.db"
+
+# Bumped whenever the tables change; an index written with another version is rebuilt from scratch
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS libraries (
+    name TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    indexed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    library TEXT NOT NULL,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (library, path)
+);
+CREATE TABLE IF NOT EXISTS annotations (
+    library TEXT NOT NULL,
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    construct TEXT NOT NULL,
+    features TEXT NOT NULL,
+    PRIMARY KEY (library, path, line)
+);
+CREATE TABLE IF NOT EXISTS directories (
+    library TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (library, path)
+);
+"""
+
+# Annotation types, by the last character of the annotation
+ANNOTATION_TYPES = {"!": "file", "~": "segment"}
+
+
+class IndexedAnnotation(NamedTuple):
+    """
+    An annotation recorded in the index.  Lines are numbered from 0, as in the debloaters.
+    """
+    line: int
+    type: str
+    construct: str
+    features: FrozenSet[str]
+
+
+class IndexUpdate(NamedTuple):
+    """
+    Totals of an update of a library's index.
+    """
+    files: int
+    scanned: int
+    removed: int
+
+
+def library_signature(language: str, locations: List[str], extensions: List[str],
+                      filters: Optional[Dict] = None) -> str:
+    """
+    Summarizes the configuration entries determining a library's files, to detect indexes of outdated configurations.
+    :param str language: Language of the library.
+    :param list locations: Directories containing the library's source code.
+    :param list extensions: Extensions of the library's files.
+    :param dict filters: Exclude, include and gitignore entries of the library (see library_filters in carve.walk).
+    :return: Signature of the library.
+    """
+    signature = {"language": language, "locations": [os.path.abspath(location) for location in locations],
+                 "extensions": sorted(extensions)}
+    if filters:
+        signature["filters"] = filters
+    return json.dumps(signature, sort_keys=True)
+
+
+def scan_annotations(language_type: type, location: Path, contents: bytes) -> List[IndexedAnnotation]:
+    """
+    Finds the annotations in a file.
+    :param type language_type: ResourceDebloater subclass used to debloat the file.
+    :param Path location: Filepath of the file.
+    :param bytes contents: Raw contents of the file.
+    :return: Annotations of the file, in line order.
+    """
+    sequence = language_type.ANNOTATION_SEQUENCE
+    if f"{sequence}[".encode() not in contents:
+        return []
+
+    debloater = language_type(location, set())
+    debloater.lines = contents.decode(errors="replace").splitlines(keepends=True)
+    annotations = []
+    for current_line, line in enumerate(debloater.lines):
+        if line.find(f"{sequence}[") < 0:
+            continue
+        annotation_type = ANNOTATION_TYPES.get(line.strip()[-1:], "implicit")
+        if annotation_type == "implicit" and current_line + 1 >= len(debloater.lines):
+            construct = "Unknown"
+        else:
+            construct = debloater.annotation_construct(current_line)
+        annotations.append(IndexedAnnotation(current_line, annotation_type, construct,
+                                             frozenset(language_type.get_features(line))))
+    return annotations
+
+
+class AnnotationIndex(object):
+    """
+    The AnnotationIndex class maintains the annotation database of one or more libraries, keyed by library name.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        """
+        AnnotationIndex constructor.  Opens (or creates) the database.
+        :param str path: Filepath of the database.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self.connection:
+                for table in ("libraries", "files", "annotations", "directories"):
+                    self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        """
+        Closes the database.
+        :return: None
+        """
+        self.connection.close()
+
+    def has_library(self, name: str, signature: str) -> bool:
+        """
+        :param str name: Name of the library.
+        :param str signature: Signature of the library's current configuration (see library_signature).
+        :return: True if the library was indexed with the same configuration.
+        """
+        row = self.connection.execute("SELECT signature FROM libraries WHERE name = ?", (name,)).fetchone()
+        return row is not None and row[0] == signature
+
+    def _file_entries(self, name: str) -> Dict[str, Tuple[int, int, str, int]]:
+        """
+        :param str name: Name of the library.
+        :return: Modification time, size, hash and position of each indexed file of the library, by path.
+        """
+        rows = self.connection.execute("SELECT path, mtime_ns, size, hash, position FROM files WHERE library = ?",
+                                       (name,))
+        return {path: entry for path, *entry in rows}
+
+    def _refresh_file(self, name: str, language_type: type, location: str, position: int,
+                      entry: Tuple[int, int, str, int]) -> bool:
+        """
+        Brings the index of a single file up to date.  The file is only read if its modification time or size changed,
+        and only rescanned if its hash changed too.
+        :param str name: Name of the library.
+        :param type language_type: ResourceDebloater subclass used to debloat the library.
+        :param str location: Filepath of the file.
+        :param int position: Position of the file in discovery order.
+        :param tuple entry: Indexed modification time, size, hash and position of the file, or None if it is not
+        indexed.
+        :return: True if the file was rescanned.
+        """
+        stat = os.stat(location)
+        if entry is not None and tuple(entry[:2]) == (stat.st_mtime_ns, stat.st_size):
+            if entry[3] != position:
+                self.connection.execute("UPDATE files SET position = ? WHERE library = ? AND path = ?",
+                                        (position, name, location))
+            return False
+
+        contents = Path(location).read_bytes()
+        digest = hashlib.sha256(contents).hexdigest()
+        self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                (name, location, position, stat.st_mtime_ns, stat.st_size, digest))
+        if entry is not None and entry[2] == digest:
+            return False
+
+        logging.debug("Indexing annotations of %s", location)
+        self.connection.execute("DELETE FROM annotations WHERE library = ? AND path = ?", (name, location))
+        self.connection.executemany("INSERT INTO annotations VALUES (?, ?, ?, ?, ?, ?)",
+                                    [(name, location, annotation.line, annotation.type, annotation.construct,
+                                      json.dumps(sorted(annotation.features)))
+                                     for annotation in scan_annotations(language_type, Path(location), contents)])
+        return True
+
+    def _remove_files(self, name: str, locations: List[str]) -> None:
+        """
+        Removes files from the index.
+        :param str name: Name of the library.
+        :param list locations: Filepaths of the files.
+        :return: None
+        """
+        for table in ("files", "annotations"):
+            self.connection.executemany(f"DELETE FROM {table} WHERE library = ? AND path = ?",
+                                        [(name, location) for location in locations])
+
+    def update_library(self, name: str, language: str, locations: List[str], extensions: List[str],
+                       filters: Optional[Dict] = None) -> IndexUpdate:
+        """
+        Walks a library's source code locations and indexes its new and changed files.
+        :param str name: Name of the library.
+        :param str language: Language of the library.
+        :param list locations: Directories containing the library's source code.
+        :param list extensions: Extensions (without the '.') of the library's files.
+        :param dict filters: Exclude, include and gitignore entries of the library (see library_filters in carve.walk).
+        :return: IndexUpdate of the library.
+        """
+        language_type = LANGUAGE_DEBLOATERS[language]
+        signature = library_signature(language, locations, extensions, filters)
+        if not self.has_library(name, signature):
+            # The library's files may have been indexed with another debloater; start over.
+            with self.connection:
+                self._remove_files(name, list(self._file_entries(name)))
+
+        directories = {}
+        files = FileWalker(extensions, **(filters or {})).files(locations, directories)
+        with self.connection:
+            entries = self._file_entries(name)
+            scanned = 0
+            for position, location in enumerate(files):
+                location = str(location)
+                scanned += self._refresh_file(name, language_type, location, position, entries.pop(location, None))
+            self._remove_files(name, list(entries))
+            self.connection.execute("DELETE FROM directories WHERE library = ?", (name,))
+            self.connection.executemany("INSERT INTO directories VALUES (?, ?, ?)",
+                                        [(name, path, mtime_ns) for path, mtime_ns in directories.items()])
+            self.connection.execute("INSERT OR REPLACE INTO libraries VALUES (?, ?, ?)", (name, signature, time.time()))
+        return IndexUpdate(len(files), scanned, len(entries))
+
+    def changed_directories(self, name: str) -> List[str]:
+        """
+        Finds the directories of a library whose entries may have changed since the library was walked, which
+        refresh_library cannot detect: files added to them are missing from the index.
+        :param str name: Name of the library.
+        :return: Filepaths of the walked directories that were modified or removed since.
+        """
+        changed = []
+        for path, mtime_ns in self.connection.execute("SELECT path, mtime_ns FROM directories WHERE library = ?",
+                                                      (name,)):
+            try:
+                if os.stat(path).st_mtime_ns != mtime_ns:
+                    changed.append(path)
+            except OSError:
+                changed.append(path)
+        return changed
+
+    def refresh_library(self, name: str, language_type: type) -> int:
+        """
+        Rescans the indexed files of a library that changed since they were indexed, and drops the files that were
+        removed.  Unlike update_library this does not walk the library's locations, so files added since are not
+        indexed; check changed_directories first.
+        :param str name: Name of the library.
+        :param type language_type: ResourceDebloater subclass used to debloat the library.
+        :return: Number of files rescanned.
+        """
+        scanned = 0
+        with self.connection:
+            removed = []
+            for location, entry in self._file_entries(name).items():
+                try:
+                    scanned += self._refresh_file(name, language_type, location, entry[3], entry)
+                except FileNotFoundError:
+                    removed.append(location)
+            self._remove_files(name, removed)
+        return scanned
+
+    def file_count(self, name: str) -> int:
+        """
+        :param str name: Name of the library.
+        :return: Number of indexed files of the library.
+        """
+        return self.connection.execute("SELECT COUNT(*) FROM files WHERE library = ?", (name,)).fetchone()[0]
+
+    def annotations(self, name: str) -> Dict[str, List[IndexedAnnotation]]:
+        """
+        :param str name: Name of the library.
+        :return: Indexed annotations of each annotated file of the library, by path, in discovery order.
+        """
+        rows = self.connection.execute("SELECT annotations.path, line, type, construct, features FROM annotations "
+                                       "JOIN files ON files.library = annotations.library "
+                                       "AND files.path = annotations.path WHERE annotations.library = ? "
+                                       "ORDER BY position, line", (name,))
+        annotations = {}
+        for path, line, annotation_type, construct, features in rows:
+            annotations.setdefault(path, []).append(IndexedAnnotation(line, annotation_type, construct,
+                                                                      frozenset(json.loads(features))))
+        return annotations
+
+    def target_files(self, name: str, target_features: Set[str]) -> List[Path]:
+        """
+        Looks up the files of a library holding an annotation to debloat.  An annotation is debloated when all of its
+        features are selected, so files whose annotations all name some other feature are left out.
+        :param str name: Name of the library.
+        :param set target_features: Set of features to be debloated.
+        :return: Files to debloat, in discovery order.
+        """
+        # Many annotations share the same feature set; check each set only once.
+        verdicts = {}
+        files = []
+        for path, annotations in self.annotations(name).items():
+            for annotation in annotations:
+                if annotation.features not in verdicts:
+                    verdicts[annotation.features] = annotation.features.issubset(target_features)
+                if verdicts[annotation.features]:
+                    files.append(Path(path))
+                    break
+        return files
+
+
+def index_main(argv) -> None:
+    """
+    `carve index` subcommand: index the annotations of every library in a debloating configuration.
+    """
+    log_opts = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR,
+                "CRITICAL": logging.CRITICAL}
+
+    parser = argparse.ArgumentParser(prog="carve index", description="Index the annotations of the configured "
+                                     "libraries, so debloat runs only visit the files they change.")
+    parser.add_argument("debloat_config", help="File containing debloating configuration.", type=str)
+    parser.add_argument("--index_path", help="Filepath of the annotation index.", type=str, default=DEFAULT_INDEX_PATH)
+    parser.add_argument("-ll", "--log_level", help="Verbosity of logging.", type=str, default="WARNING",
+                        choices=log_opts.keys())
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=log_opts.get(args.log_level))
+
+    try:
+        config = load_config(args.debloat_config)
+    except yaml.YAMLError as err:
+        logging.error("An error occurred when parsing the debloat config file: %s", err)
+        sys.exit("Debloating configuration cannot be parsed, aborting operation...")
+
+    index = AnnotationIndex(args.index_path)
+    try:
+        for library in config.get("Libraries"):
+            name = library.get("name")
+            language = library.get("language")
+            if language not in LANGUAGE_DEBLOATERS:
+                logging.error("Specified language:%s is not supported.", language)
+                sys.exit("Specified language:" + str(language) + " is not supported. Exiting...")
+
+            update = index.update_library(name, language, library.get("locations"), library.get("extensions"),
+                                          library_filters(library))
+            annotations = index.annotations(name)
+            print(f"Library {name}: {update.files} files indexed ({update.scanned} scanned, {update.removed} removed), "
+                  f"{sum(len(found) for found in annotations.values())} annotations in {len(annotations)} files.")
+    finally:
+        index.close()
@@ -0,0 +1,138 @@
+"""
+CARVE Languages
+Registry of the language debloaters available to the configuration file's `language` entries.  Debloaters are named by
+import path and only imported the first time a library in that language is debloated, so a run never pays the import
+cost of debloaters it does not use (the Python debloater pulls in libcst).
+
+Besides the built-in C and Python debloaters, installed packages can provide debloaters for other languages through
+the `carve.debloaters` entry point group, with the language name as entry point name and a ResourceDebloater subclass
+as object reference.  For example, in a plugin's pyproject.toml:
+
+    [project.entry-points."carve.debloaters"]
+    Shell = "carve_shell.ShellResourceDebloater:ShellResourceDebloater"
+
+An entry point named after a built-in language replaces the built-in debloater.
+"""
+
+# Standard Library Imports
+import importlib
+import logging
+from typing import Dict, Iterator, Mapping, Optional
+
+# Third Party Imports
+
+# Local Imports
+
+# Entry point group installed packages register language debloaters under
+ENTRY_POINT_GROUP = "carve.debloaters"
+
+# Import paths ("module:class") of the debloaters shipped with CARVE
+BUILTIN_DEBLOATERS = {
+    "C": "carve.resource_debloater.CResourceDebloater:CResourceDebloater",
+    "Python": "carve.resource_debloater.PythonResourceDebloater:PythonResourceDebloater",
+}
+
+
+def discover_debloaters(group: str = ENTRY_POINT_GROUP) -> Dict[str, str]:
+    """
+    Lists the language debloaters registered by installed packages, without importing them.
+    :param str group: Entry point group to search.
+    :return: Dictionary of import paths by language name.
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return {}
+
+    found = entry_points()
+    if hasattr(found, "select"):
+        selected = found.select(group=group)
+    else:
+        # Python < 3.10 returns a dictionary of entry points by group
+        selected = found.get(group, [])
+    return {entry_point.name: entry_point.value for entry_point in selected}
+
+
+class LanguageRegistry(Mapping):
+    """
+    Read-only mapping of language names to ResourceDebloater subclasses, importing each debloater on first lookup.
+    """
+
+    def __init__(self, builtins: Optional[Dict[str, str]] = None, group: Optional[str] = ENTRY_POINT_GROUP):
+        """
+        LanguageRegistry constructor
+        :param dict builtins: Import paths ("module:class") of the built-in debloaters by language name.
+        :param str group: Entry point group searched for further debloaters, or None to only use the built-in ones.
+        """
+        self.builtins = dict(BUILTIN_DEBLOATERS if builtins is None else builtins)
+        self.group = group
+        self._targets = None
+        self._loaded = {}
+
+    @property
+    def targets(self) -> Dict[str, str]:
+        """
+        Import paths of every registered debloater by language name.  Entry points are searched on first use.
+        :return: Dictionary of import paths by language name.
+        """
+        if self._targets is None:
+            targets = dict(self.builtins)
+            if self.group is not None:
+                targets.update(discover_debloaters(self.group))
+            self._targets = targets
+        return self._targets
+
+    def register(self, language: str, target: str) -> None:
+        """
+        Registers (or replaces) the debloater of a language.
+        :param str language: Language name, as used in the configuration file.
+        :param str target: Import path of the debloater ("module:class").
+        :return: None
+        """
+        self.targets[language] = target
+        self._loaded.pop(language, None)
+
+    def __getitem__(self, language: str) -> type:
+        """
+        Returns the debloater of a language, importing it if needed.
+        :param str language: Language name, as used in the configuration file.
+        :return: ResourceDebloater subclass.
+        :raises: KeyError if no debloater is registered for the language, or it cannot be imported.
+        """
+        if language in self._loaded:
+            return self._loaded[language]
+
+        target = self.targets[language]
+        module_name, _, attribute = target.partition(":")
+        try:
+            language_type = importlib.import_module(module_name)
+            for name in attribute.split(".") if attribute else []:
+                language_type = getattr(language_type, name)
+        except (ImportError, AttributeError) as err:
+            logging.error("Debloater %s for language %s cannot be loaded: %s", target, language, err)
+            raise KeyError(language) from err
+
+        self._loaded[language] = language_type
+        return language_type
+
+    def __contains__(self, language: object) -> bool:
+        """
+        Checks whether a debloater is registered for a language, without importing it.
+        """
+        return language in self.targets
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Iterates over the registered language names.
+        """
+        return iter(self.targets)
+
+    def __len__(self) -> int:
+        """
+        Number of registered languages.
+        """
+        return len(self.targets)
+
+
+# Debloaters for each language supported in the configuration file
+LANGUAGE_DEBLOATERS = LanguageRegistry()
@@ -0,0 +1,67 @@
+"""
+CARVE Logging
+This module sets up logging for a debloating run.  Records are put on a queue by the threads (and, replayed, by the
+worker processes) that log them, and a background listener thread formats them and writes them to the log file, so
+log I/O stays off the debloating path.
+
+In compact mode only warnings and errors are logged as they happen; each file is then summarized on a single line.
+"""
+
+# Standard Library Imports
+import logging
+import logging.handlers
+import queue
+
+# Third Party Imports
+
+# Local Imports
+
+# Logger for the run and library summaries, shown in every mode
+SUMMARY_LOGGER = logging.getLogger("carve.summary")
+
+# Logger for the one line summary of each file, only enabled in compact mode
+FILE_SUMMARY_LOGGER = logging.getLogger("carve.files")
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves formatting to the listener thread.  The standard QueueHandler formats each record before
+    queueing it so it can be pickled to another process; these records never leave the process, and all logging
+    arguments in CARVE are immutable, so the record can be formatted later.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Returns the record unchanged.
+        :param LogRecord record: record to queue.
+        :return: The record.
+        """
+        return record
+
+
+def setup_logging(filename: str, level: int, compact: bool = False) -> logging.handlers.QueueListener:
+    """
+    Routes all logging through a queue to a background thread writing the log file.  Stopping the returned listener
+    flushes the queue.
+    :param str filename: Filepath of the log file.
+    :param int level: Logging level selected for the run.
+    :param bool compact: Only log warnings and errors as they happen, and one summary line per file.
+    :return: The started QueueListener.
+    """
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+
+    root = logging.getLogger()
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    if compact:
+        root.setLevel(max(level, logging.WARNING))
+        SUMMARY_LOGGER.setLevel(level)
+        FILE_SUMMARY_LOGGER.setLevel(level)
+    else:
+        root.setLevel(level)
+        FILE_SUMMARY_LOGGER.setLevel(logging.CRITICAL + 1)
+
+    listener.start()
+    return listener
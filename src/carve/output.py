@@ -0,0 +1,143 @@
+"""
+CARVE Output Trees
+Debloated code can be written to a mirror of a library's locations instead of in place, leaving the library's source
+code untouched.  Each location is mirrored into a folder of the output directory named after the location (suffixed with
+a number if an earlier location has the same name, as in src and src_2).  Files that debloating leaves unchanged are
+linked to the library's files rather than copied, so the cost of an output tree is proportional to the number of files
+actually debloated.
+"""
+
+# Standard Library Imports
+import os
+import shutil
+import stat
+from pathlib import Path
+from typing import Iterable, List, NamedTuple
+
+# Third Party Imports
+
+# Local Imports
+from carve.utility import get_final_subfolder
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Ways files left unchanged are created in an output tree
+LINK_MODES = ("hardlink", "reflink", "copy")
+
+# ioctl cloning a file's extents into another file, on Linux file systems supporting reflinks (Btrfs, XFS)
+FICLONE = 0x40049409
+
+
+def link_file(source: Path, destination: Path, link_mode: str = "hardlink") -> bool:
+    """
+    Creates a file with the same contents as another file, sharing its storage where the link mode and the file system
+    allow it, and copying it otherwise.  An existing destination file is replaced.
+    :param Path source: Filepath of the existing file.
+    :param Path destination: Filepath of the file to create.
+    :param str link_mode: One of LINK_MODES.
+    :return: True if the file shares the source's storage.
+    """
+    if os.path.lexists(destination):
+        # Never write through an earlier link to another file
+        os.unlink(destination)
+
+    if link_mode == "hardlink":
+        try:
+            os.link(source, destination)
+            return True
+        except OSError:
+            pass
+    elif link_mode == "reflink" and fcntl is not None:
+        try:
+            with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+                fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+            shutil.copymode(source, destination)
+            return True
+        except OSError:
+            pass
+
+    shutil.copy2(source, destination)
+    return False
+
+
+def location_folders(locations: List[str]) -> List[str]:
+    """
+    Names the folders a library's locations are mirrored into: the final folder of each location, suffixed with a
+    number when an earlier location would get the same folder (a/src and b/src are mirrored into src and src_2).
+    :param list locations: Directories containing the library's source code.
+    :return: Name of the folder of each location, in order.
+    """
+    names = [get_final_subfolder(str(location)) for location in locations]
+    folders: List[str] = []
+    for name in names:
+        folder = name
+        suffix = 1
+        # A suffixed folder must not take the name of another location either
+        while folder in folders or (folder != name and folder in names):
+            suffix += 1
+            folder = f"{name}_{suffix}"
+        folders.append(folder)
+    return folders
+
+
+class OutputTree(NamedTuple):
+    """
+    Output directory mirroring a library's locations.
+    """
+    directory: Path
+    locations: List[str]
+    link_mode: str = "hardlink"
+
+    def destination(self, location: Path) -> Path:
+        """
+        Maps a file of the library to its place in the output tree.
+        :param Path location: Filepath of the file, within one of the library's locations.
+        :return: Filepath of the file in the output tree.
+        :raises: ValueError if the file is not within any of the library's locations.
+        """
+        for root, folder in zip(self.locations, location_folders(self.locations)):
+            try:
+                relative = Path(location).relative_to(root)
+            except ValueError:
+                continue
+            return Path(self.directory) / folder / relative
+        raise ValueError(f"{location} is not within the locations of the library")
+
+    def mirror(self, skip: Iterable[Path] = ()) -> List[Path]:
+        """
+        Creates the output tree's directories and links every file of the library into it except those skipped (which
+        are debloated into it separately).  The directories stay writable by their owner, even when left read-only by
+        an earlier run, until copy_modes gives them the permissions of the library's.
+        :param skip: Files of the library not to link.
+        :return: Files linked into the output tree.
+        """
+        skipped = {str(location) for location in skip}
+        linked = []
+        for root in self.locations:
+            for dirpath, dirnames, filenames in os.walk(root):
+                directory = self.destination(Path(dirpath))
+                directory.mkdir(parents=True, exist_ok=True)
+                mode = stat.S_IMODE(directory.stat().st_mode)
+                if mode & stat.S_IRWXU != stat.S_IRWXU:
+                    directory.chmod(mode | stat.S_IRWXU)
+                for filename in filenames:
+                    location = Path(dirpath) / filename
+                    if str(location) not in skipped:
+                        link_file(location, directory / filename, self.link_mode)
+                        linked.append(location)
+        return linked
+
+    def copy_modes(self) -> None:
+        """
+        Gives the output tree's directories the permissions of the library's, deepest first.  Called once every file
+        has been written, as files cannot be created in directories mirroring read-only ones.
+        :return: None
+        """
+        for root in self.locations:
+            for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+                directory = self.destination(Path(dirpath))
+                if directory.is_dir():
+                    shutil.copymode(dirpath, directory)
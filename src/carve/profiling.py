@@ -0,0 +1,189 @@
+"""
+CARVE Profiling
+This module collects cProfile profiles of a debloating run, split by stage: configuration and feature hierarchy
+resolution, the directory walk, and the read, debloat and write stages of every file.  Profiles of the slowest files
+can also be kept individually, to find pathological inputs without rerunning.
+
+Per-file stages may run in worker processes; they are profiled there and their raw statistics are returned with the
+file's result, then merged here.
+"""
+
+# Standard Library Imports
+import contextlib
+import cProfile
+import heapq
+import itertools
+import os
+import pstats
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# Third Party Imports
+
+# Local Imports
+
+# Stages of a run, in the order they happen.
+PROFILE_STAGES = ("config", "walk", "read", "debloat", "write")
+
+DEFAULT_PROFILE_TOP = 25
+
+
+class _RawStats(object):
+    """
+    Wraps raw profile statistics (as returned by a worker process) so they can be loaded by pstats.Stats.
+    """
+
+    def __init__(self, stats: dict):
+        """
+        _RawStats constructor
+        :param dict stats: Raw statistics of a cProfile.Profile, after create_stats.
+        """
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        """
+        Part of the interface pstats.Stats loads profiles through; the statistics are already created.
+        :return: None
+        """
+
+
+def profile_call(stats: Dict[str, dict], stage: str, function: Callable, *args):
+    """
+    Calls a function under a new profiler, recording the raw statistics of the call under the stage name.
+    :param dict stats: Raw statistics of each stage profiled so far.
+    :param str stage: Name of the stage the call belongs to.
+    :param function: Function to call.
+    :param args: Arguments of the function.
+    :return: Return value of the function.
+    """
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function, *args)
+    finally:
+        profile.create_stats()
+        stats[stage] = profile.stats
+
+
+class RunProfiler(object):
+    """
+    The RunProfiler class accumulates the profiles of a debloating run and writes them to the results directory: one
+    .pstats file per stage, one per slowest file (when requested), and a text summary of the top functions of each.
+    """
+
+    def __init__(self, directory: str, top: int = DEFAULT_PROFILE_TOP, slowest: int = 0):
+        """
+        RunProfiler constructor
+        :param str directory: Results directory the profiles are written to.
+        :param int top: Number of functions listed for each profile in the summary.
+        :param int slowest: Number of slowest files to keep individual profiles of.
+        """
+        self.directory = directory
+        self.top = top
+        self.slowest = slowest
+
+        # Accumulated statistics of each stage, and a min-heap of (seconds, order, location, stats) of the slowest files
+        self.stages = {}
+        self.slowest_files = []
+        self._order = itertools.count()
+
+    def _add(self, stage: str, stats: dict) -> None:
+        """
+        Adds raw statistics to a stage's accumulated statistics.
+        :param str stage: Name of the stage.
+        :param dict stats: Raw statistics to add.
+        :return: None
+        """
+        if stage in self.stages:
+            self.stages[stage].add(_RawStats(stats))
+        else:
+            self.stages[stage] = pstats.Stats(_RawStats(stats))
+
+    @contextlib.contextmanager
+    def stage(self, stage: str):
+        """
+        Context manager profiling the code it wraps as part of a stage.
+        :param str stage: Name of the stage.
+        """
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.create_stats()
+            self._add(stage, profile.stats)
+
+    def add_file(self, location: Path, stats: Dict[str, dict], seconds: float) -> None:
+        """
+        Adds the profiles of the stages of a single file.
+        :param Path location: Filepath of the file.
+        :param dict stats: Raw statistics of each stage of the file.
+        :param float seconds: Wall time spent on the file.
+        :return: None
+        """
+        if self.slowest > 0:
+            entry = (seconds, next(self._order), str(location), {stage: dict(raw) for stage, raw in stats.items()})
+            if len(self.slowest_files) < self.slowest:
+                heapq.heappush(self.slowest_files, entry)
+            elif entry[0] > self.slowest_files[0][0]:
+                heapq.heapreplace(self.slowest_files, entry)
+
+        for stage, raw in stats.items():
+            self._add(stage, raw)
+
+    def write(self) -> List[str]:
+        """
+        Writes the .pstats files and the text summary (profile_summary.txt) to the results directory.
+        :return: Paths of the files written.
+        """
+        written = []
+        summary_path = os.path.join(self.directory, "profile_summary.txt")
+        with open(summary_path, "w") as summary:
+            for stage in PROFILE_STAGES:
+                stats = self.stages.get(stage)
+                if stats is None:
+                    continue
+                path = os.path.join(self.directory, f"profile_{stage}.pstats")
+                stats.dump_stats(path)
+                written.append(path)
+                self._summarize(summary, f"Stage: {stage}", stats)
+
+            slowest = sorted(self.slowest_files, reverse=True)
+            for rank, (seconds, _, location, stages) in enumerate(slowest, start=1):
+                stats = None
+                for raw in stages.values():
+                    if stats is None:
+                        stats = pstats.Stats(_RawStats(raw))
+                    else:
+                        stats.add(_RawStats(raw))
+                if stats is None:
+                    continue
+                path = os.path.join(self.directory, f"profile_slowest_{rank}_{Path(location).name}.pstats")
+                stats.dump_stats(path)
+                written.append(path)
+                self._summarize(summary, f"Slowest file #{rank}: {location} ({seconds:.3f} s)", stats)
+        written.append(summary_path)
+        return written
+
+    def _summarize(self, summary, title: str, stats: pstats.Stats) -> None:
+        """
+        Writes the top functions of a profile, by cumulative time, to the summary.
+        :param summary: Open summary file.
+        :param str title: Heading of the profile.
+        :param pstats.Stats stats: Profile to summarize.
+        :return: None
+        """
+        summary.write(f"{'=' * 120}\n{title}\n{'=' * 120}\n")
+        stats.stream = summary
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+
+
+def profile_stage(profiler: Optional[RunProfiler], stage: str):
+    """
+    Context manager profiling a stage of the run when profiling is enabled, and doing nothing otherwise.
+    :param RunProfiler profiler: Profiler of the run, or None when profiling is disabled.
+    :param str stage: Name of the stage.
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(stage)
@@ -0,0 +1,197 @@
+"""
+CARVE Run Report
+This module collects per-file measurements of a debloating run (sizes and line counts before and after, annotations
+found, debloated by construct and failed, the wall time of each stage and the peak memory held by the file's contents)
+and writes them to the results directory as JSON and CSV, with a roll-up per library.
+"""
+
+# Standard Library Imports
+import collections
+import csv
+import json
+import os
+from typing import Dict, List
+
+# Third Party Imports
+
+# Local Imports
+from carve import __version__
+
+# Report formats selectable on the command line
+REPORT_FORMATS = ("json", "csv", "both", "none")
+
+# Columns of the per-file CSV report, followed by one processed_<construct> column per construct seen in the run
+FILE_COLUMNS = ["library", "language", "file", "status", "bytes_before", "bytes_after", "lines_before", "lines_after",
+                "annotations_found", "annotations_processed", "annotations_failed", "annotations_skipped",
+                "read_seconds", "debloat_seconds", "write_seconds", "seconds", "memory_bytes", "error"]
+
+# Columns of the per-library CSV report
+LIBRARY_COLUMNS = ["library", "language", "files", "debloated", "skipped", "cache_hits", "failed", "bytes_before",
+                   "bytes_after", "lines_before", "lines_after", "annotations_found", "annotations_processed",
+                   "annotations_failed", "annotations_skipped", "read_seconds", "debloat_seconds", "write_seconds",
+                   "seconds", "wall_seconds", "peak_memory_bytes"]
+
+# Per-file values summed in the library roll-up
+SUMMED_COLUMNS = ["bytes_before", "bytes_after", "lines_before", "lines_after", "annotations_found",
+                  "annotations_processed", "annotations_failed", "annotations_skipped", "read_seconds",
+                  "debloat_seconds", "write_seconds", "seconds"]
+
+
+class RunReport(object):
+    """
+    The RunReport class accumulates one row per debloated file, grouped by library.
+    """
+
+    def __init__(self):
+        """
+        RunReport constructor
+        """
+        self.libraries = []
+
+    def start_library(self, name: str, language: str) -> None:
+        """
+        Starts a new library; the files added next belong to it.
+        :param str name: Name of the library.
+        :param str language: Language of the library.
+        :return: None
+        """
+        self.libraries.append({"name": name, "language": language, "wall_seconds": None, "files": []})
+
+    def finish_library(self, wall_seconds: float) -> None:
+        """
+        Records the wall time taken to debloat the current library.
+        :param float wall_seconds: Wall time of the library, including the directory walk.
+        :return: None
+        """
+        self.libraries[-1]["wall_seconds"] = wall_seconds
+
+    def add_file(self, result) -> None:
+        """
+        Adds a row for a file of the current library.
+        :param FileResult result: Outcome of debloating the file (see carve.runner).
+        :return: None
+        """
+        library = self.libraries[-1]
+        metrics = result.metrics
+
+        if result.error is not None:
+            status = "failed"
+        elif result.skipped:
+            status = "skipped"
+        elif result.cache_hit:
+            status = "cache_hit"
+        else:
+            status = "debloated"
+
+        row = {"library": library["name"], "language": library["language"], "file": str(result.location),
+               "status": status, "bytes_before": None, "bytes_after": None, "lines_before": None, "lines_after": None,
+               "annotations_found": None, "annotations_processed": None, "annotations_failed": None,
+               "annotations_skipped": None, "processed_by_construct": {}, "read_seconds": None,
+               "debloat_seconds": None, "write_seconds": None, "seconds": result.seconds, "memory_bytes": None,
+               "error": None if result.error is None else str(result.error)}
+
+        if metrics is not None:
+            row.update(bytes_before=metrics.bytes_before, bytes_after=metrics.bytes_after,
+                       lines_before=metrics.lines_before, lines_after=metrics.lines_after,
+                       read_seconds=metrics.stage_seconds.get("read"),
+                       debloat_seconds=metrics.stage_seconds.get("debloat"),
+                       write_seconds=metrics.stage_seconds.get("write"), memory_bytes=metrics.memory_bytes)
+            if metrics.annotations_found is not None:
+                processed = sum(metrics.annotations_processed.values())
+                row.update(annotations_found=metrics.annotations_found, annotations_processed=processed,
+                           annotations_failed=metrics.annotations_failed,
+                           annotations_skipped=max(0, metrics.annotations_found - processed
+                                                   - metrics.annotations_failed),
+                           processed_by_construct=dict(sorted(metrics.annotations_processed.items())))
+
+        library["files"].append(row)
+
+    @staticmethod
+    def library_totals(library: Dict) -> Dict:
+        """
+        Rolls up the rows of a library.
+        :param dict library: Library to roll up.
+        :return: Totals of the library's rows.
+        """
+        statuses = collections.Counter(row["status"] for row in library["files"])
+        totals = {"library": library["name"], "language": library["language"], "files": len(library["files"]),
+                  "debloated": statuses["debloated"], "skipped": statuses["skipped"],
+                  "cache_hits": statuses["cache_hit"], "failed": statuses["failed"]}
+
+        for column in SUMMED_COLUMNS:
+            totals[column] = sum(row[column] for row in library["files"] if row[column] is not None)
+
+        processed_by_construct = collections.Counter()
+        for row in library["files"]:
+            processed_by_construct.update(row["processed_by_construct"])
+        totals["processed_by_construct"] = dict(sorted(processed_by_construct.items()))
+        totals["wall_seconds"] = library["wall_seconds"]
+        totals["peak_memory_bytes"] = max((row["memory_bytes"] for row in library["files"]
+                                           if row["memory_bytes"] is not None), default=None)
+        return totals
+
+    def constructs(self) -> List[str]:
+        """
+        :return: Sorted names of every construct debloated in the run.
+        """
+        names = set()
+        for library in self.libraries:
+            for row in library["files"]:
+                names.update(row["processed_by_construct"])
+        return sorted(names)
+
+    def write_json(self, path: str) -> None:
+        """
+        Writes the report as JSON: every library with its totals and its per-file rows.
+        :param str path: Filepath of the report.
+        :return: None
+        """
+        report = {"carve_version": __version__,
+                  "libraries": [dict(library, totals=self.library_totals(library)) for library in self.libraries]}
+        with open(path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+    def write_csv(self, files_path: str, libraries_path: str) -> None:
+        """
+        Writes the report as two CSV files: one row per file, and one row per library.
+        :param str files_path: Filepath of the per-file report.
+        :param str libraries_path: Filepath of the per-library report.
+        :return: None
+        """
+        constructs = self.constructs()
+        construct_columns = [f"processed_{construct}" for construct in constructs]
+
+        with open(files_path, "w", newline="") as report_file:
+            writer = csv.DictWriter(report_file, FILE_COLUMNS + construct_columns, extrasaction="ignore")
+            writer.writeheader()
+            for library in self.libraries:
+                for row in library["files"]:
+                    by_construct = row["processed_by_construct"]
+                    writer.writerow(dict(row, **{f"processed_{construct}": by_construct.get(construct, 0)
+                                                 for construct in constructs}))
+
+        with open(libraries_path, "w", newline="") as report_file:
+            writer = csv.DictWriter(report_file, LIBRARY_COLUMNS + construct_columns, extrasaction="ignore")
+            writer.writeheader()
+            for library in self.libraries:
+                totals = self.library_totals(library)
+                by_construct = totals["processed_by_construct"]
+                writer.writerow(dict(totals, **{f"processed_{construct}": by_construct.get(construct, 0)
+                                                for construct in constructs}))
+
+    def write(self, directory: str, report_format: str = "both") -> List[str]:
+        """
+        Writes the report to the results directory.
+        :param str directory: Results directory.
+        :param str report_format: One of REPORT_FORMATS.
+        :return: Paths of the files written.
+        """
+        written = []
+        if report_format in ("json", "both"):
+            written.append(os.path.join(directory, "report.json"))
+            self.write_json(written[-1])
+        if report_format in ("csv", "both"):
+            written.append(os.path.join(directory, "report_files.csv"))
+            written.append(os.path.join(directory, "report_libraries.csv"))
+            self.write_csv(written[-2], written[-1])
+        return written
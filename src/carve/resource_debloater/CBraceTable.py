@@ -0,0 +1,148 @@
+"""
+C Brace Table
+"""
+
+# Standard Library Imports
+import re
+from typing import Optional, Sequence, Tuple
+
+# Third Party Imports
+
+# Local Imports
+
+
+class CBraceTable(object):
+    """
+    The CBraceTable class lexes a C source file once and records where every curly brace is and which brace matches
+    it.  Braces inside string literals, character literals and comments are ignored.  Once built, finding the block that
+    follows a line, or the block enclosing a line, takes constant time.
+
+    The lexer is deliberately small: it tracks code, comments (including line comments continued with a backslash),
+    and string/character literals (including literals continued with a backslash).  Preprocessor lines are treated as
+    code.
+    """
+    # Tokens that change the lexer state (or are braces) when found in code
+    CODE_TOKEN_PAT = re.compile(r"[{}\"']|/\*|//")
+    BLOCK_COMMENT_END_PAT = re.compile(r"\*/")
+    LITERAL_END_PATS = {"\"": re.compile(r"(?:[^\"\\]|\\.)*\""), "'": re.compile(r"(?:[^'\\]|\\.)*'")}
+
+    # Lexer states carried from one line to the next
+    CODE = 0
+    BLOCK_COMMENT = 1
+    LINE_COMMENT = 2
+
+    def __init__(self, lines: Sequence[str]):
+        """
+        CBraceTable constructor
+        :param list lines: Lines of the C source file.
+        """
+        # For each open brace, in order: its line, and the line of its matching close brace (None if unmatched).
+        self.open_lines = []
+        self.close_lines = []
+
+        # For each line: index of the first open brace at or after the start of the line, and index of the innermost
+        # open brace enclosing the start of the line (None at the top level), and the nesting depth at the start of
+        # the line.
+        self.first_open = []
+        self.enclosing = []
+        self.depths = []
+
+        self.build(lines)
+
+    def build(self, lines: Sequence[str]) -> None:
+        """
+        Lexes the file, filling in the brace table.
+        :param list lines: Lines of the C source file.
+        :return: None
+        """
+        stack = []
+        state = CBraceTable.CODE
+        literal = None
+
+        for line_number, line in enumerate(lines):
+            self.first_open.append(len(self.open_lines))
+            self.enclosing.append(stack[-1] if stack else None)
+            self.depths.append(len(stack))
+
+            text = line.rstrip("\r\n")
+            continued = text.endswith("\\")
+            position = 0
+
+            while True:
+                if state == CBraceTable.LINE_COMMENT:
+                    if not continued:
+                        state = CBraceTable.CODE
+                    break
+
+                if literal is not None:
+                    match = CBraceTable.LITERAL_END_PATS[literal].match(text, position)
+                    if match is None:
+                        # Unterminated literal: it only continues onto the next line after a backslash.
+                        if not continued:
+                            literal = None
+                        break
+                    literal = None
+                    position = match.end()
+                    continue
+
+                if state == CBraceTable.BLOCK_COMMENT:
+                    match = CBraceTable.BLOCK_COMMENT_END_PAT.search(text, position)
+                    if match is None:
+                        break
+                    state = CBraceTable.CODE
+                    position = match.end()
+                    continue
+
+                match = CBraceTable.CODE_TOKEN_PAT.search(text, position)
+                if match is None:
+                    break
+                token = match.group()
+                position = match.end()
+
+                if token == "{":
+                    stack.append(len(self.open_lines))
+                    self.open_lines.append(line_number)
+                    self.close_lines.append(None)
+                elif token == "}":
+                    if stack:
+                        self.close_lines[stack.pop()] = line_number
+                elif token == "/*":
+                    state = CBraceTable.BLOCK_COMMENT
+                elif token == "//":
+                    state = CBraceTable.LINE_COMMENT
+                else:
+                    literal = token
+
+    def block_after(self, line: int) -> Optional[Tuple[int, int]]:
+        """
+        Finds the block opened by the first open brace at or after the start of the line.
+        :param int line: Line number to search from.
+        :return: Tuple of the lines of the open and matching close brace, or None if there is no such block, it is
+            unterminated, or the block enclosing the line closes before it opens.
+        """
+        index = self.first_open[line]
+        if index == len(self.open_lines) or self.close_lines[index] is None:
+            return None
+
+        enclosing_close = self.enclosing_close(line)
+        if enclosing_close is not None and enclosing_close < self.open_lines[index]:
+            return None
+
+        return self.open_lines[index], self.close_lines[index]
+
+    def enclosing_close(self, line: int) -> Optional[int]:
+        """
+        Finds the close brace of the innermost block enclosing the start of the line.
+        :param int line: Line number.
+        :return: Line of the close brace, or None if the line is not enclosed by a terminated block.
+        """
+        index = self.enclosing[line]
+        return None if index is None else self.close_lines[index]
+
+    def depth(self, line: int) -> int:
+        """
+        Returns the brace nesting depth at the start of the line.
+        :param int line: Line number.
+        :return: Number of open braces enclosing the start of the line.
+        """
+        return self.depths[line]
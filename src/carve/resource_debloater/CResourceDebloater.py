@@ -6,11 +6,16 @@ C Resource Debloater
 import logging
 import re
 import sys
+from typing import List, Optional, Set
 
 # Third Party Imports
 
 # Local Imports
 from carve.resource_debloater.ResourceDebloater import ResourceDebloater
+from carve.resource_debloater.EditPlan import Edit, EditPlan
+from carve.resource_debloater.CBraceTable import CBraceTable
+from carve.resource_debloater.CSwitchTable import CSwitchTable
+from carve.resource_debloater.ConstructClassifier import ConstructClassifier
 
 
 class CResourceDebloater(ResourceDebloater):
@@ -26,6 +31,9 @@ class CResourceDebloater(ResourceDebloater):
             statement
             cases in a switch statement (aware of fall through mechanics)
     """
+    # If you desire to use a different mapping sequence, it can be adjusted here.
+    ANNOTATION_SEQUENCE = ResourceDebloater.C_ANNOTATION_SEQUENCE
+
     # Regex patterns for identifying constructs
     # They search a trimmed string and are ordered by precedence in get_construct
     # They err on the side of permissiveness, leaving it to the developer to write valid C.
@@ -41,6 +49,25 @@ class CResourceDebloater(ResourceDebloater):
     SWITCH_PAT = r"\sswitch\s*\(.*\)"
     DEFAULT_PAT = r"default\s*:"
 
+    # Start of an annotation, searched for in the whole file at once
+    ANNOTATION_REGEX = re.compile(re.escape(f"{ANNOTATION_SEQUENCE}["))
+
+    # Precompiled classifiers.  CONSTRUCT_CLASSIFIER identifies the construct following an implicit annotation, and can be
+    # extended with additional construct types (which a derived class must then handle in plan_implicit_annotation).
+    # The others classify lines when searching backwards and forwards from an annotated case label.
+    CONSTRUCT_CLASSIFIER = ConstructClassifier([("Case", CASE_CONSTRUCT_PAT),
+                                                ("ElseIfBranch", ELSE_IF_CONSTRUCT_PAT),
+                                                ("IfBranch", IF_CONSTRUCT_PAT),
+                                                ("ElseBranch", ELSE_CONSTRUCT_PAT),
+                                                ("FunctionDefinition", FUNC_CONSTRUCT_PAT),
+                                                ("StructDefinition", STRUCT_CONSTRUCT_PAT)])
+    PREVIOUS_CASE_CLASSIFIER = ConstructClassifier([("Break", BREAK_PAT),
+                                                    ("Switch", SWITCH_PAT),
+                                                    ("Case", CASE_CONSTRUCT_PAT)], default=None)
+    NEXT_CASE_CLASSIFIER = ConstructClassifier([("Case", CASE_CONSTRUCT_PAT),
+                                                ("Default", DEFAULT_PAT),
+                                                ("Break", BREAK_PAT)], default=None)
+
     def __init__(self, location, target_features):
         """
         CResourceDebloater constructor
@@ -48,9 +75,16 @@ class CResourceDebloater(ResourceDebloater):
         :param set target_features: List of features to be debloated from the file.
         """
         super(CResourceDebloater, self).__init__(location, target_features)
-        
-        # If you desire to use a different mapping sequence, it can be adjusted here.
-        self.annotation_sequence = self.C_ANNOTATION_SEQUENCE
+
+        self.annotation_sequence = self.ANNOTATION_SEQUENCE
+
+        # Brace table for the current lines, built on first use by get_brace_table
+        self.brace_table = None
+        self.brace_table_lines = None
+
+        # Switch table for the current lines, built on first use by get_switch_table
+        self.switch_table = None
+        self.switch_table_lines = None
 
     @staticmethod
     def get_construct(line):
@@ -64,46 +98,96 @@ class CResourceDebloater(ResourceDebloater):
             Individual statements
 
         :param str line: line of code immediately following an annotation
-        :return:
+        :return: Name of the construct, "Statement" if no other construct is identified.
         """
-        
-        if re.search(CResourceDebloater.CASE_CONSTRUCT_PAT, line.strip()) is not None:
-            return "Case"
-        elif re.search(CResourceDebloater.ELSE_IF_CONSTRUCT_PAT, " " + line.strip()) is not None:
-            return "ElseIfBranch"
-        elif re.search(CResourceDebloater.IF_CONSTRUCT_PAT, " " + line.strip()) is not None:
-            return "IfBranch"
-        elif re.search(CResourceDebloater.ELSE_CONSTRUCT_PAT, " " + line.strip()) is not None:
-            return "ElseBranch"
-        elif re.search(CResourceDebloater.FUNC_CONSTRUCT_PAT, line.strip()) is not None:
-            return "FunctionDefinition"
-        elif re.search(CResourceDebloater.STRUCT_CONSTRUCT_PAT, line.strip()) is not None:
-            return "StructDefinition"
-        else:
-            return "Statement"
+        return CResourceDebloater.CONSTRUCT_CLASSIFIER.classify(line)
+
+    def with_features(self, target_features: Set[str]) -> "CResourceDebloater":
+        """
+        Returns a copy of the debloater debloating another set of features.  The brace and switch tables of the file are
+        built first, so the copies share them instead of each scanning the file again.
+        :param set target_features: List of features to be debloated from the copy.
+        :return: The copy, sharing the contents, brace table and switch table of the file as read.
+        """
+        self.get_brace_table()
+        self.get_switch_table()
+        return super(CResourceDebloater, self).with_features(target_features)
+
+    def get_brace_table(self) -> CBraceTable:
+        """
+        Returns the brace table for the file's current lines, building it if the lines changed since it was last built.
+        :return: CBraceTable for self.lines.
+        """
+        if self.brace_table is None or self.brace_table_lines is not self.lines:
+            self.brace_table = CBraceTable(self.lines)
+            self.brace_table_lines = self.lines
+        return self.brace_table
+
+    def get_switch_table(self) -> CSwitchTable:
+        """
+        Returns the switch table for the file's current lines, building it if the lines changed since it was last
+        built.
+        :return: CSwitchTable for self.lines.
+        """
+        if self.switch_table is None or self.switch_table_lines is not self.lines:
+            self.switch_table = CSwitchTable(self.lines, self.PREVIOUS_CASE_CLASSIFIER, self.NEXT_CASE_CLASSIFIER)
+            self.switch_table_lines = self.lines
+        return self.switch_table
 
     def process_annotation(self, annotation_line: int) -> None:
         """
-        Processes an implicit or explicit (! and ~) debloating operation annotated at the specified line.
+        Processes an implicit or explicit (! and ~) debloating operation annotated at the specified line, applying its
+        edits immediately.
 
         This debloating module operates largely on a line by line basis. It does NOT support all types of source code
         authoring styles. Many code authoring styles are not supported and will cause errors in debloating. Specifically,
-        the implicit module is style-sensitive. See the documentation of process_implicit_annotation for more.
+        the implicit module is style-sensitive. See the documentation of plan_implicit_annotation for more.
 
         :param int annotation_line: Line where annotation to be processed is located.
         :return: None
         """
+        plan = EditPlan()
+        plan.add(self.plan_annotation(annotation_line, plan))
+        self.apply_plan(plan)
+
+    def plan_annotation(self, annotation_line: int, plan: EditPlan) -> List[Edit]:
+        """
+        Plans an implicit or explicit (! and ~) debloating operation annotated at the specified line.
+
+        :param int annotation_line: Line where annotation to be processed is located.
+        :param EditPlan plan: Edits already planned for earlier annotations in the file.
+        :return: List of edits debloating the annotation.
+        """
         # Check the annotation line for explicit cues ! and ~
         last_char = self.lines[annotation_line].strip()[-1]
         is_explicit_annotation = last_char in {"~", "!"}
         if is_explicit_annotation:
-            self.process_explicit_annotation(annotation_line)
+            return self.plan_explicit_annotation(annotation_line)
         else:
-            self.process_implicit_annotation(annotation_line)
+            return self.plan_implicit_annotation(annotation_line, plan)
 
+    def annotation_construct(self, annotation_line: int) -> str:
+        """
+        Names the construct debloated by the annotation at the specified line, for reporting.
+        :param int annotation_line: Line where the annotation is located.
+        :return: "File" or "Segment" for explicit annotations, otherwise the construct following the annotation.
+        """
+        if self.lines[annotation_line].strip()[-1:] in {"~", "!"}:
+            return super(CResourceDebloater, self).annotation_construct(annotation_line)
+        return self.CONSTRUCT_CLASSIFIER.classify(self.lines[annotation_line + 1])
 
     def process_implicit_annotation(self, annotation_line: int) -> None:
-            """Processes an implicit annotation
+        """
+        Processes an implicit annotation, applying its edits immediately.  See plan_implicit_annotation.
+        :param int annotation_line: Line where annotation to be processed is located.
+        :return: None
+        """
+        plan = EditPlan()
+        plan.add(self.plan_implicit_annotation(annotation_line, plan))
+        self.apply_plan(plan)
+
+    def plan_implicit_annotation(self, annotation_line: int, plan: Optional[EditPlan] = None) -> List[Edit]:
+            """Plans an implicit annotation
 
             The C implicit annotation processor expects a particular style. This is a list of what is not supported,
             although it is not exhaustive:
@@ -153,44 +237,30 @@ class CResourceDebloater(ResourceDebloater):
             ```
             Not Supported: Annotated implicit lines that have non-ASCII identifiers.
             Not Supported: Anonymous structs.
+
+            :param int annotation_line: Line where annotation to be processed is located.
+            :param EditPlan plan: Edits already planned for earlier annotations in the file.  Lines they remove are
+                ignored when looking back for the previous case of a switch.
+            :return: List of edits debloating the annotation.
             """
             # Look at next line to determine the implicit construct
             construct_line = annotation_line + 1
-            construct = CResourceDebloater.get_construct(self.lines[construct_line])
+            construct = self.CONSTRUCT_CLASSIFIER.classify(self.lines[construct_line])
 
             # Process implicit annotation based on construct identified
             if construct == "FunctionDefinition" or construct == "StructDefinition" or construct == "ElseBranch":
                 # Function definitions, struct definitions, else branches are simple block removals.
-                search_line = construct_line
-                open_brace_counted = False
-                brace_count = 0
-                block_end = None
-
-                while search_line < len(self.lines):
-                    brace_count += self.lines[search_line].count("{")
-
-                    if open_brace_counted is False and brace_count > 0:
-                        open_brace_counted = True
+                block = self.get_brace_table().block_after(construct_line)
 
-                    brace_count -= self.lines[search_line].count("}")
-
-                    if open_brace_counted is True and brace_count == 0:
-                        block_end = search_line
-                        break
-                    else:
-                        search_line += 1
-
-                if block_end is None:
-                    logging.error("Error finding end of code block annotated on line " + str(annotation_line) +
-                                  ".  Marking location and skipping this annotation.")
-                    self.lines.insert(annotation_line + 1,
-                                      f"{self.annotation_sequence} Block NOT removed due to lack of termination brace.\n")
+                if block is None:
+                    logging.error("Error finding end of code block annotated on line %d.  Marking location and "
+                                  "skipping this annotation.", annotation_line)
+                    return [Edit(annotation_line + 1, annotation_line + 1,
+                                 [f"{self.annotation_sequence} Block NOT removed due to lack of termination brace.\n"])]
                 else:
-                    while block_end != annotation_line:
-                        self.lines.pop(block_end)
-                        block_end -= 1
-                    self.lines[annotation_line] = f"{self.annotation_sequence} Code Block Debloated.\n"
-                    self.lines.insert(annotation_line + 1, "\n")
+                    block_end = block[1]
+                    return [Edit(annotation_line, block_end + 1,
+                                 [f"{self.annotation_sequence} Code Block Debloated.\n", "\n"])]
 
             elif construct == "IfBranch" or construct == "ElseIfBranch":
                 # Removing an If or and Else If branch can result in inadvertent execution of an else block if they are
@@ -198,115 +268,75 @@ class CResourceDebloater(ResourceDebloater):
                 # to ensure sound operation of the debloated code. Ultimately, the condition check will more than likely
                 # be eliminated by the compiler, so modifying the conditions in source is unnecessarily dangerous.
 
-                # Function definitions, struct definitions, else branches are simple block removals.
-                search_line = construct_line
-                open_brace_counted = False
-                brace_count = 0
-                block_end = None
-                open_brace_line = None
-
-                while search_line < len(self.lines):
-                    brace_count += self.lines[search_line].count("{")
-
-                    if open_brace_counted is False and brace_count > 0:
-                        open_brace_counted = True
-                        open_brace_line = search_line
+                block = self.get_brace_table().block_after(construct_line)
 
-                    brace_count -= self.lines[search_line].count("}")
-
-                    if open_brace_counted is True and brace_count == 0:
-                        block_end = search_line
-                        break
-                    else:
-                        search_line += 1
-
-                if block_end is None:
-                    logging.error("Error finding end of code block annotated on line " + str(annotation_line) +
-                                  ".  Marking location and skipping this annotation.")
-                    self.lines.insert(annotation_line + 1,
-                                      f"{self.annotation_sequence} Block NOT removed due to lack of termination brace.\n")
+                if block is None:
+                    logging.error("Error finding end of code block annotated on line %d.  Marking location and "
+                                  "skipping this annotation.", annotation_line)
+                    return [Edit(annotation_line + 1, annotation_line + 1,
+                                 [f"{self.annotation_sequence} Block NOT removed due to lack of termination brace.\n"])]
                 else:
                     # Remove the code on line after open curly brace, and before the closing curly brace.
                     # Need this in case the braces aren't on their own line.
                     # Remove lines in bedtween the open and close curly brace.
-                    block_end -= 1
-                    while block_end != open_brace_line:
-                        self.lines.pop(block_end)
-                        block_end -= 1
-                    self.lines[annotation_line] = f"{self.annotation_sequence} If / Else If Code Block Debloated.\n"
+                    open_brace_line, block_end = block
+                    edits = [Edit(annotation_line, annotation_line + 1,
+                                  [f"{self.annotation_sequence} If / Else If Code Block Debloated.\n"])]
+                    if block_end > open_brace_line + 1:
+                        edits.append(Edit(open_brace_line + 1, block_end, []))
+                    return edits
 
             elif construct == "Case":
                 # Removing a case statement requires checking for fall through logic:
                 # If the previous case has a break, the case be removed.
                 # If the previous case doesn't have a break, then only the case label can be removed.
 
-                # Search backwards from the annotation, see if a break or a case is found first.
-                search_line = annotation_line - 1
-                previous_break = None
-
-                while search_line >= 0:
-                    if re.search(CResourceDebloater.BREAK_PAT, " " + self.lines[search_line].strip()) is not None or \
-                       re.search(CResourceDebloater.SWITCH_PAT, " " + self.lines[search_line].strip()) is not None:
-                        previous_break = True
-                        break
-                    elif re.search(CResourceDebloater.CASE_CONSTRUCT_PAT, self.lines[search_line].strip()) is not None:
-                        previous_break = False
-                        break
-                    else:
-                        search_line -= 1
+                # Look backwards from the annotation, see if a break or a case is found first (ignoring lines already
+                # removed by an earlier annotation).
+                falls_through = self.get_switch_table().falls_through(annotation_line, plan)
 
                 # Log an error and skip if switch statement behavior cannot be determined
-                if previous_break is None:
-                    logging.error("Error finding previous case or switch for case on line " + str(annotation_line) +
-                                  ".  Marking location and skipping this annotation.")
-                    self.lines.insert(annotation_line + 1,
-                                      f"{self.annotation_sequence} Case NOT removed due to lack of switch or previous case.\n")
+                if falls_through is None:
+                    logging.error("Error finding previous case or switch for case on line %d.  Marking location and "
+                                  "skipping this annotation.", annotation_line)
+                    return [Edit(annotation_line + 1, annotation_line + 1,
+                                 [f"{self.annotation_sequence} Case NOT removed due to lack of switch or previous case.\n"])]
 
                 # If previous case has fall through logic, only the case label can be deleted.
-                elif previous_break is False:
-                    self.lines[annotation_line] = f"{self.annotation_sequence} Case Label Debloated.\n"
-                    self.lines[construct_line] = "\n"
+                elif falls_through:
+                    return [Edit(annotation_line, construct_line + 1,
+                                 [f"{self.annotation_sequence} Case Label Debloated.\n", "\n"])]
 
                 # If the previous case does not have fall through logic, then search for next break, case, or default
-                elif previous_break is True:
+                else:
                     case_end = None
-                    search_line = construct_line + 1
-                    brace_count = self.lines[construct_line].count("{")
-
-                    while search_line < len(self.lines):
-                        brace_count += self.lines[search_line].count("{")
-                        brace_count -= self.lines[search_line].count("}")
-
-                        if re.search(CResourceDebloater.CASE_CONSTRUCT_PAT, self.lines[search_line].strip()) is not None or \
-                           re.search(CResourceDebloater.DEFAULT_PAT, self.lines[search_line].strip()) is not None or \
-                           brace_count < 0:
-                            case_end = search_line - 1
+                    # The case ends at the latest on the line closing the switch block
+                    switch_end = self.get_brace_table().enclosing_close(construct_line)
+                    stop = self.get_switch_table().case_stop(construct_line + 1, switch_end)
+
+                    if stop is not None:
+                        stop_line, is_break = stop
+                        if is_break:
+                            case_end = stop_line
+                        else:
+                            case_end = stop_line - 1
 
                             # Check that the line before the next case (or default) isn't a debloating annotation.
                             if self.lines[case_end].find(f"{self.annotation_sequence}[") > -1:
                                 case_end -= 1
-                            break
-                        elif re.search(CResourceDebloater.BREAK_PAT, " " + self.lines[search_line].strip()) is not None:
-                            case_end = search_line
-                            break
-                        else:
-                            search_line += 1
 
                     if case_end is None:
-                        logging.error("No end of switch block found for case annotation on line " + str(annotation_line)
-                                      + ".  Marking location and skipping this annotation.")
-                        self.lines.insert(annotation_line + 1,
-                                          f"{self.annotation_sequence} Case block NOT removed due to failure to identify end of block.\n")
+                        logging.error("No end of switch block found for case annotation on line %d.  Marking location "
+                                      "and skipping this annotation.", annotation_line)
+                        return [Edit(annotation_line + 1, annotation_line + 1,
+                                     [f"{self.annotation_sequence} Case block NOT removed due to failure to identify end of block.\n"])]
                     else:
-                        while case_end != annotation_line:
-                            self.lines.pop(case_end)
-                            case_end -= 1
-                        self.lines[annotation_line] = f"{self.annotation_sequence} Case Block Debloated.\n"
-                        self.lines.insert(annotation_line + 1, "\n")
+                        return [Edit(annotation_line, case_end + 1,
+                                     [f"{self.annotation_sequence} Case Block Debloated.\n", "\n"])]
 
             elif construct == "Statement":
-                self.lines[annotation_line] = f"{self.annotation_sequence} Statement Debloated.\n"
-                self.lines[construct_line] = "\n"
+                return [Edit(annotation_line, construct_line + 1,
+                             [f"{self.annotation_sequence} Statement Debloated.\n", "\n"])]
             else:
                 # Log error and exit
                 logging.error("Unexpected construct encountered when processing implicit annotation.  Exiting.")
@@ -317,18 +347,19 @@ class CResourceDebloater(ResourceDebloater):
         Iterates through the file and debloats the selected features subject to dependency constraints
         :return: None
         """
-        logging.info(f"Beginning debloating pass on {self.location}")
+        logging.info("Beginning debloating pass on %s", self.location)
 
         # Search the source code for debloater annotations, and process them.
-        current_line = 0
+        self.debloat_annotations(self.find_annotations())
 
-        while current_line < len(self.lines):
-            if self.lines[current_line].find(f"{self.annotation_sequence}[") > -1:
-                logging.info("Annotation found on line " + str(current_line))
-
-                feature_set = CResourceDebloater.get_features(self.lines[current_line])
+    def find_annotations(self):
+        """
+        Searches the source code for annotations whose features are all selected for debloating.
+        :return: Generator of the line numbers of the annotations, in ascending order.
+        """
+        for current_line, _ in self.find_matching_lines(self.get_code(), self.ANNOTATION_REGEX):
+            logging.info("Annotation found on line %d", current_line)
+            self.annotations_found += 1
 
-                if self.target_features.issuperset(feature_set):
-                    logging.info("Processing annotation found on line " + str(current_line))
-                    self.process_annotation(current_line)
-            current_line += 1
+            if self.debloats_annotation(self.lines[current_line]):
+                yield current_line
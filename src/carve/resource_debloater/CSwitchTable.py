@@ -0,0 +1,113 @@
+"""
+C Switch Table
+"""
+
+# Standard Library Imports
+import bisect
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Third Party Imports
+
+# Local Imports
+from carve.resource_debloater.ConstructClassifier import ConstructClassifier
+from carve.resource_debloater.EditPlan import EditPlan
+
+
+class CSwitchTable(object):
+    """
+    The CSwitchTable class indexes the structure of the switch statements of a C source file: the lines holding switch
+    heads, case and default labels and breaks.  It is built with a single pass over the file, so debloating a case
+    label looks up the previous break (deciding whether the case can fall through from the case before it) and the end
+    of the case instead of scanning the lines around every annotated case.
+
+    Lines are classified exactly as when scanning: backwards from a case label, the nearest line holding a break or a
+    switch head means the previous case cannot fall through and the nearest line holding a case label means it can;
+    forwards, the case ends before the next case or default label (or the line closing the switch block), or at the next
+    break.
+    """
+    # Lines that may hold a switch head, case or default label or break.  Lines without any of these words are never
+    # classified.
+    KEYWORD_PAT = re.compile(r"case|break|switch|default")
+
+    def __init__(self, lines: Sequence[str], previous_classifier: ConstructClassifier,
+                 next_classifier: ConstructClassifier):
+        """
+        CSwitchTable constructor
+        :param list lines: Lines of the C source file.
+        :param ConstructClassifier previous_classifier: Classifier of lines before a case label ("Break", "Switch" or
+            "Case").
+        :param ConstructClassifier next_classifier: Classifier of lines after a case label ("Case", "Default" or
+            "Break").
+        """
+        # Ascending lines classified by previous_classifier, and the construct found on each
+        self.previous_lines: List[int] = []
+        self.previous_constructs: List[str] = []
+        # Ascending lines classified by next_classifier, and the construct found on each
+        self.next_lines: List[int] = []
+        self.next_constructs: List[str] = []
+
+        # Lines removed by a plan stay removed as more edits are planned, so looking back past them once is enough:
+        # for each entry of previous_lines found to be removed by skip_plan, the entry to resume looking back from.
+        self.skip_plan = None
+        self.skips: Dict[int, int] = {}
+
+        search = self.KEYWORD_PAT.search
+        for line_number, line in enumerate(lines):
+            if search(line) is None:
+                continue
+            construct = previous_classifier.classify(line)
+            if construct is not None:
+                self.previous_lines.append(line_number)
+                self.previous_constructs.append(construct)
+            construct = next_classifier.classify(line)
+            if construct is not None:
+                self.next_lines.append(line_number)
+                self.next_constructs.append(construct)
+
+    def falls_through(self, line: int, plan: Optional[EditPlan] = None) -> Optional[bool]:
+        """
+        Determines whether the case before a case label can fall through into it.
+        :param int line: Line of the case label's annotation (the search starts on the line before it).
+        :param EditPlan plan: Edits already planned for the file.  Lines they remove are ignored.
+        :return: False if a break or switch head is found first, True if a case label is found first, and None if
+            neither is found.
+        """
+        if plan is not self.skip_plan:
+            self.skip_plan = plan
+            self.skips = {}
+
+        index = bisect.bisect_left(self.previous_lines, line) - 1
+        skipped = []
+        while index >= 0:
+            if index in self.skips:
+                skipped.append(index)
+                index = self.skips[index]
+                continue
+            covering_start = None if plan is None else plan.covering_start(self.previous_lines[index])
+            if covering_start is None:
+                break
+            # Skip every line removed by the same edit at once
+            skipped.append(index)
+            index = bisect.bisect_left(self.previous_lines, covering_start, 0, index) - 1
+
+        for removed in skipped:
+            self.skips[removed] = index
+        return None if index < 0 else self.previous_constructs[index] == "Case"
+
+    def case_stop(self, line: int, switch_end: Optional[int]) -> Optional[Tuple[int, bool]]:
+        """
+        Finds the line a case stops at: the next case or default label, the line closing the switch block, or the next
+        break, whichever comes first.
+        :param int line: First line after the case label.
+        :param int switch_end: Line closing the switch block, or None if it is unknown.
+        :return: Tuple of the line and whether it is a break (which belongs to the case, unlike the other lines), or
+            None if the case does not stop.
+        """
+        index = bisect.bisect_left(self.next_lines, line)
+        marker = self.next_lines[index] if index < len(self.next_lines) else None
+        if switch_end is not None and switch_end >= line and (marker is None or switch_end <= marker):
+            return switch_end, False
+        if marker is None:
+            return None
+        return marker, self.next_constructs[index] == "Break"
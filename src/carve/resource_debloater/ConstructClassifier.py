@@ -0,0 +1,81 @@
+"""
+Construct Classifier
+"""
+
+# Standard Library Imports
+import re
+from typing import Iterable, Optional, Tuple
+
+# Third Party Imports
+
+# Local Imports
+
+
+class ConstructClassifier(object):
+    """
+    The ConstructClassifier class identifies the source code construct on a line using an ordered list of
+    (construct name, regex pattern) pairs.  A line is classified as the first construct (in precedence order) whose
+    pattern is found anywhere in the line, or as the default construct if none are found.
+
+    All patterns are combined into a single precompiled regex, so classifying a line takes one match call regardless of
+    the number of constructs.  Additional construct types can be registered with add_construct; a debloater using the
+    classifier must then also know how to process the new construct.
+
+    Patterns are searched in the trimmed line with a single space prepended, so a pattern may require whitespace (\\s)
+    before a keyword at the start of the line.
+    """
+
+    def __init__(self, constructs: Iterable[Tuple[str, str]] = (), default: Optional[str] = "Statement"):
+        """
+        ConstructClassifier constructor
+        :param constructs: (construct name, regex pattern) pairs, in order of precedence.
+        :param str default: Construct returned for lines that match no pattern.
+        """
+        self.constructs = list(constructs)
+        self.default = default
+        self.regex = None
+        self.group_constructs = {}
+        self.compile()
+
+    def compile(self) -> None:
+        """
+        Combines the construct patterns into a single regex.  Each pattern becomes a lookahead alternative anchored at
+        the start of the line, so alternatives are tried in precedence order and the first one found wins.
+        :return: None
+        """
+        alternatives = []
+        self.group_constructs = {}
+        group = 1
+        for name, pattern in self.constructs:
+            alternatives.append(f"((?=.*?(?:{pattern})))")
+            self.group_constructs[group] = name
+            group += 1 + re.compile(pattern).groups
+        self.regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def add_construct(self, name: str, pattern: str, before: Optional[str] = None) -> None:
+        """
+        Registers an additional construct type.
+        :param str name: Name returned for lines containing the construct.
+        :param str pattern: Regex pattern identifying the construct.
+        :param str before: Name of an existing construct the new one takes precedence over.  By default the new
+            construct has the lowest precedence.
+        :return: None
+        """
+        position = len(self.constructs)
+        if before is not None:
+            position = [existing for existing, _ in self.constructs].index(before)
+        self.constructs.insert(position, (name, pattern))
+        self.compile()
+
+    def classify(self, line: str) -> Optional[str]:
+        """
+        Classifies a line of code.
+        :param str line: line of code to classify.
+        :return: Name of the construct found on the line, or the default construct.
+        """
+        if self.regex is None:
+            return self.default
+        match = self.regex.match(" " + line.strip())
+        if match is None:
+            return self.default
+        return self.group_constructs[match.lastindex]
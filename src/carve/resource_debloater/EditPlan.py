@@ -0,0 +1,130 @@
+"""
+Edit Plan
+"""
+
+# Standard Library Imports
+import bisect
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+# Third Party Imports
+
+# Local Imports
+from carve.resource_debloater.LineBuffer import LineBuffer
+
+
+class Edit(NamedTuple):
+    """
+    A planned change to a file: the lines in [start, end) are replaced by the replacement lines.  An edit with
+    start == end inserts the replacement lines before line start.
+    """
+    start: int
+    end: int
+    replacement: List[str]
+
+
+class EditPlan(object):
+    """
+    The EditPlan class collects the edits produced by processing a file's annotations, and applies all of them to the
+    file's lines in a single pass.  Annotations are planned against the original lines, so no line numbers shift while
+    the plan is being built.
+
+    Edits are accepted in groups (one group per annotation).  A group that overlaps an edit which has already been
+    accepted is rejected as a whole, which merges nested annotations (such as an annotated statement inside an
+    annotated function) into the enclosing one, exactly as processing the annotations one after the other would.
+    """
+
+    def __init__(self):
+        """
+        EditPlan constructor
+        """
+        # Accepted edits, sorted by (start, end, order of acceptance).  Accepted edits never overlap, so the ends are
+        # sorted as well.
+        self.keys = []
+        self.edits = []
+
+    def __len__(self) -> int:
+        """
+        :return: Number of accepted edits.
+        """
+        return len(self.edits)
+
+    def conflicts(self, edit: Edit) -> bool:
+        """
+        Checks whether the edit overlaps an accepted edit.  Insertions only overlap ranges that strictly contain them.
+        :param Edit edit: Edit to check.
+        :return: True if the edit overlaps an accepted edit.
+        """
+        # The accepted edit with the greatest start before this edit's end also has the greatest end.
+        index = bisect.bisect_left(self.keys, (edit.end,)) - 1
+        return index >= 0 and edit.start < self.edits[index].end
+
+    def covers(self, line: int) -> bool:
+        """
+        Checks whether the line is removed or replaced by an accepted edit.
+        :param int line: Line number in the original file.
+        :return: True if the line is covered by an accepted edit.
+        """
+        index = bisect.bisect_right(self.keys, (line, float("inf"))) - 1
+        return index >= 0 and line < self.edits[index].end
+
+    def covering_start(self, line: int) -> Optional[int]:
+        """
+        Finds the first line of the accepted edit covering the line, so searches can skip over removed code.
+        :param int line: Line number in the original file.
+        :return: Start of the edit covering the line, or None if the line is not covered.
+        """
+        index = bisect.bisect_right(self.keys, (line, float("inf"))) - 1
+        if index >= 0 and line < self.edits[index].end:
+            return self.edits[index].start
+        return None
+
+    def add(self, edits: Iterable[Edit]) -> bool:
+        """
+        Accepts a group of edits, unless one of them overlaps an edit that has already been accepted.
+        :param edits: Edits produced by processing a single annotation.
+        :return: True if the edits were accepted.
+        """
+        edits = list(edits)
+        if any(self.conflicts(edit) for edit in edits):
+            return False
+
+        for edit in edits:
+            key = (edit.start, edit.end, len(self.keys))
+            index = bisect.bisect_right(self.keys, key)
+            self.keys.insert(index, key)
+            self.edits.insert(index, edit)
+        return True
+
+    def apply(self, lines: Sequence[str]) -> Sequence[str]:
+        """
+        Applies the accepted edits to the lines they were planned against.  The edits to a LineBuffer are assembled
+        from slices of its text into a new LineBuffer, without splitting the text into lines.
+        :param lines: Original lines of the file, as a list or a LineBuffer.
+        :return: New list of lines (or LineBuffer) with every edit applied.
+        """
+        if isinstance(lines, LineBuffer):
+            return LineBuffer(self.apply_text(lines))
+
+        output = []
+        position = 0
+        for edit in self.edits:
+            output.extend(lines[position:edit.start])
+            output.extend(edit.replacement)
+            position = edit.end
+        output.extend(lines[position:])
+        return output
+
+    def apply_text(self, buffer: LineBuffer) -> str:
+        """
+        Applies the accepted edits to the buffer they were planned against.
+        :param LineBuffer buffer: Original contents of the file.
+        :return: Contents of the file with every edit applied.
+        """
+        parts = []
+        position = 0
+        for edit in self.edits:
+            parts.append(buffer.span(position, edit.start))
+            parts.extend(edit.replacement)
+            position = edit.end
+        parts.append(buffer.span(position, len(buffer)))
+        return "".join(parts)
@@ -0,0 +1,104 @@
+"""
+Feature Masks
+"""
+
+# Standard Library Imports
+from typing import Callable, Collection, Dict, Iterable, Set
+
+# Third Party Imports
+
+# Local Imports
+
+
+class FeatureMasks(object):
+    """
+    The FeatureMasks class encodes sets of features as integer bit masks, so checking whether every feature of an
+    annotation is selected for debloating is a single AND and compare instead of building and comparing sets.
+
+    Each feature (or feature group) name is given a bit the first time it is seen, whether in the features selected for
+    debloating or in an annotation.  The mask of each distinct annotation is parsed once and memoized, so annotations
+    repeated within and across files share a single mask.  Masks are only meaningful within the FeatureMasks instance
+    (and so the process) that built them, and within the same generation: once MAX_BITS features (or twice as many as
+    are selected for debloating, if more) have been seen, the bits are reassigned from scratch the next time the mask of
+    the features selected for debloating is built, and the generation is incremented so masks built earlier are rebuilt
+    rather than compared against the new bits.
+    """
+
+    # Number of distinct annotations memoized before the memo is emptied, bounding the memory of long running processes
+    MAX_ANNOTATIONS = 65536
+
+    # Number of features given a bit before the bits are reassigned, bounding the width of masks in long running
+    # processes (such as `carve serve`) seeing the features of many configurations
+    MAX_BITS = 1024
+
+    def __init__(self, parse: Callable[[str], Set[str]]):
+        """
+        FeatureMasks constructor
+        :param parse: Function returning the set of features named by an annotation.
+        """
+        self.parse = parse
+        self.bits: Dict[str, int] = {}
+        self.annotations: Dict[str, int] = {}
+        self.generation = 0
+
+    def bit(self, feature: str) -> int:
+        """
+        Returns the bit of a feature, assigning the next free bit to features not seen before.
+        :param str feature: Name of the feature.
+        :return: Integer with only the feature's bit set.
+        """
+        bit = self.bits.get(feature)
+        if bit is None:
+            bit = 1 << len(self.bits)
+            self.bits[feature] = bit
+        return bit
+
+    def mask(self, features: Iterable[str]) -> int:
+        """
+        Encodes a set of features.
+        :param features: Names of the features.
+        :return: Integer with the bit of each feature set.
+        """
+        mask = 0
+        for feature in features:
+            mask |= self.bit(feature)
+        return mask
+
+    def target_mask(self, features: Collection[str]) -> int:
+        """
+        Encodes the features selected for debloating.  Bits are only reassigned here, before a debloater starts checking
+        annotations against the mask, so masks of the current generation stay consistent while they are in use.  The
+        limit grows with the number of features selected, so selections of MAX_BITS features or more still share their
+        bits and the annotation memo across files.
+        :param features: Names of the features selected for debloating.
+        :return: Integer with the bit of each feature set, valid until the generation changes.
+        """
+        if len(self.bits) >= max(self.MAX_BITS, 2 * len(features)):
+            self.bits.clear()
+            self.annotations.clear()
+            self.generation += 1
+        return self.mask(features)
+
+    def annotation_mask(self, annotation: str) -> int:
+        """
+        Encodes the features named by an annotation, parsing each distinct annotation only once.
+        :param str annotation: Line (or comment) containing the annotation.
+        :return: Integer with the bit of each feature of the annotation set.
+        """
+        mask = self.annotations.get(annotation)
+        if mask is None:
+            if len(self.annotations) >= self.MAX_ANNOTATIONS:
+                self.annotations.clear()
+            mask = self.mask(self.parse(annotation))
+            self.annotations[annotation] = mask
+        return mask
+
+    def selects(self, annotation: str, target_mask: int) -> bool:
+        """
+        Checks whether every feature of an annotation is selected for debloating.
+        :param str annotation: Line (or comment) containing the annotation.
+        :param int target_mask: Mask of the features selected for debloating.
+        :return: True if the annotation's features are a subset of the selected features.
+        """
+        mask = self.annotation_mask(annotation)
+        return mask & target_mask == mask
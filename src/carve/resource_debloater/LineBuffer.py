@@ -0,0 +1,160 @@
+"""
+Line Buffer
+"""
+
+# Standard Library Imports
+import sys
+from array import array
+from itertools import accumulate, islice
+from typing import Iterator, List, Optional, Sequence, Union, overload
+
+# Third Party Imports
+
+# Local Imports
+
+# Offsets of texts shorter than this fit in an array('I'), taking half the memory of an array('Q')
+NARROW_OFFSET_LIMIT = 1 << (8 * array("I").itemsize)
+
+
+class LineBuffer(Sequence):
+    """
+    The LineBuffer class holds the contents of a file as a single string plus an array of the offsets at which its lines
+    start, and exposes the lines as a read-only sequence.  Lines are only sliced out of the string when they are
+    accessed, so a file costs its text and 4 (8 for texts of 4 GiB or more) bytes per line instead of one string object
+    (and one list entry) per line, and debloated contents are assembled from slices of the text without ever splitting
+    it.  The offsets themselves are only computed once a line is first accessed.
+
+    Lines keep their line terminators and are split exactly as file.readlines() splits them: after each "\\n", with a
+    last line without a terminator if the text does not end with one.
+    """
+
+    # Characters of text split into lines at once when computing the offsets, bounding the memory of the split
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, text: str, starts: Optional[array] = None):
+        """
+        LineBuffer constructor
+        :param str text: Contents of the file, with universal newlines already translated.
+        :param array starts: Offsets of the starts of the lines in text, computed from the text when needed if not given.
+        """
+        self.text = text
+        self._starts = starts
+
+    @property
+    def starts(self) -> array:
+        """
+        Offsets of the starts of the lines in the text, computed on first use.
+        :return: array of the offset of each line, in order.
+        """
+        if self._starts is None:
+            self._starts = self.line_starts(self.text)
+        return self._starts
+
+    @classmethod
+    def line_starts(cls, text: str) -> array:
+        """
+        Finds the offsets at which the lines of a text start.  The text is split a chunk at a time and the offsets are
+        accumulated from the lengths of the lines, without looping over the lines in Python.
+        :param str text: The text.
+        :return: array('I') (array('Q') for texts of 4 GiB or more) of the offset of each line, in order.
+        """
+        end = len(text)
+        starts = array("I" if end < NARROW_OFFSET_LIMIT else "Q")
+        if not text:
+            return starts
+        starts.append(0)
+        position = 0
+        while position < end:
+            stop = text.find("\n", min(position + cls.CHUNK_SIZE, end) - 1)
+            stop = end if stop < 0 else stop + 1
+            lines = text[position:stop].split("\n")
+            # The last part follows the chunk's last "\n" (and is empty unless the text does not end with one)
+            lines.pop()
+            starts.extend(islice(accumulate(map((1).__add__, map(len, lines)), initial=position), 1, None))
+            position = stop
+        if starts[-1] == end:
+            starts.pop()
+        return starts
+
+    def offset(self, line: int) -> int:
+        """
+        Returns the offset at which a line starts.
+        :param int line: Line number, up to and including the number of lines (the end of the text).
+        :return: Offset of the line in the text.
+        """
+        return self.starts[line] if line < len(self.starts) else len(self.text)
+
+    def span(self, start: int, end: int) -> str:
+        """
+        Returns the text of a range of lines, as a single string.
+        :param int start: First line of the range.
+        :param int end: Line after the last line of the range.
+        :return: Text of the lines in [start, end).
+        """
+        return self.text[self.offset(start):self.offset(max(start, end))]
+
+    def memory_bytes(self) -> int:
+        """
+        Estimates the memory held by the buffer.
+        :return: Size in bytes of the text and the line offsets (if they were computed).
+        """
+        return sys.getsizeof(self.text) + (0 if self._starts is None else sys.getsizeof(self._starts))
+
+    def __len__(self) -> int:
+        """
+        :return: Number of lines.
+        """
+        return len(self.starts)
+
+    @overload
+    def __getitem__(self, index: int) -> str:
+        """Returns a line, with its terminator."""
+
+    @overload
+    def __getitem__(self, index: slice) -> List[str]:
+        """Returns a list of the lines of a slice."""
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        """
+        Returns a line, or a list of the lines of a slice.
+        :param index: Line number or slice of line numbers.
+        :return: The line, with its terminator, or a list of lines.
+        """
+        if isinstance(index, slice):
+            return [self[line] for line in range(*index.indices(len(self.starts)))]
+        if index < 0:
+            index += len(self.starts)
+        if not 0 <= index < len(self.starts):
+            raise IndexError("line index out of range")
+        return self.text[self.starts[index]:self.offset(index + 1)]
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Iterates over the lines, in order.
+        """
+        text = self.text
+        starts = self.starts
+        for line in range(len(starts)):
+            yield text[starts[line]:starts[line + 1] if line + 1 < len(starts) else len(text)]
+
+
+def memory_bytes(*buffers: Union[None, str, Sequence[str]]) -> int:
+    """
+    Estimates the memory held by the contents of a file in its various forms.  Text shared between buffers (such as the
+    contents read from disk and the LineBuffer built over them) is only counted once.
+    :param buffers: Strings, LineBuffers or lists of lines (None is ignored).
+    :return: Size in bytes of the buffers.
+    """
+    total = 0
+    texts = set()
+    for buffer in buffers:
+        if isinstance(buffer, LineBuffer):
+            total += buffer.memory_bytes() - sys.getsizeof(buffer.text)
+            buffer = buffer.text
+        if isinstance(buffer, str):
+            if id(buffer) not in texts:
+                texts.add(id(buffer))
+                total += sys.getsizeof(buffer)
+        elif buffer is not None:
+            total += sys.getsizeof(buffer) + sum(sys.getsizeof(line) for line in buffer)
+    return total
@@ -2,12 +2,13 @@
 Python Implicit Annotation Debloater
 """
 
+import collections
 import re
 import libcst as cst
 import libcst.matchers as m
-from typing import Set, Union
+from typing import Dict, List, Optional, Set, Tuple, Union
 from carve.resource_debloater.ResourceDebloater import ResourceDebloater
-from libcst._nodes.internal import CodegenState
+from libcst._nodes.internal import CodegenState, visit_optional, visit_required
 import logging
 
 class EmptyLineStatement(cst.EmptyLine):
@@ -27,32 +28,121 @@ class EmptyLineStatement(cst.EmptyLine):
             comment._codegen(state)
         self.newline._codegen(state)
 
+    def _visit_and_replace_children(self, visitor) -> "EmptyLineStatement":
+        """Original EmptyLine._visit_and_replace_children(), keeping the node's class
+
+        EmptyLine rebuilds itself as a plain EmptyLine, which cannot be generated inside a
+        SimpleStatementLine. Keeping the class lets a debloated statement survive later
+        traversals, such as debloating the branch of an enclosing if statement."""
+        return EmptyLineStatement(
+            indent=self.indent,
+            whitespace=visit_required(self, "whitespace", self.whitespace, visitor),
+            comment=visit_optional(self, "comment", self.comment, visitor),
+            newline=visit_required(self, "newline", self.newline, visitor),
+        )
+
+# Nodes debloated when directly preceded by an implicit annotation
+ANNOTATED_NODES = (cst.FunctionDef, cst.If, cst.Else, cst.ClassDef, cst.SimpleStatementLine)
+
+# Fields of compound statements, their clauses and blocks holding nested blocks, statements and clauses.  Expressions
+# and small statements never contain annotated nodes.
+STATEMENT_FIELDS = ("body", "orelse", "handlers", "finalbody", "cases")
+
+# Fields searched for annotated nodes by node type, None for types never containing them (see searched_fields)
+_SEARCHED_FIELDS: Dict[type, Optional[Tuple[str, ...]]] = {}
+
+
+def searched_fields(node_type: type) -> Optional[Tuple[str, ...]]:
+    """Return the fields of a node type searched for annotated nodes, or None if nodes of the type are not searched
+
+    Computed once per type, as checking the abstract base classes of every node is slow."""
+    if node_type not in _SEARCHED_FIELDS:
+        if not issubclass(node_type, cst.CSTNode) or issubclass(node_type, (cst.BaseSmallStatement,
+                                                                             cst.BaseExpression)):
+            _SEARCHED_FIELDS[node_type] = None
+        else:
+            _SEARCHED_FIELDS[node_type] = tuple(field for field in STATEMENT_FIELDS
+                                                if field in node_type.__dataclass_fields__)
+    return _SEARCHED_FIELDS[node_type]
+
+
 class PythonImplicitDebloater(cst.CSTTransformer):
-    """Transformer for debloating Python code with implicit annotations"""
+    """Transformer for debloating Python code with implicit annotations
+
+    Before transforming, the tree is searched for annotated nodes through statements only, and the transform then only
+    descends into the nodes enclosing them.  Every other node is left as it is without visiting its children, so the
+    cost of the transform follows the number of annotations rather than the size of the file."""
+
+    # Comments that are implicit annotations
+    ANNOTATION_REGEX = re.compile(rf"^\s*{re.escape(ResourceDebloater.PYTHON_ANNOTATION_SEQUENCE)}\[.*\]\s*$")
+
     def __init__(self, features: Set[str]):
         self.features = features
+        self.target_mask = ResourceDebloater.FEATURE_MASKS.target_mask(features)
         self.annotation_sequence = ResourceDebloater.PYTHON_ANNOTATION_SEQUENCE
-
+        # Number of annotations debloated, by construct
+        self.processed = collections.Counter()
+        # Whether each distinct comment seen is an implicit annotation with only target features
+        self.verdicts: Dict[str, bool] = {}
+        # Node the transform started from, and ids of the nodes enclosing annotated nodes below it
+        self.root = None
+        self.enclosing: Set[int] = set()
 
     def debloat_comment(self, comment_str: str) -> bool:
         """Return whether the comment is an implicit annotation with valid features"""
-        # determine if implicit annotation
-        if re.search(f"^\\s*{self.annotation_sequence}\\[.*\\]\\s*$", comment_str) is not None:
-            comment_features = ResourceDebloater.get_features(comment_str)
-            # debloat if features in comment are subset of target debloated features
-            return self.features.issuperset(comment_features)
-        return False
+        verdict = self.verdicts.get(comment_str)
+        if verdict is None:
+            # debloat if implicit annotation and features in comment are subset of target debloated features
+            verdict = self.ANNOTATION_REGEX.search(comment_str) is not None and \
+                ResourceDebloater.FEATURE_MASKS.selects(comment_str, self.target_mask)
+            self.verdicts[comment_str] = verdict
+        return verdict
 
     def node_is_annotated(self, node: Union[cst.FunctionDef, cst.If, cst.Else, cst.SimpleStatementLine]) -> bool:
         """Return whether node is immediately preceded by an annotation with valid tags"""
         if len(node.leading_lines) > 0:
-            last_line = node.leading_lines[-1]
-            return m.matches(last_line, m.EmptyLine(comment=m.Comment(m.MatchIfTrue(self.debloat_comment))))
+            comment = node.leading_lines[-1].comment
+            return comment is not None and self.debloat_comment(comment.value)
         return False
 
+    def locate_annotations(self, node: cst.CSTNode, ancestors: List[int]) -> None:
+        """Record the nodes enclosing annotated nodes in the node's subtree
+
+        :param CSTNode node: Node to search.
+        :param list ancestors: Ids of the node's ancestors below the root of the search."""
+        if type(node) in ANNOTATED_NODES and self.node_is_annotated(node):
+            self.enclosing.update(ancestors)
+
+        ancestors.append(id(node))
+        for field in searched_fields(type(node)) or ():
+            value = getattr(node, field)
+            for child in value if isinstance(value, (list, tuple)) else (value,):
+                if searched_fields(type(child)) is not None:
+                    self.locate_annotations(child, ancestors)
+        ancestors.pop()
+
+    def on_visit(self, node: cst.CSTNode) -> bool:
+        """Only visit the children of the nodes enclosing annotated nodes, searching for them when the transform starts"""
+        if self.root is None:
+            self.root = node
+            self.enclosing = set()
+            self.locate_annotations(node, [])
+            self.enclosing.add(id(node))
+        if id(node) not in self.enclosing:
+            return False
+        return super().on_visit(node)
+
+    def on_leave(self, original_node: cst.CSTNode, updated_node: cst.CSTNode):
+        """Leave the node, ending the transform when leaving the node it started from"""
+        if original_node is self.root:
+            self.root = None
+            self.enclosing = set()
+        return super().on_leave(original_node, updated_node)
+
     def leave_FunctionDef(self, original_node: cst.FunctionDef, updated_node: cst.FunctionDef) -> cst.FunctionDef:
         """Debloat function if there is an implicit annotation directly before"""
         if self.node_is_annotated(updated_node):
+            self.processed["FunctionDefinition"] += 1
             new_leading_lines = updated_node.leading_lines[:-1]
             return cst.SimpleStatementLine(leading_lines=new_leading_lines, body=[EmptyLineStatement(indent=False, comment=cst.Comment(f"{self.annotation_sequence} Function Debloated"), newline=cst.Newline())])
         return updated_node
@@ -66,8 +156,10 @@ class PythonImplicitDebloater(cst.CSTTransformer):
             new_leading_lines = updated_node.leading_lines[:-1]
             # debloat entire statement if there is no else branch
             if updated_node.orelse is None:
+                self.processed["IfStatement"] += 1
                 return cst.SimpleStatementLine(leading_lines=new_leading_lines, body=[EmptyLineStatement(indent=False, comment=cst.Comment(f"{self.annotation_sequence} If Statement Debloated"), newline=cst.Newline())])
             else:
+                self.processed["IfBranch"] += 1
                 modified_node = updated_node.with_deep_changes(updated_node.body, body=[cst.EmptyLine(comment=cst.Comment(f"{self.annotation_sequence} If Statement Branch Debloated"), newline=cst.Newline())])
                 modified_node = modified_node.with_changes(leading_lines=new_leading_lines)
                 return modified_node
@@ -77,6 +169,7 @@ class PythonImplicitDebloater(cst.CSTTransformer):
     def leave_Else(self, original_node: cst.Else, updated_node: cst.Else) -> cst.Else:
         """Debloat Else statement"""
         if self.node_is_annotated(updated_node):
+            self.processed["ElseBranch"] += 1
             new_leading_lines = updated_node.leading_lines[:-1]
             modified_node = updated_node.with_deep_changes(updated_node.body, body=[cst.EmptyLine(comment=cst.Comment(f"{self.annotation_sequence} Else Statement Debloated"), newline=cst.Newline())])
             modified_node = modified_node.with_changes(leading_lines=new_leading_lines)
@@ -86,6 +179,7 @@ class PythonImplicitDebloater(cst.CSTTransformer):
     def leave_SimpleStatementLine(self, original_node: cst.SimpleStatementLine, updated_node: cst.SimpleStatementLine) -> cst.SimpleStatementLine:
         """Debloat single statement"""
         if self.node_is_annotated(updated_node):
+            self.processed["Statement"] += 1
             new_leading_lines = updated_node.leading_lines[:-1]
             return updated_node.with_changes(body=[EmptyLineStatement(indent=False, comment=cst.Comment(f"{self.annotation_sequence} Statement Debloated"), newline=cst.Newline())], leading_lines=new_leading_lines)
         return updated_node
@@ -99,12 +193,13 @@ class PythonImplicitDebloater(cst.CSTTransformer):
         """
         for line in original_node.header:
             if m.matches(line, m.EmptyLine(comment=m.Comment(m.MatchIfTrue(self.debloat_comment)))):
-                logging.warning(f"Ignoring implicit annotation in header: {line.comment.value}")
+                logging.warning("Ignoring implicit annotation in header: %s", line.comment.value)
         return original_node
 
     def leave_ClassDef(self, original_node: cst.ClassDef, updated_node: cst.ClassDef):
         """Debloat Class definition"""
         if self.node_is_annotated(updated_node):
+            self.processed["ClassDefinition"] += 1
             new_leading_lines = updated_node.leading_lines[:-1]
             return cst.SimpleStatementLine(leading_lines=new_leading_lines, body=[EmptyLineStatement(indent=False, comment=cst.Comment(f"{self.annotation_sequence} Class Definition Debloated"), newline=cst.Newline())])
         return updated_node
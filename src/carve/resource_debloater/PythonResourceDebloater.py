@@ -3,21 +3,41 @@ Python Resource Debloater
 """
 
 # Standard Library Imports
+import io
 import logging
-from typing import Set
+from typing import Optional, Set
 import re
+import tokenize
 
 # Third Party Imports
 import libcst as cst
 
 # Local Imports
+from carve.trace import trace_span
+from carve.utility import write_file_atomic
 from carve.resource_debloater.ResourceDebloater import ResourceDebloater
 from carve.resource_debloater.PythonImplicitDebloater import PythonImplicitDebloater
 
 class PythonResourceDebloater(ResourceDebloater):
     """
     This class implements a resource debloater for the Python language.
+
+    The file is kept as source text for as long as possible.  Explicit annotations are processed on the text, and the
+    Concrete Syntax Tree is only parsed (once) if the file contains implicit annotations to debloat.
     """
+    # If you desire to use a different mapping sequence, it can be adjusted here.
+    ANNOTATION_SEQUENCE = ResourceDebloater.PYTHON_ANNOTATION_SEQUENCE
+
+    # Constructs debloated by implicit annotations, by the keyword starting the annotated line.  Any other line is a
+    # single statement.
+    IMPLICIT_CONSTRUCTS = {"def": "FunctionDefinition", "async": "FunctionDefinition", "class": "ClassDefinition",
+                           "if": "IfStatement", "elif": "IfStatement", "else": "ElseBranch"}
+
+    # Lines holding an explicit annotation, searched for in the whole file at once (see debloat_explicit_comment)
+    EXPLICIT_ANNOTATION_REGEX = re.compile(rf"^[^\S\n]*{re.escape(ANNOTATION_SEQUENCE)}\[.*\](~|!)[^\S\n]*$",
+                                           re.MULTILINE)
+    # Line breaks other than '\n' recognized by str.splitlines
+    OTHER_LINE_BREAKS_REGEX = re.compile(r"[\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]")
 
     def __init__(self, location: str, target_features: Set[str]):
         """
@@ -27,52 +47,160 @@ class PythonResourceDebloater(ResourceDebloater):
         """
         super(PythonResourceDebloater, self).__init__(location, target_features)
 
-        # If you desire to use a different mapping sequence, it can be adjusted here.
-        self.annotation_sequence = self.PYTHON_ANNOTATION_SEQUENCE
-        self.module = None
+        self.annotation_sequence = self.ANNOTATION_SEQUENCE
+
+        # The file is represented by its source text, its parsed module, or both.  When both are set they hold the same
+        # code; replacing the module clears the source text until it is generated again.
+        self.source = None
+        self._module = None
+
+        # Debloater this one was copied from by with_features, sharing its parse of the file as read
+        self._origin = None
+
+    @property
+    def module(self) -> Optional[cst.Module]:
+        """
+        Concrete Syntax Tree of the file, parsed from the source text on first access.
+        """
+        if self._module is None and self.source is not None:
+            if self._origin is not None and self._origin.source is self.source:
+                self._module = self._origin.module
+            else:
+                with trace_span("parse"):
+                    self._module = cst.parse_module(self.source)
+        return self._module
+
+    @module.setter
+    def module(self, module: Optional[cst.Module]) -> None:
+        """
+        Replaces the file with a Concrete Syntax Tree.
+        """
+        self._module = module
+        self.source = None
+
+    def get_code(self) -> str:
+        """
+        Returns the current source code of the file, without parsing it.  Code is generated from the module at most
+        once after each change.
+        :return: Source code of the file.
+        """
+        if self.source is None and self._module is not None:
+            with trace_span("codegen"):
+                self.source = self._module.code
+        return self.source
+
+    def with_features(self, target_features: Set[str]) -> "PythonResourceDebloater":
+        """
+        Returns a copy of the debloater debloating another set of features.  Copies whose explicit pass leaves the file
+        unchanged share a single parse of it.
+        :param set target_features: List of features to be debloated from the copy.
+        :return: The copy, sharing the contents of the file as read.
+        """
+        debloater = super(PythonResourceDebloater, self).with_features(target_features)
+        debloater._origin = self
+        return debloater
+
+    def annotation_construct(self, annotation_line: int) -> str:
+        """
+        Names the construct debloated by the annotation at the specified line, from the source text.  Implicit
+        annotations are classified by the first line of code following them (skipping comments and decorators), without
+        parsing the file.
+        :param int annotation_line: Line where the annotation is located.
+        :return: "File" or "Segment" for explicit annotations, otherwise the construct following the annotation.
+        """
+        if self.lines[annotation_line].strip()[-1:] in {"~", "!"}:
+            return super(PythonResourceDebloater, self).annotation_construct(annotation_line)
+        for line in self.lines[annotation_line + 1:]:
+            code = line.strip()
+            if code and not code.startswith(("#", "@")):
+                keyword = re.match(r"\w+", code)
+                return self.IMPLICIT_CONSTRUCTS.get(keyword.group(0) if keyword else None, "Statement")
+        return "Unknown"
 
     def read_from_disk(self):
         """
-        Reads the file from disk and parses a Concrete Syntax Tree
+        Reads the file from disk.  Parsing is deferred until the Concrete Syntax Tree is needed.
         :return: None
         """
         with open(self.location, 'r') as f:
-            self.module = cst.parse_module(f.read())
+            self.original = f.read()
+        self.source = self.original
+        self._module = None
 
     def write_to_disk(self):
         """
-        Replace the file on disk with the new debloated file.
+        Replace the file on disk with the new debloated file, unless its contents did not change.
         :return: None
         """
-        with open(self.location, 'w') as f:
-            f.write(self.module.code)
+        code = self.get_code()
+        if code == self.original:
+            logging.info("No changes to %s, leaving file on disk untouched.", self.location)
+            return
+
+        logging.info("Writing debloated version of %s to disk.", self.location)
+        write_file_atomic(self.location, code)
 
     def debloat_explicit_comment(self, comment_str: str) -> bool:
         """Return whether the comment is an explicit annotation with only target features"""
         # determine if explicit annotation
         if re.search(f"^\\s*{self.annotation_sequence}\\[.*\\](~|!)\\s*$", comment_str) is not None:
-            comment_features = PythonResourceDebloater.get_features(comment_str)
             # debloat if features in comment are subset of target debloated features
-            return self.target_features.issuperset(comment_features)
+            return self.debloats_annotation(comment_str)
         return False
 
     def debloat_explicit(self):
-        """Debloat explicit annotations"""
-        self.lines = self.module.code.splitlines(keepends=True)
-        # Search the source code for explicit debloater annotations and process them.
-        current_line = 0
-        while current_line < len(self.lines):
-            if self.debloat_explicit_comment(self.lines[current_line]):
-                    logging.info("Processing annotation found on line " + str(current_line))
-                    self.process_explicit_annotation(current_line)
-            current_line += 1
-        self.module = cst.parse_module("".join(self.lines))
-        self.lines = []
+        """Debloat explicit annotations, working on the source text"""
+        with trace_span("explicit pass"):
+            code = self.get_code()
+            # Search the source code for explicit debloater annotations and process them.
+            if self.OTHER_LINE_BREAKS_REGEX.search(code) is None:
+                # The regex matches whole lines, so the features of each annotation are read from its match, and files
+                # without explicit annotations to debloat are not split into lines at all
+                annotation_lines = [current_line for current_line, match
+                                    in self.find_matching_lines(code, self.EXPLICIT_ANNOTATION_REGEX)
+                                    if self.debloats_annotation(match.group())]
+                self.lines = code.splitlines(keepends=True) if annotation_lines else []
+            else:
+                # Line numbers are only found by counting '\n', so check every line of files with other line breaks
+                self.lines = code.splitlines(keepends=True)
+                annotation_lines = [current_line for current_line, line in enumerate(self.lines)
+                                    if self.debloat_explicit_comment(line)]
+            if len(annotation_lines) > 0:
+                self.debloat_annotations(annotation_lines)
+                self.source = "".join(self.lines)
+                self._module = None
+            self.lines = []
+
+    def has_implicit_annotations(self) -> bool:
+        """
+        Checks whether the file contains implicit annotations to debloat, using the tokenizer rather than a full parse.
+        :return: True if a comment in the file is an implicit annotation with only target features.
+        """
+        code = self.get_code()
+        if code.find(f"{self.annotation_sequence}[") < 0:
+            return False
+
+        implicit_debloater = PythonImplicitDebloater(self.target_features)
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(code).readline):
+                if token.type == tokenize.COMMENT and implicit_debloater.debloat_comment(token.string):
+                    return True
+        except (tokenize.TokenError, SyntaxError):
+            # Let the parser deal with (and report on) source the tokenizer cannot handle.
+            return True
+        return False
 
     def debloat_implicit(self):
         """Debloat implicit annotations"""
-        modified = self.module.visit(PythonImplicitDebloater(self.target_features))
-        self.module = modified
+        with trace_span("implicit pass"):
+            if not self.has_implicit_annotations():
+                return
+            implicit_debloater = PythonImplicitDebloater(self.target_features)
+            module = self.module
+            with trace_span("transform"):
+                modified = module.visit(implicit_debloater)
+            self.module = modified
+        self.annotations_processed.update(implicit_debloater.processed)
 
     def debloat(self):
         """
@@ -81,6 +209,7 @@ class PythonResourceDebloater(ResourceDebloater):
         Note: This first debloats explicit annotations, than makes a second pass debloating implicit annotations.
         :return: None
         """
-        logging.info(f"Beginning debloating pass on {self.location}")
+        logging.info("Beginning debloating pass on %s", self.location)
+        self.annotations_found = self.get_code().count(f"{self.annotation_sequence}[")
         self.debloat_explicit()
         self.debloat_implicit()
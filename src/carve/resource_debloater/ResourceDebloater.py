@@ -3,15 +3,22 @@ Resource Debloater
 """
 
 # Standard Library Imports
+import collections
+import copy
 import logging
 import os
 import sys
 from pathlib import Path
-from typing import Set
+from typing import FrozenSet, Iterable, List, Match, Pattern, Set, Tuple
 
 # Third Party Imports
 
 # Local Imports
+from carve.trace import trace_span
+from carve.utility import file_contains, write_file_atomic
+from carve.resource_debloater.EditPlan import Edit, EditPlan
+from carve.resource_debloater.FeatureMasks import FeatureMasks
+from carve.resource_debloater.LineBuffer import LineBuffer, memory_bytes
 
 
 class ResourceDebloater(object):
@@ -23,6 +30,9 @@ class ResourceDebloater(object):
     PYTHON_ANNOTATION_SEQUENCE = "###"
     C_ANNOTATION_SEQUENCE = "///"
 
+    # Annotation sequence used by the language, set by derived classes.
+    ANNOTATION_SEQUENCE = None
+
     def __init__(self, location: Path, target_features: Set[str]):
         """
         ResourceDebloater constructor
@@ -32,18 +42,69 @@ class ResourceDebloater(object):
 
         self.location = location
         self.target_features = target_features
+        # Generation and bit mask of target_features (see FeatureMasks), built on first use
+        self._target_mask = None
         self.lines = []
         self.annotation_sequence = None
 
+        # Contents of the file as read from disk, used to avoid rewriting files that were not changed.
+        self.original = None
+        # Largest memory held by the file's contents while edits were applied, for the run report (see memory_bytes)
+        self.peak_memory = 0
+
+        # Annotation statistics for the run report: annotations found in the file, annotations debloated (by construct)
+        # and annotations that could not be debloated and were marked in the file instead.
+        self.annotations_found = 0
+        self.annotations_processed = collections.Counter()
+        self.annotations_failed = 0
+
+    @classmethod
+    def has_annotations(cls, location: Path) -> bool:
+        """
+        Quickly checks whether the file contains any annotation, by scanning its raw bytes for the start of a feature
+        mapping (the annotation sequence followed by "[").  Files without annotations do not need to be parsed or
+        rewritten.
+        :param str location: Filepath of the file on disk to check.
+        :return: False if the file certainly contains no annotations, True otherwise.
+        """
+        if cls.ANNOTATION_SEQUENCE is None:
+            return True
+        return file_contains(location, f"{cls.ANNOTATION_SEQUENCE}[".encode())
+
+    def with_features(self, target_features: Set[str]) -> "ResourceDebloater":
+        """
+        Returns a copy of the debloater debloating another set of features, so a file can be debloated for several
+        sets of features while only being read (and scanned) once.  Must be called before the file is debloated.
+        :param set target_features: List of features to be debloated from the copy.
+        :return: The copy, sharing the contents of the file as read.
+        """
+        debloater = copy.copy(self)
+        debloater.target_features = target_features
+        debloater._target_mask = None
+        debloater.peak_memory = 0
+        debloater.annotations_found = 0
+        debloater.annotations_processed = collections.Counter()
+        debloater.annotations_failed = 0
+        return debloater
+
+    def annotation_feature_sets(self) -> Set[FrozenSet[str]]:
+        """
+        Returns the distinct feature sets of the annotations in the file.
+        :return: A set of the feature sets, each a frozenset of feature names.
+        """
+        sequence = f"{self.annotation_sequence}["
+        return {frozenset(self.get_features(line)) for line in self.get_code().splitlines() if sequence in line}
+
     def read_from_disk(self) -> None:
         """
-        Reads the file from disk, saving each line into the object's internal representation
+        Reads the file from disk, saving each line into the object's internal representation: a LineBuffer over the
+        contents as read, so the lines share the original text.
         :return: None
         """
-        logging.info(f"Reading {self.location} from disk")
-        file = open(self.location, "r")
-        self.lines = file.readlines()
-        file.close()
+        logging.info("Reading %s from disk", self.location)
+        with open(self.location, "r") as file:
+            self.original = file.read()
+        self.lines = LineBuffer(self.original)
 
     def debloat(self):
         """
@@ -55,13 +116,44 @@ class ResourceDebloater(object):
 
     def write_to_disk(self) -> None:
         """
-        Replace the file on disk with the new debloated file.
+        Replace the file on disk with the new debloated file.  Files whose contents did not change are left untouched,
+        so their modification times (and build system state) are preserved.
+        :return: None
+        """
+        contents = self.get_code()
+        if contents == self.original:
+            logging.info("No changes to %s, leaving file on disk untouched.", self.location)
+            return
+
+        logging.info("Writing debloated version of %s to disk.", self.location)
+        write_file_atomic(self.location, contents)
+
+    def get_code(self) -> str:
+        """
+        Returns the current contents of the file.
+        :return: Contents of the file.
+        """
+        if isinstance(self.lines, LineBuffer):
+            return self.lines.text
+        return "".join(self.lines)
+
+    def apply_plan(self, plan: EditPlan) -> None:
+        """
+        Applies planned edits to the file's lines, recording the memory held while the old and new lines both exist.
+        :param EditPlan plan: Edits planned against the current lines.
         :return: None
         """
-        logging.info(f"Writing debloated version of {self.location} to disk.")
-        file = open(self.location, "w")
-        file.writelines(self.lines)
-        file.close()
+        lines = plan.apply(self.lines)
+        self.peak_memory = max(self.peak_memory, memory_bytes(self.original, self.lines, lines))
+        self.lines = lines
+
+    def peak_memory_bytes(self) -> int:
+        """
+        Estimates the largest memory held by the contents of the file while it was debloated: the contents as read,
+        the lines and the debloated contents.  Parsers' own data structures are not included.
+        :return: Size in bytes.
+        """
+        return max(self.peak_memory, memory_bytes(self.original, self.lines, self.get_code()))
 
     @staticmethod
     def get_features(line: str) -> Set[str]:
@@ -80,37 +172,169 @@ class ResourceDebloater(object):
 
         return set(feature_list)
 
+    # Bit masks of the features selected for debloating and of each distinct annotation, shared by all debloaters
+    FEATURE_MASKS = FeatureMasks(get_features.__func__)
+
+    @property
+    def target_mask(self) -> int:
+        """
+        Returns the bit mask of the features to be debloated from the file, rebuilt whenever FEATURE_MASKS reassigned
+        its bits since it was built.
+        :return: Mask of target_features (see FeatureMasks).
+        """
+        if self._target_mask is None or self._target_mask[0] != self.FEATURE_MASKS.generation:
+            mask = self.FEATURE_MASKS.target_mask(self.target_features)
+            self._target_mask = (self.FEATURE_MASKS.generation, mask)
+        return self._target_mask[1]
+
+    @staticmethod
+    def find_matching_lines(code: str, regex: Pattern) -> List[Tuple[int, Match]]:
+        """
+        Finds the lines holding a match of a regex with a single search of the whole file, instead of searching each
+        line.  Lines are numbered as in code.splitlines(keepends=True) when code only breaks lines with newlines (as
+        files read in text mode do); the regex must not match across lines.
+        :param str code: Contents of the file.
+        :param Pattern regex: Compiled regex to search for.
+        :return: Ascending numbers of the lines holding a match, each with the first match on the line.
+        """
+        found = []
+        line = 0
+        position = 0
+        for match in regex.finditer(code):
+            # Lines without a match are only counted, at C speed
+            line += code.count("\n", position, match.start())
+            position = match.start()
+            if not found or found[-1][0] != line:
+                found.append((line, match))
+        return found
+
+    def debloats_annotation(self, annotation: str) -> bool:
+        """
+        Checks whether every feature of an annotation is selected for debloating.
+        :param str annotation: Line (or comment) containing the annotation.
+        :return: True if the annotation is to be debloated.
+        """
+        return self.FEATURE_MASKS.selects(annotation, self.target_mask)
+
+    def plan_annotation(self, annotation_line: int, plan: EditPlan) -> List[Edit]:
+        """
+        Plans the edits for the annotation at the specified line.  Derived classes supporting implicit annotations
+        override this to dispatch between explicit and implicit annotations.
+        :param int annotation_line: Line where annotation to be processed is located.
+        :param EditPlan plan: Edits already planned for earlier annotations in the file.
+        :return: List of edits debloating the annotation.
+        """
+        return self.plan_explicit_annotation(annotation_line)
+
+    def annotation_construct(self, annotation_line: int) -> str:
+        """
+        Names the construct debloated by the annotation at the specified line, for reporting.  Derived classes
+        supporting implicit annotations override this to name the implicit constructs.
+        :param int annotation_line: Line where the annotation is located.
+        :return: "File" or "Segment" for explicit annotations, "Unknown" otherwise.
+        """
+        last_char = self.lines[annotation_line].strip()[-1:]
+        return {"!": "File", "~": "Segment"}.get(last_char, "Unknown")
+
+    def debloat_annotations(self, annotation_lines: Iterable[int]) -> None:
+        """
+        Plans the edits for each annotation in order, then applies all of them to the file in a single pass.
+
+        Annotations on lines that an earlier annotation already removes are skipped, as are annotations whose edits
+        overlap those of an earlier annotation.  An edit spanning the whole file (such as a file annotation) replaces
+        everything planned before it and ends the pass.
+
+        :param annotation_lines: Ascending line numbers of the annotations to debloat.
+        :return: None
+        """
+        with trace_span("plan annotations"):
+            plan = self.plan_annotations(annotation_lines)
+
+        with trace_span("apply edits"):
+            self.apply_plan(plan)
+
+    def plan_annotations(self, annotation_lines: Iterable[int]) -> EditPlan:
+        """
+        Plans the edits for each annotation in order.  See debloat_annotations.
+        :param annotation_lines: Ascending line numbers of the annotations to debloat.
+        :return: EditPlan of the annotations.
+        """
+        plan = EditPlan()
+        for annotation_line in annotation_lines:
+            if plan.covers(annotation_line):
+                continue
+
+            logging.info("Processing annotation found on line %d", annotation_line)
+            edits = self.plan_annotation(annotation_line, plan)
+
+            if any(edit.start == 0 and edit.end >= len(self.lines) for edit in edits):
+                plan = EditPlan()
+                plan.add(edits)
+                self.annotations_processed.clear()
+                self.annotations_failed = 0
+                self.annotations_processed[self.annotation_construct(annotation_line)] += 1
+                break
+
+            if not plan.add(edits):
+                logging.warning("Annotation on line %d overlaps code debloated by an earlier annotation.  Skipping this "
+                                "annotation.", annotation_line)
+            elif all(edit.start == edit.end for edit in edits):
+                # Annotations that cannot be debloated only insert a marker explaining why
+                self.annotations_failed += 1
+            else:
+                self.annotations_processed[self.annotation_construct(annotation_line)] += 1
+
+        return plan
+
     def process_explicit_annotation(self, annotation_line: int) -> None:
         """
-        Process annotation if explicit (! or ~)
+        Process annotation if explicit (! or ~), applying its edits immediately.
+        :param int annotation_line: Line where annotation to be processed is located.
+        :return: None
+        """
+        plan = EditPlan()
+        plan.add(self.plan_explicit_annotation(annotation_line))
+        self.apply_plan(plan)
+
+    def plan_explicit_annotation(self, annotation_line: int) -> List[Edit]:
+        """
+        Plan annotation if explicit (! or ~)
 
         Explicit annotations are debloated as a group of lines. File annotations (!) debloat all lines.
         Segment annotations (~) debloat all lines between an opening and closing explicit annotation.
 
         :param int annotation_line: Line where annotation to be processed is located.
-        :return: None
+        :return: List of edits debloating the annotation.
         """
 
         last_char = self.lines[annotation_line].strip()[-1]
         # debloat full file
         if last_char == "!":
-            self.lines = []
-            self.lines.append(f"{self.annotation_sequence} File Debloated.\n")
-            self.lines.append("\n")
+            return [Edit(0, len(self.lines), [f"{self.annotation_sequence} File Debloated.\n", "\n"])]
         # debloat segment
         elif last_char == "~":
             segment_end = None
             search_line = annotation_line + 1
+            replacement_end = None
             replacement_code = []
 
-            # Check for replacement code following the segment debloat annotation.  If found, remove and store for later
-            if self.lines[search_line].find(f"{self.annotation_sequence}^") > -1:
-                self.lines.pop(search_line)
+            # Check for replacement code following the segment debloat annotation.  If found, store for later
+            if search_line < len(self.lines) and self.lines[search_line].find(f"{self.annotation_sequence}^") > -1:
+                search_line += 1
+                while search_line < len(self.lines) and \
+                        self.lines[search_line].find(f"{self.annotation_sequence}^") < 0:
+                    replacement_code.append(self.lines[search_line].replace(self.annotation_sequence, ""))
+                    search_line += 1
 
-                while self.lines[search_line].find(f"{self.annotation_sequence}^") < 0:
-                    replacement_code.append(self.lines.pop(search_line).replace(self.annotation_sequence, ""))
+                if search_line == len(self.lines):
+                    logging.error("No termination annotation found for replacement code on line %d.  Marking location "
+                                  "and skipping this annotation.", annotation_line)
+                    return [Edit(annotation_line + 1, annotation_line + 1,
+                                 [f"{self.annotation_sequence} Segment NOT removed due to lack of replacement code "
+                                  f"termination annotation.\n"])]
 
-                self.lines.pop(search_line)
+                search_line += 1
+                replacement_end = search_line
 
             while search_line < len(self.lines):
                 if self.lines[search_line].find(f"{self.annotation_sequence}~") > -1:
@@ -120,28 +344,23 @@ class ResourceDebloater(object):
                     search_line += 1
 
             if segment_end is None:
-                logging.error("No termination annotation found for segment annotation on line " + str(annotation_line) +
-                              ".  Marking location and skipping this annotation.")
-                self.lines.insert(annotation_line+1, f"{self.annotation_sequence} Segment NOT removed due to lack of termination annotation.\n")
+                logging.error("No termination annotation found for segment annotation on line %d.  Marking location and "
+                              "skipping this annotation.", annotation_line)
+                # The replacement code (if any) is still removed from the file.
+                return [Edit(annotation_line + 1, replacement_end or annotation_line + 1,
+                             [f"{self.annotation_sequence} Segment NOT removed due to lack of termination annotation.\n"])]
             else:
-                while segment_end != annotation_line:
-                    self.lines.pop(segment_end)
-                    segment_end -= 1
-                self.lines[annotation_line] = f"{self.annotation_sequence} Segment Debloated.\n"
-                self.lines.insert(annotation_line + 1, "\n")
+                replacement = [f"{self.annotation_sequence} Segment Debloated.\n", "\n"]
 
                 # Insert replacement code if it exists
                 if len(replacement_code) > 0:
-                    insert_point = 2
-                    self.lines.insert(annotation_line + insert_point, f"{self.annotation_sequence} Code Inserted:\n")
-                    insert_point += 1
-
-                    for replacement_line in replacement_code:
-                        self.lines.insert(annotation_line + insert_point, replacement_line)
-                        insert_point += 1
+                    replacement.append(f"{self.annotation_sequence} Code Inserted:\n")
+                    replacement.extend(replacement_code)
+                    replacement.append("\n")
 
-                    self.lines.insert(annotation_line + insert_point, "\n")
+                return [Edit(annotation_line, segment_end + 1, replacement)]
         else:
-            logging.error("Tried to debloat annotation that isn't explicit" + str(annotation_line) +
-                            ".  Marking location and skipping this annotation.")
-            self.lines.insert(annotation_line+1, f"{self.annotation_sequence} Segment NOT removed because unexpectedly not explicit annotation.\n")
+            logging.error("Tried to debloat annotation that isn't explicit%d.  Marking location and skipping this "
+                          "annotation.", annotation_line)
+            return [Edit(annotation_line + 1, annotation_line + 1,
+                         [f"{self.annotation_sequence} Segment NOT removed because unexpectedly not explicit annotation.\n"])]
@@ -0,0 +1,426 @@
+"""
+CARVE Runner
+This module contains the per-file debloating work performed by the CLI.  Files can be debloated one at a time in the
+calling process, or distributed across a pool of worker processes.  In both cases results (including log output and
+errors) are reported in the order the files were discovered, so a parallel run is indistinguishable from a serial one.
+"""
+
+# Standard Library Imports
+import concurrent.futures
+import contextlib
+import logging
+import os
+import shutil
+import sys
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+# Third Party Imports
+
+# Local Imports
+from carve.cache import ResultCache
+from carve.log import FILE_SUMMARY_LOGGER
+from carve.output import OutputTree, link_file
+from carve.profiling import RunProfiler, profile_call
+from carve.report import RunReport
+from carve.trace import add_events, collect_events, trace_span, tracing
+from carve.utility import write_file_atomic
+from carve.walk import FileWalker
+
+
+class FileMetrics(NamedTuple):
+    """
+    Measurements of a single debloated file, for the run report.  Annotation statistics are None when the file was not
+    debloated (it had no annotations, or its result was taken from the cache), and lines are None when it was not read.
+    memory_bytes is the debloater's estimate of the peak memory held by the file's contents, None when it was not
+    debloated.
+    """
+    bytes_before: int
+    bytes_after: int
+    lines_before: Optional[int]
+    lines_after: Optional[int]
+    annotations_found: Optional[int]
+    annotations_processed: Optional[Dict[str, int]]
+    annotations_failed: Optional[int]
+    stage_seconds: Dict[str, float]
+    memory_bytes: Optional[int] = None
+
+
+class FileResult(NamedTuple):
+    """
+    Outcome of debloating a single file.
+    """
+    location: Path
+    skipped: bool
+    cache_hit: bool
+    records: List[logging.LogRecord]
+    error: Optional[BaseException]
+    error_trace: Optional[str]
+    seconds: float
+    profile: Optional[Dict[str, dict]]
+    metrics: Optional[FileMetrics]
+    trace: Optional[List[dict]]
+
+
+class RunSummary(NamedTuple):
+    """
+    Totals for a set of debloated files.
+    """
+    files: int
+    skipped: int
+    cache_hits: int
+
+
+class _BufferHandler(logging.Handler):
+    """
+    Logging handler used in worker processes to hold log records until they can be replayed by the parent process.
+    """
+
+    def __init__(self):
+        """
+        _BufferHandler constructor
+        """
+        super(_BufferHandler, self).__init__()
+        self.records = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Stores a fully formatted copy of the record, so it can be pickled back to the parent process.
+        :param LogRecord record: record to store.
+        :return: None
+        """
+        self.records.append(logging.makeLogRecord({"name": record.name, "levelno": record.levelno,
+                                                   "levelname": record.levelname, "msg": record.getMessage(),
+                                                   "created": record.created, "msecs": record.msecs}))
+
+
+# Set in worker processes only, by _init_worker
+_worker_handler = None
+
+
+def _init_worker(log_level: int) -> None:
+    """
+    Process pool initializer.  Routes all logging in the worker into a buffer instead of the parent's log file.
+    :param int log_level: Logging level selected for the run.
+    :return: None
+    """
+    global _worker_handler
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _worker_handler = _BufferHandler()
+    root.addHandler(_worker_handler)
+    root.setLevel(log_level)
+
+
+def count_lines(text) -> int:
+    """
+    Counts the lines of a file's contents, including a last line without a line terminator.
+    :param text: Contents of the file, as str or bytes.
+    :return: Number of lines.
+    """
+    newline = b"\n" if isinstance(text, bytes) else "\n"
+    return text.count(newline) + (1 if text and not text.endswith(newline) else 0)
+
+
+def _run_stage(stage: str, function, stage_seconds: Dict[str, float],
+               profile: Optional[Dict[str, dict]] = None) -> None:
+    """
+    Runs a stage of debloating a file, timing it and profiling it if requested.
+    :param str stage: Name of the stage.
+    :param function: Function performing the stage.
+    :param dict stage_seconds: Wall time of each stage, the stage's time is stored here.
+    :param dict profile: If given, the stage is profiled and its raw statistics are stored here by stage name.
+    :return: None
+    """
+    start = time.perf_counter()
+    with trace_span(stage):
+        if profile is None:
+            function()
+        else:
+            profile_call(profile, stage, function)
+    stage_seconds[stage] = time.perf_counter() - start
+
+
+def write_output(location: Path, contents, output: Optional[OutputTree]) -> None:
+    """
+    Writes the debloated contents of a file, in place or to its place in the output tree.  Files that debloating left
+    unchanged are left untouched in place, and linked into the output tree.
+    :param Path location: Filepath of the file on disk that was debloated.
+    :param contents: Debloated contents of the file, as str or bytes, or None if they are unchanged.
+    :param OutputTree output: Output tree of the run, or None to write in place.
+    :return: None
+    """
+    if output is None:
+        if contents is None:
+            logging.info("No changes to %s, leaving file on disk untouched.", location)
+        else:
+            logging.info("Writing debloated version of %s to disk.", location)
+            write_file_atomic(location, contents)
+        return
+
+    destination = output.destination(location)
+    if contents is None:
+        logging.info("No changes to %s, linking it to %s.", location, destination)
+        link_file(location, destination, output.link_mode)
+    else:
+        logging.info("Writing debloated version of %s to %s.", location, destination)
+        write_file_atomic(destination, contents)
+        shutil.copymode(location, destination)
+
+
+def _debloat(language_type: type, location: Path, target_features: Set[str],
+             profile: Optional[Dict[str, dict]] = None, output: Optional[OutputTree] = None) -> FileMetrics:
+    """
+    Reads, debloats and writes back a single file.
+    :param type language_type: ResourceDebloater subclass used to debloat the file.
+    :param Path location: Filepath of the file on disk to debloat.
+    :param set target_features: Set of features to be debloated from the file.
+    :param dict profile: If given, each stage is profiled and its raw statistics are stored here by stage name.
+    :param OutputTree output: If given, the file is written to the output tree instead of in place.
+    :return: FileMetrics of the file.
+    """
+    stage_seconds = {}
+    bytes_before = file_size(location)
+    resource_debloater = language_type(location, target_features)
+    _run_stage("read", resource_debloater.read_from_disk, stage_seconds, profile)
+    _run_stage("debloat", resource_debloater.debloat, stage_seconds, profile)
+    if output is None:
+        _run_stage("write", resource_debloater.write_to_disk, stage_seconds, profile)
+    else:
+        def write_to_output():
+            contents = resource_debloater.get_code()
+            write_output(location, None if contents == resource_debloater.original else contents, output)
+        _run_stage("write", write_to_output, stage_seconds, profile)
+
+    destination = location if output is None else output.destination(location)
+    bytes_after = file_size(destination)
+    return FileMetrics(bytes_before, bytes_after, count_lines(resource_debloater.original),
+                       count_lines(resource_debloater.get_code()), resource_debloater.annotations_found,
+                       dict(resource_debloater.annotations_processed), resource_debloater.annotations_failed,
+                       stage_seconds, resource_debloater.peak_memory_bytes())
+
+
+def _debloat_cached(language_type: type, location: Path, target_features: Set[str], cache: ResultCache,
+                    profile: Optional[Dict[str, dict]] = None,
+                    output: Optional[OutputTree] = None) -> Tuple[bool, FileMetrics]:
+    """
+    Debloats a single file, reusing the cached result for identical inputs if there is one.
+    :param type language_type: ResourceDebloater subclass used to debloat the file.
+    :param Path location: Filepath of the file on disk to debloat.
+    :param set target_features: Set of features to be debloated from the file.
+    :param ResultCache cache: Cache of earlier results.
+    :param dict profile: If given, the stages of a cache miss are profiled and stored here by stage name.
+    :param OutputTree output: If given, the file is written to the output tree instead of in place.
+    :return: Tuple of whether the result was taken from the cache, and the FileMetrics of the file.
+    """
+    start = time.perf_counter()
+    with trace_span("cache lookup"):
+        with open(location, "rb") as file:
+            contents = file.read()
+        key = ResultCache.make_key(contents, language_type.__name__, target_features)
+        found, cached = cache.get(key)
+
+    if found:
+        logging.info("Using cached result for %s", location)
+        if cached is None or cached == contents:
+            cached = contents
+            write_output(location, None, output)
+        else:
+            write_output(location, cached, output)
+        return True, FileMetrics(len(contents), len(cached), count_lines(contents), count_lines(cached), None, None,
+                                 None, {"cache": time.perf_counter() - start})
+
+    metrics = _debloat(language_type, location, target_features, profile, output)
+    with open(location if output is None else output.destination(location), "rb") as file:
+        debloated = file.read()
+    cache.put(key, None if debloated == contents else debloated)
+    return False, metrics
+
+
+def debloat_file(language_type: type, location: Path, target_features: Set[str],
+                 cache: Optional[ResultCache] = None, profile: bool = False, trace: bool = False,
+                 output: Optional[OutputTree] = None) -> FileResult:
+    """
+    Debloats a single file.  Errors (including exits requested by the debloaters) are captured and returned rather
+    than raised, so they can be reported in a deterministic order.
+    :param type language_type: ResourceDebloater subclass used to debloat the file.
+    :param Path location: Filepath of the file on disk to debloat.
+    :param set target_features: Set of features to be debloated from the file.
+    :param ResultCache cache: Optional cache of earlier results.
+    :param bool profile: Profile the read, debloat and write stages of the file.
+    :param bool trace: Record trace events for the file and its stages.
+    :param OutputTree output: If given, the file is written to the output tree instead of in place.
+    :return: FileResult describing the outcome.
+    """
+    if _worker_handler is not None:
+        _worker_handler.records = []
+
+    skipped = False
+    cache_hit = False
+    error = None
+    error_trace = None
+    metrics = None
+    stage_profiles = {} if profile else None
+    start = time.perf_counter()
+    with collect_events() if trace else contextlib.nullcontext() as trace_events:
+        with trace_span(os.path.basename(location), "file", path=str(location)):
+            try:
+                logging.info("Processing file: %s", location)
+                if not language_type.has_annotations(location):
+                    logging.info("No annotations found in %s, skipping.", location)
+                    skipped = True
+                    if output is not None:
+                        link_file(location, output.destination(location), output.link_mode)
+                    size = file_size(location)
+                    metrics = FileMetrics(size, size, None, None, None, None, None, {})
+                elif cache is not None:
+                    cache_hit, metrics = _debloat_cached(language_type, location, target_features, cache,
+                                                         stage_profiles, output)
+                else:
+                    metrics = _debloat(language_type, location, target_features, stage_profiles, output)
+            except (Exception, SystemExit) as err:
+                error = err
+                error_trace = traceback.format_exc()
+
+    return FileResult(location, skipped, cache_hit, _buffered_records(), error, error_trace,
+                      time.perf_counter() - start, stage_profiles, metrics, trace_events)
+
+
+def _buffered_records() -> List[logging.LogRecord]:
+    """
+    Returns the log records buffered for the current file in a worker process (none in the calling process).
+    :return: List of log records.
+    """
+    return _worker_handler.records if _worker_handler is not None else []
+
+
+def _log_file_summary(result: FileResult) -> None:
+    """
+    Logs a single line summarizing a file, as used in compact logging mode.
+    :param FileResult result: Result to summarize.
+    :return: None
+    """
+    metrics = result.metrics
+    if result.error is not None:
+        FILE_SUMMARY_LOGGER.info("%s: failed after %.3f s", result.location, result.seconds)
+    elif result.skipped:
+        FILE_SUMMARY_LOGGER.info("%s: skipped (no annotations)", result.location)
+    elif metrics.annotations_found is None:
+        FILE_SUMMARY_LOGGER.info("%s: cached result, %d -> %d bytes in %.3f s", result.location, metrics.bytes_before,
+                                 metrics.bytes_after, result.seconds)
+    else:
+        FILE_SUMMARY_LOGGER.info("%s: %d annotations found, %d debloated, %d failed, %d -> %d bytes in %.3f s",
+                                 result.location, metrics.annotations_found,
+                                 sum(metrics.annotations_processed.values()), metrics.annotations_failed,
+                                 metrics.bytes_before, metrics.bytes_after, result.seconds)
+
+
+def _report(result: FileResult, profiler: Optional[RunProfiler] = None, report: Optional[RunReport] = None) -> None:
+    """
+    Replays buffered log records for a file and aborts the run if debloating the file failed.
+    :param FileResult result: Result to report.
+    :param RunProfiler profiler: Profiler of the run, which collects the file's stage profiles.
+    :param RunReport report: Report of the run, which gets a row for the file.
+    :return: None
+    """
+    for record in result.records:
+        logging.getLogger(record.name).handle(record)
+    if FILE_SUMMARY_LOGGER.isEnabledFor(logging.INFO):
+        _log_file_summary(result)
+
+    if profiler is not None and result.profile is not None:
+        profiler.add_file(result.location, result.profile, result.seconds)
+    if report is not None:
+        report.add_file(result)
+    add_events(result.trace)
+
+    if result.error is not None:
+        if isinstance(result.error, SystemExit):
+            raise SystemExit(result.error.code)
+        logging.error("Debloating failed on file %s:\n%s", result.location, result.error_trace)
+        raise SystemExit(f"Debloating failed on file {result.location}: {result.error}")
+
+
+def collect_files(locations: List[str], extensions: List[str], filters: Optional[Dict] = None) -> List[Path]:
+    """
+    Walks the library's source code locations and collects the files with one of the library's extensions.
+    :param list locations: Directories containing the library's source code.
+    :param list extensions: Extensions (without the '.') of the files to debloat.
+    :param dict filters: Exclude, include and gitignore entries of the library (see library_filters in carve.walk).
+    :return: List of files to debloat, in discovery order.
+    """
+    return FileWalker(extensions, **(filters or {})).files(locations)
+
+
+def file_size(location: Path) -> int:
+    """
+    Returns the size of a file in bytes, or 0 if it cannot be determined.
+    :param Path location: Filepath to measure.
+    :return: Size of the file in bytes.
+    """
+    try:
+        return os.path.getsize(location)
+    except OSError:
+        return 0
+
+
+def run_files(language_type: type, files: List[Path], target_features: Set[str], jobs: int = 1,
+              cache: Optional[ResultCache] = None, profiler: Optional[RunProfiler] = None,
+              report: Optional[RunReport] = None, output: Optional[OutputTree] = None) -> RunSummary:
+    """
+    Debloats a list of files, either serially or with a pool of worker processes.
+
+    In parallel mode the largest files are scheduled first so a single large file does not delay the end of the run.
+    Results are still reported in the order of the input list, and the first failure (in that order) aborts the run:
+    the files not started yet are cancelled, while those already being debloated are finished (and written).
+
+    :param type language_type: ResourceDebloater subclass used to debloat the files.
+    :param list files: Files to debloat, in discovery order.
+    :param set target_features: Set of features to be debloated from the files.
+    :param int jobs: Number of worker processes to use.  1 debloats in the calling process.
+    :param ResultCache cache: Optional cache of earlier results.
+    :param RunProfiler profiler: Optional profiler collecting the profiles of each file's stages.
+    :param RunReport report: Optional report collecting a row for each file.
+    :param OutputTree output: If given, files are written to the output tree instead of in place.
+    :return: RunSummary of the files debloated.
+    """
+    skipped = 0
+    cache_hits = 0
+    trace = tracing()
+    if jobs <= 1 or len(files) <= 1:
+        for location in files:
+            result = debloat_file(language_type, location, target_features, cache, profiler is not None, trace,
+                                  output)
+            _report(result, profiler, report)
+            skipped += result.skipped
+            cache_hits += result.cache_hit
+        return RunSummary(len(files), skipped, cache_hits)
+
+    schedule = sorted(range(len(files)), key=lambda index: (-file_size(files[index]), index))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                                initargs=(logging.getLogger().getEffectiveLevel(),)) as executor:
+        futures = [None] * len(files)
+        for index in schedule:
+            futures[index] = executor.submit(debloat_file, language_type, files[index], target_features, cache,
+                                             profiler is not None, trace, output)
+
+        try:
+            for future in futures:
+                result = future.result()
+                _report(result, profiler, report)
+                skipped += result.skipped
+                cache_hits += result.cache_hit
+        except BaseException:
+            if sys.version_info >= (3, 9):
+                # Cancels every file not handed to a worker yet and stops the pool from scheduling more
+                executor.shutdown(cancel_futures=True)
+            else:
+                for future in futures:
+                    future.cancel()
+            raise
+
+    return RunSummary(len(files), skipped, cache_hits)
@@ -0,0 +1,329 @@
+"""
+CARVE Server
+A long running debloating service, for build systems debloating the same libraries many times with different sets of
+features.  `carve serve` listens on a local Unix socket and keeps what a run would otherwise recompute in memory: parsed
+configurations and compiled feature hierarchies, and for every file its contents as read, the feature sets of its
+annotations and (once needed) its parsed Concrete Syntax Tree.  Cached entries are invalidated when the modification
+time or size of their file changes.
+
+`carve client` sends a single debloat request and prints the result.  Requests and responses are JSON objects, one per
+line.  A debloat request has the following fields:
+
+ - config: Filepath of the debloating configuration (required).
+ - library: Name of the library to debloat (all libraries by default).
+ - features: Features (or feature groups) to debloat, instead of the library's debloat entry.
+ - output_dir: Directory the libraries are written to (see --output_dir), instead of debloating in place.
+ - link_mode: How unchanged files are created in the output directory (see --link_mode).
+ - cwd: Directory relative filepaths (including the locations in the configuration) are resolved against.
+
+The response has "ok" set to true and a "libraries" list of per-library totals, or "ok" set to false and an "error".
+A request of {"command": "ping"} only checks that the server is up, and {"command": "shutdown"} stops it.
+"""
+
+# Standard Library Imports
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from pathlib import Path
+from typing import Dict, FrozenSet, NamedTuple, Optional, Set
+
+# Third Party Imports
+import yaml
+
+# Local Imports
+from carve.output import LINK_MODES, OutputTree
+from carve.resource_debloater.ResourceDebloater import ResourceDebloater
+from carve.languages import LANGUAGE_DEBLOATERS
+from carve.runner import collect_files, write_output
+from carve.utility import compile_hierarchy, load_config, resolve_features
+from carve.walk import library_filters
+
+DEFAULT_SOCKET_PATH = "results/carve.sock"
+
+
+class CachedFile(NamedTuple):
+    """
+    A file as read by the server.  The debloater is None when the file has no annotations.
+    """
+    mtime_ns: int
+    size: int
+    debloater: Optional[ResourceDebloater]
+    feature_sets: FrozenSet[FrozenSet[str]]
+
+
+class DebloatService(object):
+    """
+    The DebloatService class serves debloat requests, caching configurations, feature hierarchies and files between
+    requests.
+    """
+
+    def __init__(self):
+        """
+        DebloatService constructor
+        """
+        # Parsed configurations by filepath, with the modification time they were read at
+        self.configs = {}
+        # Compiled feature hierarchies by configuration filepath, modification time and library name
+        self.hierarchies = {}
+        # CachedFile of every file read, by filepath
+        self.files = {}
+
+    def config(self, path: str) -> Dict:
+        """
+        Returns a parsed configuration, reading it again if it changed since it was last read.
+        :param str path: Filepath of the configuration.
+        :return: The configuration.
+        """
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self.configs.get(path)
+        if cached is None or cached[0] != mtime_ns:
+            cached = (mtime_ns, load_config(path))
+            self.configs[path] = cached
+        return cached[1]
+
+    def hierarchy(self, path: str, library: Dict) -> Dict:
+        """
+        Returns the compiled feature hierarchy of a library.
+        :param str path: Filepath of the library's configuration.
+        :param dict library: Configuration of the library.
+        :return: Index of the library's feature hierarchy (see compile_hierarchy).
+        """
+        key = (path, self.configs[path][0], library.get("name"))
+        if key not in self.hierarchies:
+            self.hierarchies[key] = compile_hierarchy(library.get("debloatable_features"))
+        return self.hierarchies[key]
+
+    def cached_file(self, language_type: type, location: Path) -> CachedFile:
+        """
+        Returns a file as read, reading and scanning it again if it changed since it was last read.
+        :param type language_type: ResourceDebloater subclass used to debloat the file.
+        :param Path location: Filepath of the file.
+        :return: CachedFile of the file.
+        """
+        stat = os.stat(location)
+        cached = self.files.get(str(location))
+        if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size) and \
+                (cached.debloater is None or isinstance(cached.debloater, language_type)):
+            return cached
+
+        debloater = None
+        feature_sets = frozenset()
+        if language_type.has_annotations(location):
+            debloater = language_type(location, set())
+            debloater.read_from_disk()
+            feature_sets = frozenset(debloater.annotation_feature_sets())
+        cached = CachedFile(stat.st_mtime_ns, stat.st_size, debloater, feature_sets)
+        self.files[str(location)] = cached
+        return cached
+
+    def debloat_library(self, library: Dict, target_features: Set[str], output: Optional[OutputTree]) -> Dict:
+        """
+        Debloats a library for a set of features.
+        :param dict library: Configuration of the library, with locations resolved.
+        :param set target_features: Set of features to be debloated.
+        :param OutputTree output: Output tree of the library, or None to debloat in place.
+        :return: Totals of the library.
+        """
+        language_type = LANGUAGE_DEBLOATERS.get(library.get("language"))
+        if language_type is None:
+            raise ValueError(f"language {library.get('language')} is not supported")
+
+        files = collect_files(library.get("locations"), library.get("extensions"), library_filters(library))
+        if output is not None:
+            output.mirror(skip=files)
+
+        debloated = 0
+        for location in files:
+            cached = self.cached_file(language_type, location)
+            if not any(features.issubset(target_features) for features in cached.feature_sets):
+                write_output(location, None, output)
+                continue
+
+            logging.info("Debloating %s", location)
+            debloater = cached.debloater.with_features(target_features)
+            debloater.debloat()
+            code = debloater.get_code()
+            write_output(location, None if code == debloater.original else code, output)
+            debloated += 1
+        if output is not None:
+            output.copy_modes()
+
+        return {"name": library.get("name"), "files": len(files), "debloated": debloated,
+                "skipped": len(files) - debloated}
+
+    def debloat(self, request: Dict) -> Dict:
+        """
+        Serves a debloat request (see the module documentation).
+        :param dict request: The request.
+        :return: The response.
+        """
+        cwd = request.get("cwd") or os.getcwd()
+        if request.get("config") is None:
+            raise ValueError("the request names no configuration")
+        config_path = os.path.join(cwd, request["config"])
+        config = self.config(config_path)
+
+        libraries = [library for library in config.get("Libraries")
+                     if request.get("library") in (None, library.get("name"))]
+        if not libraries:
+            raise ValueError(f"library {request.get('library')} is not in {request['config']}")
+
+        results = []
+        for library in libraries:
+            features_to_debloat = request.get("features") or library.get("debloat")
+            if features_to_debloat is None:
+                raise ValueError(f"no features selected to debloat from library {library.get('name')}")
+            try:
+                target_features = resolve_features(features_to_debloat, self.hierarchy(config_path, library))
+            except KeyError as err:
+                raise ValueError(f"feature to debloat {err.args[0]} is not in the hierarchy of library "
+                                 f"{library.get('name')}")
+
+            locations = [os.path.join(cwd, location) for location in library.get("locations")]
+            output = None
+            if request.get("output_dir") is not None:
+                output = OutputTree(Path(cwd) / request["output_dir"], locations,
+                                    request.get("link_mode", "hardlink"))
+            results.append(self.debloat_library(dict(library, locations=locations), target_features, output))
+        return {"ok": True, "libraries": results}
+
+
+class DebloatRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles a connection to the server: every line received is a request, answered with a line holding the response.
+    """
+
+    def handle(self) -> None:
+        """
+        Serves the requests of the connection until it is closed.
+        :return: None
+        """
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("command") == "ping":
+                    response = {"ok": True}
+                elif request.get("command") == "shutdown":
+                    response = {"ok": True}
+                    threading.Thread(target=self.server.shutdown).start()
+                else:
+                    response = self.server.service.debloat(request)
+            except (ValueError, KeyError, OSError, yaml.YAMLError) as err:
+                logging.error("Request failed: %s", err)
+                response = {"ok": False, "error": str(err)}
+            except Exception as err:
+                logging.error("Request failed:\n%s", traceback.format_exc())
+                response = {"ok": False, "error": f"{type(err).__name__}: {err}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class DebloatServer(socketserver.UnixStreamServer):
+    """
+    Unix socket server serving debloat requests one at a time, so requests never debloat the same files concurrently.
+    """
+
+    def __init__(self, socket_path: str):
+        """
+        DebloatServer constructor
+        :param str socket_path: Filepath of the socket to listen on.
+        """
+        super(DebloatServer, self).__init__(socket_path, DebloatRequestHandler)
+        self.service = DebloatService()
+
+
+def send_request(socket_path: str, request: Dict) -> Dict:
+    """
+    Sends a request to the server and waits for its response.
+    :param str socket_path: Filepath of the server's socket.
+    :param dict request: The request.
+    :return: The response.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode() + b"\n")
+        with connection.makefile("rb") as response:
+            return json.loads(response.readline())
+
+
+def serve_main(argv) -> None:
+    """
+    `carve serve` subcommand: serve debloat requests on a Unix socket.
+    """
+    log_opts = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR,
+                "CRITICAL": logging.CRITICAL}
+
+    parser = argparse.ArgumentParser(prog="carve serve", description="Serve debloat requests on a Unix socket, "
+                                     "keeping configurations and parsed files in memory between requests.")
+    parser.add_argument("--socket", help="Filepath of the socket to listen on.", type=str, default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("-ll", "--log_level", help="Verbosity of logging.", type=str, default="WARNING",
+                        choices=log_opts.keys())
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=log_opts.get(args.log_level))
+
+    if os.path.exists(args.socket):
+        try:
+            send_request(args.socket, {"command": "ping"})
+        except OSError:
+            # Left behind by a server that did not shut down cleanly
+            os.unlink(args.socket)
+        else:
+            sys.exit(f"A server is already listening on {args.socket}.")
+    directory = os.path.dirname(args.socket)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with DebloatServer(args.socket) as server:
+        print(f"Serving debloat requests on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(args.socket)
+
+
+def client_main(argv) -> None:
+    """
+    `carve client` subcommand: send a debloat request to a running `carve serve`.
+    """
+    parser = argparse.ArgumentParser(prog="carve client", description="Send a debloat request to `carve serve`.")
+    parser.add_argument("debloat_config", help="File containing debloating configuration.", type=str, nargs="?")
+    parser.add_argument("--socket", help="Filepath of the server's socket.", type=str, default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--library", help="Name of the library to debloat (all libraries by default).", type=str,
+                        default=None)
+    parser.add_argument("--features", help="Features to debloat, instead of the library's debloat entry.", type=str,
+                        nargs="+", default=None)
+    parser.add_argument("--output_dir", help="Write the debloated libraries to this directory instead of debloating "
+                        "in place.", type=str, default=None)
+    parser.add_argument("--link_mode", help="How files left unchanged are created in the output directory.", type=str,
+                        default="hardlink", choices=LINK_MODES)
+    parser.add_argument("--shutdown", help="Stop the server.", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.shutdown:
+        request = {"command": "shutdown"}
+    elif args.debloat_config is None:
+        parser.error("the debloat_config argument is required")
+    else:
+        request = {"config": os.path.abspath(args.debloat_config), "library": args.library,
+                   "features": args.features, "output_dir": args.output_dir, "link_mode": args.link_mode,
+                   "cwd": os.getcwd()}
+
+    try:
+        response = send_request(args.socket, request)
+    except OSError as err:
+        sys.exit(f"Cannot reach a server on {args.socket}: {err}")
+
+    if not response.get("ok"):
+        sys.exit(f"Debloating failed: {response.get('error')}")
+    for library in response.get("libraries", []):
+        print(f"Library {library['name']}: {library['files']} files processed, {library['debloated']} debloated, "
+              f"{library['skipped']} without annotations to debloat.")
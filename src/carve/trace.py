@@ -0,0 +1,129 @@
+"""
+CARVE Tracing
+This module records a timeline of a debloating run as Chrome trace events, which Perfetto (ui.perfetto.dev) or
+chrome://tracing can open offline.  Spans cover libraries, files and the stages of each file, and carry the process
+and thread that ran them, so the work of parallel runs shows up per worker.
+
+Tracing is off unless it was started in the current process.  While it is off, trace_span does nothing, so spans can
+be placed on the debloating paths at no real cost.
+"""
+
+# Standard Library Imports
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Third Party Imports
+
+# Local Imports
+
+# Events recorded in this process, or None when tracing is off
+_events = None
+
+
+def _thread_id() -> int:
+    """
+    :return: Identifier of the current thread, as shown by the operating system where available.
+    """
+    get_native_id = getattr(threading, "get_native_id", None)
+    return get_native_id() if get_native_id is not None else threading.get_ident()
+
+
+def start_tracing() -> None:
+    """
+    Starts recording events in this process.
+    :return: None
+    """
+    global _events
+    _events = []
+
+
+def stop_tracing() -> List[Dict]:
+    """
+    Stops recording events in this process.
+    :return: Events recorded since tracing was started.
+    """
+    global _events
+    events, _events = _events or [], None
+    return events
+
+
+def tracing() -> bool:
+    """
+    :return: True if events are being recorded in this process.
+    """
+    return _events is not None
+
+
+def add_events(events: Optional[List[Dict]]) -> None:
+    """
+    Adds events recorded elsewhere (such as in a worker process) to this process's events.
+    :param list events: Events to add.
+    :return: None
+    """
+    if _events is not None and events:
+        _events.extend(events)
+
+
+@contextlib.contextmanager
+def collect_events():
+    """
+    Context manager recording the events of the code it wraps into a separate list (the value of the with statement),
+    for example to return the events of a single file from a worker process.
+    """
+    global _events
+    previous = _events
+    events = []
+    _events = events
+    try:
+        yield events
+    finally:
+        _events = previous
+
+
+@contextlib.contextmanager
+def trace_span(name: str, category: str = "stage", **args):
+    """
+    Context manager recording the code it wraps as a span, if tracing is on.
+    :param str name: Name of the span.
+    :param str category: Category of the span (library, file or stage).
+    :param args: Additional details shown with the span.
+    """
+    if _events is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        # Check again, the span may have been recorded into a list that was since detached.
+        if _events is not None:
+            _events.append({"name": name, "cat": category, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6,
+                            "pid": os.getpid(), "tid": _thread_id(), "args": args})
+
+
+def write_trace(path: str, events: List[Dict]) -> None:
+    """
+    Writes events as a Chrome trace-event JSON file.  Timestamps are made relative to the first event, and every
+    process is named (the calling process is the main process, any other is a worker).
+    :param str path: Filepath of the trace.
+    :param list events: Events to write.
+    :return: None
+    """
+    origin = min((event["ts"] for event in events), default=0)
+    trace_events = [dict(event, ts=event["ts"] - origin) for event in events]
+
+    main_pid = os.getpid()
+    for pid in sorted({event["pid"] for event in events}):
+        name = "carve" if pid == main_pid else f"carve worker {pid}"
+        trace_events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}})
+        trace_events.append({"name": "process_sort_index", "ph": "M", "pid": pid, "tid": 0,
+                             "args": {"sort_index": 0 if pid == main_pid else 1}})
+
+    with open(path, "w") as trace_file:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, trace_file)
@@ -5,13 +5,24 @@ This common utility library contains generally useful system functions that are
 
 # Standard Library Imports
 from datetime import datetime
+import mmap
 import os
+import shutil
+import tempfile
 
 # Third Party Imports
+import yaml
 
 # Local Imports
 
 
+# Use the C YAML loader (LibYAML) when available, it is considerably faster than the pure Python one.
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Files at least this large are scanned through a memory map rather than read into memory.
+MMAP_THRESHOLD = 1 << 20
+
+
 def flatten_dict(dictionary):
     """
     Utility Function: flatten_dict
@@ -68,6 +79,85 @@ def search_hierarchy(target, hierarchy):
     return found
 
 
+def compile_hierarchy(hierarchy):
+    """
+    Utility Function: compile_hierarchy
+    Compiles the (potentially nested) feature hierarchy into an index mapping every node (root, intermediate or leaf) to
+    its closure: the node itself and every node beneath it.  Resolving a feature to debloat is then a single lookup
+    instead of a search of the whole hierarchy.
+
+    Node names must be unique across the hierarchy, since a name must identify a single set of features.
+
+    :param dict hierarchy: Feature hierarchy, as nested dictionaries whose innermost values are lists of leaf features.
+    :return: Dictionary mapping each node name to a frozenset of the names in its closure.
+    :rtype: dict
+    :raises: ValueError if the hierarchy is malformed or contains duplicate node names.
+    """
+    if type(hierarchy) is not dict:
+        raise ValueError("Hierarchy is not a dictionary.")
+
+    index = dict()
+
+    def add_node(node, children):
+        """Adds a node and its descendants to the index, and returns the node's closure."""
+        if node in index:
+            raise ValueError(f"Feature {node} appears more than once in the hierarchy.")
+        # Reserve the name before descending, so duplicates within the subtree are detected.
+        index[node] = None
+
+        closure = {node}
+        if type(children) is dict:
+            for child, grandchildren in children.items():
+                closure.update(add_node(child, grandchildren))
+        elif type(children) is list:
+            for child in children:
+                closure.update(add_node(child, None))
+        elif children is not None:
+            raise ValueError(f"Feature {node} has children that are not a list or dictionary.")
+
+        index[node] = frozenset(closure)
+        return index[node]
+
+    for node, children in hierarchy.items():
+        add_node(node, children)
+
+    return index
+
+
+def resolve_features(features_to_debloat, hierarchy_index):
+    """
+    Utility Function: resolve_features
+    Expands the features (or feature groups) selected for debloating into the set of all features beneath them.
+    :param list features_to_debloat: Names of the features and feature groups to debloat
+    :param dict hierarchy_index: Index of the feature hierarchy, as returned by compile_hierarchy
+    :return: Set of all features to debloat
+    :rtype: set
+    :raises: KeyError naming the first feature that is not in the hierarchy.
+    """
+    target_features = set(features_to_debloat)
+
+    for feature in features_to_debloat:
+        closure = hierarchy_index.get(feature)
+        if closure is None:
+            raise KeyError(feature)
+        target_features.update(closure)
+
+    return target_features
+
+
+def load_config(filepath):
+    """
+    Utility Function: load_config
+    Loads a debloating configuration file.
+    :param filepath: Path of the YAML configuration file
+    :return: The parsed configuration
+    :rtype: dict
+    :raises: yaml.YAMLError if the file cannot be parsed, OSError if it cannot be read.
+    """
+    with open(filepath, "r") as config_file:
+        return yaml.load(config_file, Loader=YAML_LOADER)
+
+
 def create_output_directory(prefix, timestamp=True):
     """
     Create a subdirectory in the current directory for output like logs, fuzzing results, etc.
@@ -108,4 +198,49 @@ def get_extension(filename):
     """
     split_string = filename.split(".")
     last_index = len(split_string)-1
-    return split_string[last_index]
\ No newline at end of file
+    return split_string[last_index]
+
+
+def file_contains(filepath, sequence):
+    """
+    Utility Function: file_contains
+    Checks whether the raw bytes of a file contain the byte sequence, without decoding or splitting the file into lines.
+    Large files are scanned through a memory map, smaller files with a single bulk read.
+    :param filepath: Path of the file to scan
+    :param bytes sequence: Byte sequence to search for
+    :return: True if the sequence occurs in the file
+    :rtype: bool
+    """
+    with open(filepath, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return False
+        if size < MMAP_THRESHOLD:
+            return sequence in file.read()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return buffer.find(sequence) > -1
+
+
+def write_file_atomic(filepath, contents):
+    """
+    Utility Function: write_file_atomic
+    Replaces the contents of a file by writing a temporary file in the same directory and renaming it over the
+    original, so an interrupted write never leaves a truncated file behind.  The original file's permissions are kept, and
+    a symbolic link is written through to its target instead of being replaced by a regular file.
+    :param filepath: Path of the file to write
+    :param contents: New contents of the file, either str (written in text mode) or bytes
+    :return: None
+    :raises: OSError if the file cannot be written.
+    """
+    filepath = os.path.realpath(filepath)
+    directory, filename = os.path.split(filepath)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb" if isinstance(contents, bytes) else "w") as file:
+            file.write(contents)
+        if os.path.exists(filepath):
+            shutil.copymode(filepath, temp_path)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,158 @@
+"""
+CARVE Variants
+This module debloats a library into one output tree per variant, a named selection of features to debloat, leaving
+the library's own source code untouched.
+
+Each file is read, scanned for annotations and (for Python) parsed once for all variants.  Variants selecting the same
+annotations of a file get identical output, so it is only written for the first of them and linked into the trees of
+the others.  Files without annotations to debloat, and files that are not source code, are linked (or copied) from the
+library as they are.
+"""
+
+# Standard Library Imports
+import logging
+import os
+import shutil
+import traceback
+from pathlib import Path
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+# Third Party Imports
+
+# Local Imports
+from carve.output import link_file, location_folders
+from carve.trace import trace_span
+from carve.utility import resolve_features, write_file_atomic
+from carve.walk import FileWalker
+
+
+class Variant(NamedTuple):
+    """
+    A variant of a library: a named set of features to debloat and the directory its output tree is written to.
+    """
+    name: str
+    target_features: Set[str]
+    directory: Path
+
+
+class VariantSummary(NamedTuple):
+    """
+    Totals for a library debloated into variants.
+    """
+    files: int
+    debloated: int
+    linked: int
+
+
+def load_variants(variants_config: List[Dict], hierarchy_index: Dict, default_directory: str) -> List[Variant]:
+    """
+    Reads the variants section of a library's configuration.  Each variant has a name, a list of features to debloat
+    (as in the library's debloat entry) and optionally an output directory.
+    :param list variants_config: Entries of the variants section.
+    :param dict hierarchy_index: Index of the library's feature hierarchy (see compile_hierarchy).
+    :param str default_directory: Directory the output trees of variants without an output directory are written to,
+    each in a subdirectory named after the variant.
+    :return: List of the variants.
+    :raises: ValueError if a variant has no name or features to debloat, or two variants have the same name.
+    :raises: KeyError if a feature to debloat is not in the hierarchy.
+    """
+    variants = []
+    for entry in variants_config:
+        name = entry.get("name")
+        features_to_debloat = entry.get("debloat")
+        if name is None or features_to_debloat is None:
+            raise ValueError(f"variant {name or entry} needs a name and a list of features to debloat")
+        if any(variant.name == name for variant in variants):
+            raise ValueError(f"variant {name} is defined more than once")
+        directory = entry.get("output") or os.path.join(default_directory, str(name))
+        variants.append(Variant(str(name), resolve_features(features_to_debloat, hierarchy_index), Path(directory)))
+    return variants
+
+
+def debloat_variants_file(language_type: type, source: Path, relative: Path, variants: List[Variant],
+                          link_mode: str = "hardlink") -> VariantSummary:
+    """
+    Writes a library's file to the output tree of every variant, debloating it once per distinct selection of its
+    annotations.
+    :param type language_type: ResourceDebloater subclass used to debloat the file, or None to copy it as is.
+    :param Path source: Filepath of the file in the library.
+    :param Path relative: Filepath of the file relative to each variant's output directory.
+    :param list variants: Variants of the library.
+    :param str link_mode: How outputs already written for another variant are reused (see LINK_MODES in carve.output).
+    :return: VariantSummary of the file.
+    """
+    feature_sets = set()
+    debloater = None
+    if language_type is not None and language_type.has_annotations(source):
+        debloater = language_type(source, set())
+        debloater.read_from_disk()
+        feature_sets = debloater.annotation_feature_sets()
+
+    # Output already written for each selection of annotations (an empty selection leaves the file unchanged)
+    outputs: Dict[FrozenSet[FrozenSet[str]], Path] = {}
+    debloated = 0
+    linked = 0
+    for variant in variants:
+        destination = variant.directory / relative
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        selection = frozenset(features for features in feature_sets if features.issubset(variant.target_features))
+
+        if selection in outputs:
+            linked += link_file(outputs[selection], destination, link_mode)
+        elif not selection:
+            linked += link_file(source, destination, link_mode)
+        else:
+            logging.info("Debloating %s for variant %s", source, variant.name)
+            variant_debloater = debloater.with_features(variant.target_features)
+            variant_debloater.debloat()
+            write_file_atomic(destination, variant_debloater.get_code())
+            shutil.copymode(source, destination)
+            debloated += 1
+        outputs.setdefault(selection, destination)
+
+    return VariantSummary(1, debloated, linked)
+
+
+def run_variants(language_type: type, locations: List[str], extensions: List[str], variants: List[Variant],
+                 link_mode: str = "hardlink", filters: Optional[Dict] = None) -> VariantSummary:
+    """
+    Debloats a library into the output tree of each of its variants.  Every file in the library's locations is
+    mirrored into each tree, under a directory named after the location (see location_folders in carve.output); files
+    with one of the library's extensions are debloated, unless the library's filters exclude them.  Like the files to
+    debloat, every directory is only walked once, even when locations overlap.
+    :param type language_type: ResourceDebloater subclass used to debloat the library.
+    :param list locations: Directories containing the library's source code.
+    :param list extensions: Extensions (without the '.') of the files to debloat.
+    :param list variants: Variants of the library.
+    :param str link_mode: How outputs already written for another variant are reused (see LINK_MODES in carve.output).
+    :param dict filters: Exclude, include and gitignore entries of the library (see library_filters in carve.walk).
+    :return: VariantSummary of the library.
+    """
+    selected = {str(location) for location in FileWalker(extensions, **(filters or {})).files(locations)}
+    files = 0
+    debloated = 0
+    linked = 0
+    # Device and inode numbers of the directories already walked
+    visited: Set[Tuple[int, int]] = set()
+    for location, folder in zip(locations, location_folders(locations)):
+        root = Path(location)
+        for dirpath, dirnames, filenames in os.walk(location):
+            stat = os.stat(dirpath)
+            if (stat.st_dev, stat.st_ino) in visited:
+                dirnames.clear()
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+            for filename in filenames:
+                source = Path(dirpath) / filename
+                relative = Path(folder) / source.relative_to(root)
+                debloater_type = language_type if str(source) in selected else None
+                try:
+                    with trace_span(filename, "file", path=str(source), variants=len(variants)):
+                        summary = debloat_variants_file(debloater_type, source, relative, variants, link_mode)
+                except Exception as err:
+                    logging.error("Debloating failed on file %s:\n%s", source, traceback.format_exc())
+                    raise SystemExit(f"Debloating failed on file {source}: {err}")
+                files += summary.files
+                debloated += summary.debloated
+                linked += summary.linked
+    return VariantSummary(files, debloated, linked)
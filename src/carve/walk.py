@@ -0,0 +1,249 @@
+"""
+CARVE Walk
+This module finds the files of a library to debloat.  A library's locations are walked with os.scandir, matching file
+extensions against a set and pruning excluded directories before they are entered, so vendored code, build output and
+version control metadata cost nothing.
+
+Libraries can narrow the files to debloat in their configuration:
+
+ - exclude: Glob patterns of files and directories never to debloat.
+ - include: Glob patterns of the files to debloat (all files with the library's extensions by default).
+ - gitignore: If true, files and directories ignored by the .gitignore files of the library's locations (and the .git
+   directories themselves) are not debloated.
+
+Patterns use the syntax of .gitignore files and are matched against paths relative to the location: a pattern without
+a '/' matches a file or directory name at any depth, '**' matches any number of directories, a trailing '/' only
+matches directories and a leading '!' re-includes what an earlier pattern excluded.
+
+Every directory is only walked once, even when locations overlap or are reached through several paths, so no file is
+debloated twice in a run.
+"""
+
+# Standard Library Imports
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Set, Tuple
+
+# Third Party Imports
+
+# Local Imports
+
+
+class GlobRule(NamedTuple):
+    """
+    A single exclude pattern, from a library's configuration or a .gitignore file.
+    """
+    regex: Pattern
+    negated: bool
+    directory_only: bool
+    # Directory the pattern is relative to, relative to the location ("" for the location itself)
+    base: str
+
+    def matches(self, path: str, is_directory: bool) -> bool:
+        """
+        Checks whether the pattern matches a path.
+        :param str path: Path relative to the location, with '/' separators.
+        :param bool is_directory: True if the path is a directory.
+        :return: True if the pattern matches.
+        """
+        if self.directory_only and not is_directory:
+            return False
+        if self.base:
+            if not path.startswith(self.base + "/"):
+                return False
+            path = path[len(self.base) + 1:]
+        return self.regex.fullmatch(path) is not None
+
+
+def glob_regex(pattern: str) -> Pattern:
+    """
+    Compiles a glob pattern (in .gitignore syntax, without a leading '!' or trailing '/') into a regular expression
+    matching relative paths.
+    :param str pattern: The glob pattern.
+    :return: Compiled regular expression, to be matched against a whole path.
+    """
+    # Patterns without a '/' (other than a trailing one) match at any depth
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i) and i + 2 == len(pattern):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            members = pattern[i + 1:end]
+            if members.startswith("!"):
+                members = "^" + members[1:]
+            parts.append(f"[{members}]")
+            i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return re.compile(("" if anchored else "(?:.*/)?") + "".join(parts), re.DOTALL)
+
+
+def parse_rules(patterns: Iterable[str], base: str = "") -> List[GlobRule]:
+    """
+    Parses exclude patterns, in .gitignore syntax.
+    :param patterns: The patterns (lines of a .gitignore file, or a library's exclude entry).
+    :param str base: Directory the patterns are relative to, relative to the location.
+    :return: List of rules, in order.
+    """
+    rules = []
+    for pattern in patterns:
+        pattern = pattern.rstrip("\n")
+        if pattern.endswith(" ") and not pattern.endswith("\\ "):
+            pattern = pattern.rstrip(" ")
+        if not pattern or pattern.startswith("#"):
+            continue
+        negated = pattern.startswith("!")
+        if negated:
+            pattern = pattern[1:]
+        directory_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        if pattern:
+            rules.append(GlobRule(glob_regex(pattern), negated, directory_only, base))
+    return rules
+
+
+def is_excluded(rules: List[GlobRule], path: str, is_directory: bool) -> bool:
+    """
+    Checks whether a path is excluded.  The last rule matching the path decides.
+    :param list rules: Rules to apply, in order.
+    :param str path: Path relative to the location, with '/' separators.
+    :param bool is_directory: True if the path is a directory.
+    :return: True if the path is excluded.
+    """
+    excluded = False
+    for rule in rules:
+        if excluded == rule.negated and rule.matches(path, is_directory):
+            excluded = not rule.negated
+    return excluded
+
+
+def library_filters(library: Dict) -> Optional[Dict]:
+    """
+    Reads the configuration entries of a library narrowing the files to debloat.
+    :param dict library: Configuration of the library.
+    :return: Dictionary of the exclude, include and gitignore entries the library sets, or None if it sets none.
+    """
+    filters = {key: library[key] for key in ("exclude", "include", "gitignore") if library.get(key)}
+    return filters or None
+
+
+class FileWalker(object):
+    """
+    The FileWalker class collects the files of a library to debloat.
+    """
+
+    def __init__(self, extensions: Iterable[str], exclude: Iterable[str] = (), include: Iterable[str] = (),
+                 gitignore: bool = False):
+        """
+        FileWalker constructor
+        :param extensions: Extensions (without the '.') of the files to debloat.
+        :param exclude: Glob patterns of files and directories not to debloat.
+        :param include: Glob patterns of the files to debloat, or empty to debloat every file with an extension.
+        :param bool gitignore: Also exclude what the .gitignore files of the locations ignore.
+        """
+        self.extensions = frozenset(extensions)
+        self.exclude = parse_rules(exclude)
+        self.include = [glob_regex(pattern.rstrip("/")) for pattern in include]
+        self.gitignore = gitignore
+
+    def selects(self, name: str, path: str) -> bool:
+        """
+        Checks whether a file that is not excluded is to be debloated: it must have one of the extensions and, if there
+        are include patterns, it or one of its directories must match one of them.
+        :param str name: Name of the file.
+        :param str path: Path of the file relative to its location, with '/' separators.
+        :return: True if the file is to be debloated.
+        """
+        if name.rpartition(".")[2] not in self.extensions:
+            return False
+        if not self.include:
+            return True
+        while path:
+            if any(regex.fullmatch(path) for regex in self.include):
+                return True
+            path = path.rpartition("/")[0]
+        return False
+
+    def files(self, locations: List[str], directories: Optional[Dict[str, int]] = None) -> List[Path]:
+        """
+        Walks the library's locations and collects the files to debloat.
+        :param list locations: Directories containing the library's source code.
+        :param dict directories: If given, the modification time (in nanoseconds) of each directory walked is recorded
+        in it, by filepath.
+        :return: List of files to debloat, in discovery order (that of os.walk).
+        """
+        files = []
+        visited: Set[Tuple[int, int]] = set()
+        for location in locations:
+            self._walk(location, files, visited, directories)
+        return files
+
+    def _walk(self, location: str, files: List[Path], visited: Set[Tuple[int, int]],
+              directories: Optional[Dict[str, int]] = None) -> None:
+        """
+        Walks a single location, depth first and top down like os.walk, without following symbolic links to
+        directories.
+        :param str location: Directory to walk.
+        :param list files: List the files to debloat are appended to.
+        :param set visited: Device and inode numbers of the directories already walked.
+        :param dict directories: Modification time of each directory walked, by filepath, or None.
+        :return: None
+        """
+        # Directories still to walk: filepath, path relative to the location, and the rules applying in it
+        pending = [(location, "", self.exclude)]
+        while pending:
+            directory, relative, rules = pending.pop()
+            try:
+                stat = os.stat(directory)
+                if (stat.st_dev, stat.st_ino) in visited:
+                    continue
+                with os.scandir(directory) as scan:
+                    entries = list(scan)
+            except OSError:
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+            if directories is not None:
+                directories[directory] = stat.st_mtime_ns
+
+            if self.gitignore:
+                for entry in entries:
+                    if entry.name == ".gitignore" and entry.is_file():
+                        with open(entry.path, errors="replace") as gitignore:
+                            rules = rules + parse_rules(gitignore, relative)
+                        break
+
+            subdirectories = []
+            for entry in entries:
+                path = f"{relative}/{entry.name}" if relative else entry.name
+                try:
+                    is_directory = entry.is_dir()
+                except OSError:
+                    is_directory = False
+                if is_directory:
+                    if self.gitignore and entry.name == ".git":
+                        continue
+                    if not entry.is_symlink() and not is_excluded(rules, path, True):
+                        subdirectories.append((entry.path, path, rules))
+                elif self.selects(entry.name, path) and not is_excluded(rules, path, False):
+                    files.append(Path(entry.path))
+            pending.extend(reversed(subdirectories))
@@ -0,0 +1,92 @@
+"""Test cases for the synthetic benchmark corpora"""
+from pathlib import Path
+
+import libcst as cst
+import pytest
+
+from carve.bench import CCorpusGenerator, CorpusGenerator, PythonCorpusGenerator, bench_config, bench_engine
+
+
+REPOSITORY = Path(__file__).resolve().parent.parent
+
+
+def test_generation_is_deterministic(tmp_path):
+    for generator_type in (CCorpusGenerator, PythonCorpusGenerator):
+        first = generator_type(seed=7).generate_file(200)
+        second = generator_type(seed=7).generate_file(200)
+        assert first == second
+        assert first != generator_type(seed=8).generate_file(200)
+
+
+def test_corpus_generator_is_abstract():
+    with pytest.raises(TypeError):
+        CorpusGenerator()
+
+
+def test_c_corpus_debloats_cleanly(tmp_path):
+    generator = CCorpusGenerator(seed=1, density=0.4, depth=3)
+    stats = generator.generate_tree(str(tmp_path), 4, 300)
+    assert stats.files == 4
+    assert stats.annotations > 0
+
+    result = bench_engine("C", str(tmp_path), stats, generator.target_features())
+    assert result.lines == stats.lines
+    for file in tmp_path.rglob("*.c"):
+        assert "NOT removed" not in file.read_text()
+
+
+def test_python_corpus_debloats_cleanly(tmp_path):
+    generator = PythonCorpusGenerator(seed=1, density=0.4, depth=3)
+    stats = generator.generate_tree(str(tmp_path), 4, 300)
+    files = list(tmp_path.rglob("*.py"))
+    originals = {file: file.read_text() for file in files}
+    for contents in originals.values():
+        cst.parse_module(contents)
+
+    bench_engine("Python", str(tmp_path), stats, generator.target_features())
+    debloated = "".join(file.read_text() for file in files)
+    assert "### Segment Debloated." in debloated
+    assert "### Statement Debloated" in debloated
+
+
+def test_bench_config_leaves_sample_untouched(monkeypatch):
+    monkeypatch.chdir(REPOSITORY)
+    sample = REPOSITORY / "sample" / "libmodbus" / "src" / "modbus.c"
+    before = sample.read_text()
+
+    results = bench_config("sample/debloat-config.yaml")
+    assert [result.name for result in results] == ["libmodbus"]
+    assert results[0].files > 0
+    assert results[0].annotations > 0
+    assert sample.read_text() == before
+
+
+def test_bench_config_skips_variant_libraries(tmp_path, monkeypatch):
+    source = tmp_path / "lib"
+    source.mkdir()
+    (source / "main.c").write_text("///[A]\nint a = 1;\nint b = 2;\n")
+    config = tmp_path / "config.yaml"
+    config.write_text("""
+Libraries:
+    - name: plain
+      locations: [lib]
+      language: C
+      extensions: [c]
+      debloatable_features: {Group: [A, B]}
+      debloat: [A]
+    - name: variants
+      locations: [lib]
+      language: C
+      extensions: [c]
+      debloatable_features: {Group: [A, B]}
+      variants:
+        - name: no_a
+          debloat: [A]
+""")
+    monkeypatch.chdir(tmp_path)
+
+    assert [result.name for result in bench_config(str(config))] == ["plain"]
+    assert bench_config(str(config), library_name="variants") == []
+    with pytest.raises(ValueError):
+        bench_config(str(config), library_name="missing")
+    assert (source / "main.c").read_text().startswith("///[A]")
@@ -0,0 +1,46 @@
+"""Test cases for the C brace table"""
+from carve.resource_debloater.CBraceTable import CBraceTable
+
+
+def test_block_after():
+    lines = [
+        "int f(void)\n",
+        "{\n",
+        "    if (a) {\n",
+        "        b();\n",
+        "    }\n",
+        "}\n",
+    ]
+    table = CBraceTable(lines)
+    assert table.block_after(0) == (1, 5)
+    assert table.block_after(2) == (2, 4)
+    assert table.enclosing_close(3) == 4
+    assert [table.depth(line) for line in range(len(lines))] == [0, 0, 1, 2, 2, 1]
+
+
+def test_ignores_literals_and_comments():
+    lines = [
+        "{\n",
+        "    s = \"{ \\\" {\";\n",
+        "    c = '{';\n",
+        "    /* {\n",
+        "    { */ // {\n",
+        "    t = \"\\\n",
+        "{\";\n",
+        "}\n",
+    ]
+    table = CBraceTable(lines)
+    assert table.open_lines == [0]
+    assert table.close_lines == [7]
+
+
+def test_unterminated_block():
+    table = CBraceTable(["int f(void)\n", "{\n", "    return 0;\n"])
+    assert table.block_after(0) is None
+
+
+def test_block_outside_enclosing_block():
+    # The block enclosing line 2 closes before the next open brace, so it does not belong to line 2.
+    table = CBraceTable(["{\n", "    a();\n", "    b();\n", "}\n", "{\n", "}\n"])
+    assert table.block_after(2) is None
+    assert table.block_after(4) == (4, 5)
@@ -0,0 +1,54 @@
+"""Test cases for the debloating result cache"""
+import os
+
+from carve.cache import ResultCache
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.runner import run_files
+
+
+def test_key_depends_on_inputs():
+    key = ResultCache.make_key(b"int a;", "CResourceDebloater", {"A", "B"})
+    assert key == ResultCache.make_key(b"int a;", "CResourceDebloater", ["B", "A"])
+    assert key != ResultCache.make_key(b"int b;", "CResourceDebloater", {"A", "B"})
+    assert key != ResultCache.make_key(b"int a;", "PythonResourceDebloater", {"A", "B"})
+    assert key != ResultCache.make_key(b"int a;", "CResourceDebloater", {"A"})
+
+
+def test_put_get(tmp_path):
+    cache = ResultCache(tmp_path)
+    assert cache.get("ab12") == (False, None)
+    cache.put("ab12", b"output")
+    cache.put("cd34", None)
+    assert cache.get("ab12") == (True, b"output")
+    assert cache.get("cd34") == (True, None)
+    assert cache.stats().entries == 2
+
+
+def test_prune_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path, max_size=20)
+    for age, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(key, b"0123456789")
+        os.utime(cache.entry_path(key), (1000 + age, 1000 + age))
+
+    removed, freed = cache.prune()
+    assert removed == 2
+    assert freed == 22
+    assert cache.get("cc03") == (True, b"0123456789")
+    assert cache.get("aa01") == (False, None)
+
+
+def test_run_reuses_results(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    file = tmp_path / "file.c"
+    source = "int a = 1;\n///[Variant_A]\na = 2;\n"
+    expected = "int a = 1;\n/// Statement Debloated.\n\n"
+
+    file.write_text(source)
+    summary = run_files(CResourceDebloater, [file], {"Variant_A"}, cache=cache)
+    assert summary.cache_hits == 0
+    assert file.read_text() == expected
+
+    file.write_text(source)
+    summary = run_files(CResourceDebloater, [file], {"Variant_A"}, cache=cache)
+    assert summary.cache_hits == 1
+    assert file.read_text() == expected
@@ -0,0 +1,33 @@
+"""Test cases for the construct classifier"""
+from carve.resource_debloater.ConstructClassifier import ConstructClassifier
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+
+
+def test_precedence():
+    classifier = ConstructClassifier([("Else", r"\selse\b"), ("If", r"\sif\s*\(")])
+    assert classifier.classify("    else if (a) {") == "Else"
+    assert classifier.classify("if (a) {") == "If"
+    assert classifier.classify("a = 1;") == "Statement"
+
+
+def test_patterns_with_groups():
+    classifier = ConstructClassifier([("A", r"(a)(b)"), ("C", r"(c)")], default=None)
+    assert classifier.classify("xc") == "C"
+    assert classifier.classify("ab c") == "A"
+    assert classifier.classify("x") is None
+
+
+def test_add_construct():
+    classifier = ConstructClassifier([("IfBranch", r"\sif\s*\(")])
+    classifier.add_construct("Loop", r"\s(for|while)\s*\(")
+    classifier.add_construct("Macro", r"^\s*#\s*if", before="IfBranch")
+    assert classifier.classify("while (a) {") == "Loop"
+    assert classifier.classify("#if defined(X)") == "Macro"
+    assert classifier.classify("if (a) {") == "IfBranch"
+
+
+def test_c_classifier_extension():
+    classifier = ConstructClassifier(CResourceDebloater.CONSTRUCT_CLASSIFIER.constructs)
+    classifier.add_construct("Loop", r"\s(for|while)\s*\(", before="FunctionDefinition")
+    assert classifier.classify("while (rc == -1) {") == "Loop"
+    assert CResourceDebloater.get_construct("while (rc == -1) {") == "Statement"
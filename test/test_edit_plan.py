@@ -0,0 +1,78 @@
+"""Test cases for planning and applying edits"""
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.resource_debloater.EditPlan import Edit, EditPlan
+
+
+def test_apply():
+    lines = ["a\n", "b\n", "c\n", "d\n"]
+    plan = EditPlan()
+    assert plan.add([Edit(2, 3, ["C\n"])])
+    assert plan.add([Edit(0, 1, []), Edit(1, 1, ["inserted\n"])])
+    assert plan.apply(lines) == ["inserted\n", "b\n", "C\n", "d\n"]
+
+
+def test_reject_overlap():
+    plan = EditPlan()
+    assert plan.add([Edit(2, 6, [])])
+    assert not plan.add([Edit(3, 4, ["x\n"])])
+    assert not plan.add([Edit(0, 1, []), Edit(5, 7, [])])
+    assert not plan.add([Edit(4, 4, ["x\n"])])
+    assert plan.add([Edit(6, 6, ["x\n"])])
+    assert plan.add([Edit(2, 2, ["y\n"])])
+    assert len(plan) == 3
+
+
+def test_covers():
+    plan = EditPlan()
+    plan.add([Edit(2, 4, []), Edit(6, 6, ["x\n"])])
+    assert [line for line in range(8) if plan.covers(line)] == [2, 3]
+
+
+def test_nested_annotations():
+    input = \
+"""
+///[Variant_A]
+int func(int a)
+{
+    ///[Variant_A]
+    a = a + 1;
+    return a;
+}
+///[Variant_A]
+int b = 1;
+"""
+    expected = \
+"""
+/// Code Block Debloated.
+
+/// Statement Debloated.
+
+"""
+    debloater = CResourceDebloater(location="dummy", target_features={"Variant_A"})
+    debloater.lines = input.splitlines(keepends=True)
+    debloater.debloat()
+    assert "".join(debloater.lines) == expected
+
+
+def test_file_annotation_supersedes_plan():
+    input = \
+"""
+///[Variant_A]
+int b = 1;
+///[Variant_A]!
+int c = 1;
+"""
+    expected = \
+"""/// File Debloated.
+
+"""
+    debloater = CResourceDebloater(location="dummy", target_features={"Variant_A"})
+    debloater.lines = input.splitlines(keepends=True)
+    debloater.debloat()
+    assert "".join(debloater.lines) == expected
+
+
+def test_covering_start():
+    plan = EditPlan()
+    plan.add([Edit(2, 5, []), Edit(7, 7, ["inserted\n"])])
+    assert [plan.covering_start(line) for line in range(8)] == [None, None, 2, 2, 2, None, None, None]
@@ -80,3 +80,39 @@ a = 2
     debloater.module = cst.parse_module(input)
     debloater.debloat_explicit()
     assert debloater.module.code == expected
+
+def test_explicit_python_without_parse(tmp_path, monkeypatch):
+    input = \
+    """
+a = 1
+###[Variant_A]~
+a = 2
+###~
+# ###[Variant_A] is not an annotation here
+"""
+    expected = \
+    """
+a = 1
+### Segment Debloated.
+
+# ###[Variant_A] is not an annotation here
+"""
+    file = tmp_path / "file.py"
+    file.write_text(input)
+
+    def fail_parse(code):
+        raise AssertionError("explicit annotations should not require parsing")
+
+    monkeypatch.setattr(cst, "parse_module", fail_parse)
+    debloater = PythonResourceDebloater(location=file, target_features={"Variant_A"})
+    debloater.read_from_disk()
+    debloater.debloat()
+    debloater.write_to_disk()
+    assert file.read_text() == expected
+
+def test_has_implicit_annotations():
+    debloater = PythonResourceDebloater(location="dummy", target_features={"Variant_A"})
+    debloater.source = "a = '###[Variant_A]'\n###[Variant_A]~\n###~\n###[Variant_B]\nb = 1\n"
+    assert not debloater.has_implicit_annotations()
+    debloater.source += "###[Variant_A]\nc = 1\n"
+    assert debloater.has_implicit_annotations()
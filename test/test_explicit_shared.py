@@ -1,5 +1,9 @@
 """Test cases for shared explicit debloating logic"""
+import os
+
 from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.resource_debloater.PythonResourceDebloater import PythonResourceDebloater
+from carve.resource_debloater.ResourceDebloater import ResourceDebloater
 
 def test_explicit_c_segment():
     input = \
@@ -23,3 +27,45 @@ MODBUS_API int modbus_tcp_accept(modbus_t *ctx, int *s);
     debloater.process_explicit_annotation(location)
     output = "\n".join(debloater.lines)
     assert output == expected
+
+
+def test_write_unchanged_file(tmp_path):
+    file = tmp_path / "file.c"
+    file.write_text("///[Variant_A]\nint a = 1;\n")
+    os.utime(file, (0, 0))
+    debloater = CResourceDebloater(location=file, target_features={"Variant_B"})
+    debloater.read_from_disk()
+    debloater.debloat()
+    debloater.write_to_disk()
+    assert file.stat().st_mtime == 0
+
+
+def test_write_changed_file(tmp_path):
+    file = tmp_path / "file.c"
+    file.write_text("///[Variant_A]\nint a = 1;\n")
+    debloater = CResourceDebloater(location=file, target_features={"Variant_A"})
+    debloater.read_from_disk()
+    debloater.debloat()
+    debloater.write_to_disk()
+    assert file.read_text() == "/// Statement Debloated.\n\n"
+
+
+def test_find_matching_lines():
+    code = "int a;\n///[A] ///[B]\n\nb();\n///[C]"
+    found = ResourceDebloater.find_matching_lines(code, CResourceDebloater.ANNOTATION_REGEX)
+    assert [(line, match.start()) for line, match in found] == [(1, 7), (4, 27)]
+    assert ResourceDebloater.find_matching_lines("int a;\n", CResourceDebloater.ANNOTATION_REGEX) == []
+
+
+def test_python_explicit_annotation_lines():
+    code = "x = 1\n###[A]~\ny = 2\n###~\n  ###[B]~\nz = 3\n###~\nw = '###[A]~'\n"
+    debloater = PythonResourceDebloater("dummy", {"A"})
+    debloater.source = debloater.original = code
+    debloater.debloat_explicit()
+    assert debloater.get_code() == "x = 1\n### Segment Debloated.\n\n  ###[B]~\nz = 3\n###~\nw = '###[A]~'\n"
+
+    # Files with line breaks other than newlines are checked line by line
+    debloater = PythonResourceDebloater("dummy", {"A"})
+    debloater.source = debloater.original = "\x0c" + code
+    debloater.debloat_explicit()
+    assert debloater.get_code() == "\x0cx = 1\n### Segment Debloated.\n\n  ###[B]~\nz = 3\n###~\nw = '###[A]~'\n"
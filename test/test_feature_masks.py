@@ -0,0 +1,73 @@
+"""Test cases for feature bit masks"""
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.resource_debloater.FeatureMasks import FeatureMasks
+from carve.resource_debloater.ResourceDebloater import ResourceDebloater
+
+
+def test_feature_masks():
+    masks = FeatureMasks(ResourceDebloater.get_features)
+    target_mask = masks.mask({"A", "B"})
+    assert masks.bits == {"A": 1, "B": 2} or masks.bits == {"B": 1, "A": 2}
+
+    assert masks.selects("///[A]\n", target_mask)
+    assert masks.selects("///[B][A]~\n", target_mask)
+    assert not masks.selects("///[A][C]\n", target_mask)
+    assert masks.annotations["///[A][C]\n"] == masks.bit("A") | masks.bit("C")
+    assert not masks.selects("///[A][C]\n", target_mask)
+
+
+def test_feature_masks_memo_is_bounded(monkeypatch):
+    masks = FeatureMasks(ResourceDebloater.get_features)
+    monkeypatch.setattr(masks, "MAX_ANNOTATIONS", 2)
+    for feature in "ABC":
+        masks.annotation_mask(f"///[{feature}]\n")
+    assert list(masks.annotations) == ["///[C]\n"]
+
+
+def test_feature_masks_bits_are_bounded(monkeypatch):
+    masks = FeatureMasks(ResourceDebloater.get_features)
+    monkeypatch.setattr(masks, "MAX_BITS", 3)
+    target_mask = masks.target_mask({"A"})
+    for feature in "BCD":
+        masks.annotation_mask(f"///[{feature}]\n")
+    assert len(masks.bits) == 4 and masks.generation == 0
+    # Bits are only reassigned when a target mask is built
+    assert masks.selects("///[A]\n", target_mask)
+    target_mask = masks.target_mask({"E"})
+    assert masks.bits == {"E": 1} and masks.annotations == {} and masks.generation == 1
+    assert masks.selects("///[E]\n", target_mask) and not masks.selects("///[A]\n", target_mask)
+
+
+def test_target_mask_follows_generation(monkeypatch):
+    masks = FeatureMasks(ResourceDebloater.get_features)
+    monkeypatch.setattr(ResourceDebloater, "FEATURE_MASKS", masks)
+    monkeypatch.setattr(masks, "MAX_BITS", 0)
+    first = CResourceDebloater("dummy", {"A"})
+    assert first.debloats_annotation("///[A]\n") and not first.debloats_annotation("///[C]\n")
+    # Building another debloater's mask reassigns the bits; the first debloater rebuilds its own
+    second = CResourceDebloater("dummy", {"B"})
+    assert second.debloats_annotation("///[B]\n") and not second.debloats_annotation("///[A]\n")
+    assert masks.generation == 1
+    assert first.debloats_annotation("///[A]\n") and not first.debloats_annotation("///[B]\n")
+    assert masks.generation == 2
+
+
+def test_large_selection_keeps_bits_across_files(monkeypatch):
+    masks = FeatureMasks(ResourceDebloater.get_features)
+    monkeypatch.setattr(ResourceDebloater, "FEATURE_MASKS", masks)
+    features = {f"F{index}" for index in range(masks.MAX_BITS + 476)}
+    for _ in range(5):
+        debloater = CResourceDebloater("dummy", features)
+        assert debloater.debloats_annotation("///[F0][F1499]\n")
+        assert not debloater.debloats_annotation("///[F0][Other]\n")
+    assert masks.generation == 0
+    assert len(masks.bits) == len(features) + 1
+    assert list(masks.annotations) == ["///[F0][F1499]\n", "///[F0][Other]\n"]
+
+
+def test_with_features_resets_target_mask():
+    debloater = CResourceDebloater("dummy", {"A"})
+    assert debloater.debloats_annotation("///[A]\n")
+    copy = debloater.with_features({"B"})
+    assert not copy.debloats_annotation("///[A]\n") and copy.debloats_annotation("///[B]\n")
+    assert debloater.debloats_annotation("///[A]\n")
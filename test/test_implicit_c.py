@@ -649,3 +649,28 @@ def test_get_construct_statement_close_to_func():
     res = CResourceDebloater.get_construct(line)
     expected = "Statement"
     assert res == expected
+
+def test_func_def_braces_in_literals():
+    input = \
+"""
+///[Variant_A]
+static void print_braces(void)
+{
+    /* a comment with a closing brace } */
+    printf("}}\\n"); // another }
+    char c = '}';
+}
+int a = 1;
+"""
+    expected = \
+"""
+/// Code Block Debloated.
+
+int a = 1;
+"""
+    debloater = CResourceDebloater(location="dummy", target_features={"Variant_A"})
+    debloater.lines = input.splitlines(keepends=True)
+    location = 1
+    debloater.process_implicit_annotation(location)
+    output = "".join(debloater.lines)
+    assert output == expected
@@ -393,3 +393,60 @@ main()
     module = cst.parse_module(input)
     modified = module.visit(PythonImplicitDebloater(features={"Variant_A"}))
     assert modified.code == expected
+
+def test_else_with_debloated_statement_in_debloated_if():
+    input = \
+    """
+a = 1
+###[Variant_A]
+if a == 2:
+    print("a is 2")
+else:
+    ###[Variant_A]
+    print(f"a is {a}")
+"""
+    expected = \
+    """
+a = 1
+if a == 2:
+    ### If Statement Branch Debloated
+else:
+    ### Statement Debloated
+
+"""
+    module = cst.parse_module(input)
+    modified = module.visit(PythonImplicitDebloater(features={"Variant_A"}))
+    assert modified.code == expected
+
+def test_only_nodes_enclosing_annotations_are_visited():
+    input = \
+    """
+def plain(a):
+    return a
+
+def annotated(items):
+    for item in items:
+        try:
+            ###[Variant_A]
+            print(item)
+        except ValueError:
+            pass
+"""
+    visited = []
+
+    class RecordingDebloater(PythonImplicitDebloater):
+        def visit_FunctionDef(self, node):
+            visited.append(node.name.value)
+
+    debloater = RecordingDebloater(features={"Variant_A"})
+    modified = cst.parse_module(input).visit(debloater)
+    assert visited == ["annotated"]
+    assert "### Statement Debloated" in modified.code
+    assert debloater.processed == {"Statement": 1}
+
+def test_comment_verdicts_are_memoized():
+    debloater = PythonImplicitDebloater(features={"Variant_A"})
+    assert debloater.debloat_comment("###[Variant_A]")
+    assert not debloater.debloat_comment("###[Variant_B]")
+    assert not debloater.debloat_comment("# ###[Variant_A]")
+    assert debloater.verdicts == {"###[Variant_A]": True, "###[Variant_B]": False, "# ###[Variant_A]": False}
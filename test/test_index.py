@@ -0,0 +1,66 @@
+"""Test cases for the annotation index"""
+import os
+
+from carve.index import AnnotationIndex, scan_annotations
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.resource_debloater.PythonResourceDebloater import PythonResourceDebloater
+
+
+def test_scan_annotations():
+    c_source = b"///[A][B]!\nint a;\n///[A]\nif (a) {\n}\n///[B]~\nb();\n///~\n"
+    annotations = scan_annotations(CResourceDebloater, "file.c", c_source)
+    assert [(annotation.line, annotation.type, annotation.construct) for annotation in annotations] == \
+           [(0, "file", "File"), (2, "implicit", "IfBranch"), (5, "segment", "Segment")]
+    assert annotations[0].features == {"A", "B"}
+
+    python_source = b"###[A]\n@decorator\ndef f():\n    ###[B]\n    return 1\n"
+    annotations = scan_annotations(PythonResourceDebloater, "file.py", python_source)
+    assert [annotation.construct for annotation in annotations] == ["FunctionDefinition", "Statement"]
+    assert scan_annotations(PythonResourceDebloater, "file.py", b"x = 1\n") == []
+
+
+def test_target_files_and_refresh(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "a.c").write_text("///[A]\na();\n")
+    (source / "b.c").write_text("///[A][B]\nb();\n")
+    (source / "c.c").write_text("int c;\n")
+
+    index = AnnotationIndex(str(tmp_path / "index.db"))
+    update = index.update_library("lib", "C", [str(source)], ["c"])
+    assert (update.files, update.scanned, update.removed) == (3, 3, 0)
+    assert index.update_library("lib", "C", [str(source)], ["c"]).scanned == 0
+
+    assert sorted(path.name for path in index.target_files("lib", {"A"})) == ["a.c"]
+    assert sorted(path.name for path in index.target_files("lib", {"A", "B"})) == ["a.c", "b.c"]
+    assert index.target_files("lib", {"C"}) == []
+
+    # Changed files are rescanned, touched but unchanged files are not, and removed files are dropped
+    (source / "c.c").write_text("///[C]\nint c;\n")
+    os.utime(source / "a.c", (0, 0))
+    (source / "b.c").unlink()
+    assert index.refresh_library("lib", CResourceDebloater) == 1
+    assert [path.name for path in index.target_files("lib", {"C"})] == ["c.c"]
+    assert index.file_count("lib") == 2
+    index.close()
+
+
+def test_changed_directories(tmp_path):
+    source = tmp_path / "src"
+    (source / "sub").mkdir(parents=True)
+    (source / "sub" / "a.c").write_text("///[A]\na();\n")
+
+    index = AnnotationIndex(str(tmp_path / "index.db"))
+    index.update_library("lib", "C", [str(source)], ["c"])
+    assert index.changed_directories("lib") == []
+
+    # A file added since the library was indexed is only found by walking it again
+    (source / "sub" / "b.c").write_text("///[A]\nb();\n")
+    os.utime(source / "sub", ns=(0, 0))
+    assert index.changed_directories("lib") == [str(source / "sub")]
+    index.refresh_library("lib", CResourceDebloater)
+    assert [path.name for path in index.target_files("lib", {"A"})] == ["a.c"]
+    assert index.update_library("lib", "C", [str(source)], ["c"]).scanned == 1
+    assert [path.name for path in index.target_files("lib", {"A"})] == ["a.c", "b.c"]
+    assert index.changed_directories("lib") == []
+    index.close()
@@ -0,0 +1,33 @@
+"""Test cases for the language debloater registry"""
+import sys
+
+from carve.languages import LanguageRegistry, discover_debloaters
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+
+
+def test_registry_loads_lazily(tmp_path, monkeypatch):
+    (tmp_path / "shell_debloater.py").write_text("class ShellResourceDebloater:\n    pass\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    registry = LanguageRegistry(group=None)
+    registry.register("Shell", "shell_debloater:ShellResourceDebloater")
+    registry.register("Broken", "missing_debloater:MissingResourceDebloater")
+    assert sorted(registry) == ["Broken", "C", "Python", "Shell"]
+    assert "Shell" in registry and "shell_debloater" not in sys.modules
+
+    assert registry["Shell"].__name__ == "ShellResourceDebloater"
+    assert registry["C"] is CResourceDebloater
+    assert registry.get("Broken") is None
+    assert registry.get("Rust") is None
+
+
+def test_discover_debloaters(tmp_path, monkeypatch):
+    dist_info = tmp_path / "carve_shell-0.1.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text("Metadata-Version: 2.1\nName: carve-shell\nVersion: 0.1\n")
+    (dist_info / "entry_points.txt").write_text("[carve.debloaters]\nShell = carve_shell:ShellResourceDebloater\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    assert discover_debloaters()["Shell"] == "carve_shell:ShellResourceDebloater"
+    assert LanguageRegistry().targets["Shell"] == "carve_shell:ShellResourceDebloater"
+    assert "Shell" not in LanguageRegistry(group=None)
@@ -0,0 +1,32 @@
+"""Test cases for the line buffer"""
+from carve.resource_debloater.EditPlan import Edit, EditPlan
+from carve.resource_debloater.LineBuffer import LineBuffer, memory_bytes
+
+
+def test_lines_match_readlines():
+    cases = {"": [], "\n": ["\n"], "a": ["a"], "a\n": ["a\n"], "a\nb": ["a\n", "b"], "a\n\nb\n": ["a\n", "\n", "b\n"],
+             "a\r\nb\x0cc\n": ["a\r\n", "b\x0cc\n"]}
+    for text, lines in cases.items():
+        buffer = LineBuffer(text)
+        assert list(buffer) == lines
+        assert len(buffer) == len(lines)
+        assert [buffer[line] for line in range(-len(lines), len(lines))] == lines + lines
+        assert buffer[1:] == lines[1:]
+
+
+def test_apply_assembles_text():
+    buffer = LineBuffer("a\nb\nc\nd")
+    plan = EditPlan()
+    assert plan.add([Edit(2, 3, ["C\n"])])
+    assert plan.add([Edit(0, 1, []), Edit(1, 1, ["inserted\n"])])
+    output = plan.apply(buffer)
+    assert isinstance(output, LineBuffer)
+    assert output.text == "inserted\nb\nC\nd"
+    assert list(output) == plan.apply(list(buffer))
+
+
+def test_memory_bytes_counts_shared_text_once():
+    text = "line\n" * 1000
+    buffer = LineBuffer(text)
+    assert memory_bytes(text, buffer) == buffer.memory_bytes()
+    assert memory_bytes(text, buffer) < memory_bytes(text.splitlines(keepends=True))
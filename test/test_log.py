@@ -0,0 +1,68 @@
+"""Test cases for queue-based logging"""
+import logging
+
+import pytest
+
+from carve.log import FILE_SUMMARY_LOGGER, SUMMARY_LOGGER, setup_logging
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.runner import run_files
+
+
+SOURCE = \
+"""
+int a = 1;
+///[Variant_A]
+a = 2;
+"""
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    level = root.level
+    yield
+    for handler in list(root.handlers):
+        if handler not in handlers:
+            root.removeHandler(handler)
+    root.setLevel(level)
+    SUMMARY_LOGGER.setLevel(logging.NOTSET)
+    FILE_SUMMARY_LOGGER.setLevel(logging.NOTSET)
+
+
+def make_tree(root, count):
+    root.mkdir()
+    files = []
+    for index in range(count):
+        file = root / f"file_{index}.c"
+        file.write_text(SOURCE)
+        files.append(file)
+    return files
+
+
+def test_detailed_log(tmp_path, restore_logging):
+    files = make_tree(tmp_path / "src", 2)
+    log_file = tmp_path / "log.txt"
+    listener = setup_logging(str(log_file), logging.INFO)
+    run_files(CResourceDebloater, files, {"Variant_A"})
+    listener.stop()
+
+    lines = log_file.read_text().splitlines()
+    assert f"INFO:root:Processing file: {files[0]}" in lines
+    assert "INFO:root:Annotation found on line 2" in lines
+    assert not any(line.startswith("INFO:carve.files:") for line in lines)
+
+
+def test_compact_log(tmp_path, restore_logging):
+    files = make_tree(tmp_path / "src", 2)
+    log_file = tmp_path / "log.txt"
+    listener = setup_logging(str(log_file), logging.INFO, compact=True)
+    run_files(CResourceDebloater, files, {"Variant_A"}, jobs=2)
+    SUMMARY_LOGGER.info("Done.")
+    listener.stop()
+
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 3
+    assert lines[0].startswith(f"INFO:carve.files:{files[0]}: 1 annotations found, 1 debloated, 0 failed")
+    assert lines[1].startswith(f"INFO:carve.files:{files[1]}: ")
+    assert lines[2] == "INFO:carve.summary:Done."
@@ -0,0 +1,81 @@
+"""Test cases for writing debloated libraries to output trees"""
+import os
+
+from carve.output import OutputTree, link_file, location_folders
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.runner import collect_files, run_files
+
+
+def test_link_file_replaces_destination(tmp_path):
+    source = tmp_path / "source.c"
+    source.write_text("int a;\n")
+    destination = tmp_path / "destination.c"
+    destination.write_text("int b;\n")
+
+    assert link_file(source, destination, "hardlink")
+    assert os.path.samefile(source, destination)
+    assert not link_file(source, destination, "copy")
+    assert not os.path.samefile(source, destination)
+    assert destination.read_text() == "int a;\n"
+
+
+def test_run_files_to_output_tree(tmp_path):
+    library = tmp_path / "lib"
+    (library / "src").mkdir(parents=True)
+    source = "int a = 1;\n///[Variant_A]\na = 2;\n"
+    (library / "src" / "a.c").write_text(source)
+    (library / "src" / "a.c").chmod(0o750)
+    (library / "b.c").write_text("int b;\n")
+    (library / "README").write_text("readme\n")
+
+    output = OutputTree(tmp_path / "out", [str(library)])
+    files = collect_files([str(library)], ["c"])
+    assert output.mirror(skip=files) == [library / "README"]
+    summary = run_files(CResourceDebloater, files, {"Variant_A"}, output=output)
+    assert (summary.files, summary.skipped) == (2, 1)
+
+    mirror = tmp_path / "out" / "lib"
+    assert (mirror / "src" / "a.c").read_text() == "int a = 1;\n/// Statement Debloated.\n\n"
+    assert (mirror / "src" / "a.c").stat().st_mode & 0o777 == 0o750
+    assert os.path.samefile(library / "b.c", mirror / "b.c")
+    assert os.path.samefile(library / "README", mirror / "README")
+    assert (library / "src" / "a.c").read_text() == source
+
+
+def test_locations_with_the_same_name_get_distinct_folders(tmp_path):
+    assert location_folders(["a/src", "b/src/", "src_2", "c/src"]) == ["src", "src_3", "src_2", "src_4"]
+    for name in ("a", "b"):
+        (tmp_path / name / "src").mkdir(parents=True)
+        (tmp_path / name / "src" / "main.c").write_text(f"int {name};\n")
+
+    output = OutputTree(tmp_path / "out", [str(tmp_path / "a" / "src"), str(tmp_path / "b" / "src")], "copy")
+    output.mirror()
+    assert (tmp_path / "out" / "src" / "main.c").read_text() == "int a;\n"
+    assert (tmp_path / "out" / "src_2" / "main.c").read_text() == "int b;\n"
+
+
+def test_read_only_directories(tmp_path):
+    library = tmp_path / "lib"
+    (library / "src").mkdir(parents=True)
+    (library / "src" / "a.c").write_text("int a = 1;\n///[Variant_A]\na = 2;\n")
+    (library / "src" / "b.c").write_text("int b;\n")
+    for directory in (library / "src", library):
+        directory.chmod(0o555)
+
+    try:
+        output = OutputTree(tmp_path / "out", [str(library)])
+        files = collect_files([str(library)], ["c"])
+        for _ in range(2):
+            # Directories left read-only by the first run are made writable again by the second
+            output.mirror(skip=files)
+            run_files(CResourceDebloater, files, {"Variant_A"}, output=output)
+            output.copy_modes()
+            mirror = tmp_path / "out" / "lib"
+            assert (mirror / "src" / "a.c").read_text() == "int a = 1;\n/// Statement Debloated.\n\n"
+            assert (mirror / "src" / "b.c").read_text() == "int b;\n"
+            assert (mirror / "src").stat().st_mode & 0o777 == 0o555
+            assert mirror.stat().st_mode & 0o777 == 0o555
+    finally:
+        for directory in (library, library / "src", tmp_path / "out" / "lib", tmp_path / "out" / "lib" / "src"):
+            if directory.exists():
+                directory.chmod(0o755)
@@ -0,0 +1,59 @@
+"""Test cases for profiling debloating runs"""
+import pstats
+
+from carve.profiling import RunProfiler
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.runner import run_files
+
+
+SOURCE = \
+"""
+int a = 1;
+///[Variant_A]
+a = 2;
+"""
+
+
+def make_tree(root, count):
+    root.mkdir()
+    files = []
+    for index in range(count):
+        file = root / f"file_{index}.c"
+        file.write_text(SOURCE + "a++;\n" * index * 50)
+        files.append(file)
+    return files
+
+
+def test_profiles_each_stage(tmp_path):
+    files = make_tree(tmp_path / "src", 4)
+    results = tmp_path / "results"
+    results.mkdir()
+    profiler = RunProfiler(str(results), top=5)
+
+    with profiler.stage("walk"):
+        sorted(files)
+    run_files(CResourceDebloater, files, {"Variant_A"}, profiler=profiler)
+    profiler.write()
+
+    for stage in ("walk", "read", "debloat", "write"):
+        stats = pstats.Stats(str(results / f"profile_{stage}.pstats"))
+        assert stats.total_calls > 0
+    assert not (results / "profile_config.pstats").exists()
+    assert "Stage: debloat" in (results / "profile_summary.txt").read_text()
+
+
+def test_profiles_slowest_files_in_parallel(tmp_path):
+    files = make_tree(tmp_path / "src", 5)
+    results = tmp_path / "results"
+    results.mkdir()
+    profiler = RunProfiler(str(results), top=5, slowest=2)
+
+    run_files(CResourceDebloater, files, {"Variant_A"}, jobs=2, profiler=profiler)
+    profiler.write()
+
+    slowest = sorted(path.name for path in results.glob("profile_slowest_*.pstats"))
+    assert len(slowest) == 2
+    assert slowest[0].startswith("profile_slowest_1_")
+    assert pstats.Stats(str(results / "profile_debloat.pstats")).total_calls > 0
+    for file in files:
+        assert "Statement Debloated." in file.read_text()
@@ -0,0 +1,94 @@
+"""Test cases for the per-file run report"""
+import csv
+import json
+
+from carve.report import RunReport
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.resource_debloater.PythonResourceDebloater import PythonResourceDebloater
+from carve.runner import run_files
+
+
+C_SOURCE = \
+"""int a = 1;
+///[Variant_A]
+a = 2;
+///[Variant_B]
+a = 3;
+///[Variant_A]~
+a = 4;
+///~
+///[Variant_A]
+int f(void)
+{
+    return a;
+}
+///[Variant_A]
+int g(void)
+{
+"""
+
+PYTHON_SOURCE = \
+"""a = 1
+###[Variant_A]
+a = 2
+###[Variant_A]
+def f():
+    return a
+###[Variant_A]~
+a = 3
+###~
+"""
+
+
+def test_report_rows_and_totals(tmp_path):
+    (tmp_path / "src").mkdir()
+    debloated = tmp_path / "src" / "debloated.c"
+    debloated.write_text(C_SOURCE)
+    plain = tmp_path / "src" / "plain.c"
+    plain.write_text("int b = 0;\n")
+
+    report = RunReport()
+    report.start_library("library", "C")
+    run_files(CResourceDebloater, [debloated, plain], {"Variant_A"}, report=report)
+    report.finish_library(1.0)
+
+    rows = report.libraries[0]["files"]
+    assert rows[0]["status"] == "debloated"
+    assert rows[0]["lines_before"] == 16
+    assert rows[0]["lines_after"] == len(debloated.read_text().splitlines())
+    assert rows[0]["bytes_after"] == debloated.stat().st_size
+    assert rows[0]["annotations_found"] == 5
+    assert rows[0]["processed_by_construct"] == {"FunctionDefinition": 1, "Segment": 1, "Statement": 1}
+    assert rows[0]["annotations_failed"] == 1
+    assert rows[0]["annotations_skipped"] == 1
+    assert rows[1]["status"] == "skipped"
+    assert rows[1]["bytes_before"] == rows[1]["bytes_after"] == plain.stat().st_size
+    assert rows[0]["memory_bytes"] > rows[0]["bytes_before"]
+    assert rows[1]["memory_bytes"] is None
+
+    totals = RunReport.library_totals(report.libraries[0])
+    assert totals["files"] == 2
+    assert totals["skipped"] == 1
+    assert totals["annotations_processed"] == 3
+    assert totals["wall_seconds"] == 1.0
+    assert totals["peak_memory_bytes"] == rows[0]["memory_bytes"]
+
+    written = report.write(str(tmp_path), "both")
+    assert [path.split("/")[-1] for path in written] == ["report.json", "report_files.csv", "report_libraries.csv"]
+    assert json.loads((tmp_path / "report.json").read_text())["libraries"][0]["totals"]["debloated"] == 1
+    with open(tmp_path / "report_files.csv", newline="") as report_file:
+        csv_rows = list(csv.DictReader(report_file))
+    assert csv_rows[0]["processed_Segment"] == "1"
+    assert csv_rows[1]["processed_Segment"] == "0"
+
+
+def test_python_annotation_counts(tmp_path):
+    file = tmp_path / "module.py"
+    file.write_text(PYTHON_SOURCE)
+    debloater = PythonResourceDebloater(str(file), {"Variant_A"})
+    debloater.read_from_disk()
+    debloater.debloat()
+
+    assert debloater.annotations_found == 3
+    assert dict(debloater.annotations_processed) == {"Segment": 1, "Statement": 1, "FunctionDefinition": 1}
+    assert debloater.annotations_failed == 0
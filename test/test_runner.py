@@ -0,0 +1,69 @@
+"""Test cases for serial and parallel file debloating"""
+import logging
+
+import pytest
+
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.runner import run_files
+
+
+SOURCE = \
+"""
+int a = 1;
+///[Variant_A]
+a = 2;
+///[Variant_B]
+a = 3;
+"""
+
+EXPECTED = \
+"""
+int a = 1;
+/// Statement Debloated.
+
+///[Variant_B]
+a = 3;
+"""
+
+
+def make_tree(root, count):
+    root.mkdir(exist_ok=True)
+    files = []
+    for index in range(count):
+        file = root / f"file_{index}.c"
+        # Vary file sizes so scheduling order differs from discovery order
+        file.write_text(SOURCE + "\n" * index)
+        files.append(file)
+    return files
+
+
+def test_serial_matches_parallel(tmp_path):
+    serial_files = make_tree(tmp_path / "serial", 6)
+    parallel_files = make_tree(tmp_path / "parallel", 6)
+
+    run_files(CResourceDebloater, serial_files, {"Variant_A"}, jobs=1)
+    run_files(CResourceDebloater, parallel_files, {"Variant_A"}, jobs=3)
+
+    for index, (serial, parallel) in enumerate(zip(serial_files, parallel_files)):
+        assert serial.read_bytes() == parallel.read_bytes()
+        assert serial.read_text() == EXPECTED + "\n" * index
+
+
+def test_parallel_log_order(tmp_path, caplog):
+    files = make_tree(tmp_path, 5)
+    with caplog.at_level(logging.INFO):
+        run_files(CResourceDebloater, files, {"Variant_A"}, jobs=2)
+
+    processed = [record.getMessage() for record in caplog.records
+                 if record.getMessage().startswith("Processing file")]
+    assert processed == [f"Processing file: {file}" for file in files]
+
+
+def test_parallel_failure_cancels_pending_files(tmp_path):
+    # A directory cannot be read as a file; being larger than the files it is scheduled first
+    failing = tmp_path / "failing.c"
+    failing.mkdir()
+    files = make_tree(tmp_path / "tree", 200)
+    with pytest.raises(SystemExit):
+        run_files(CResourceDebloater, [failing] + files, {"Variant_A"}, jobs=2)
+    assert any(file.read_text().startswith(SOURCE) for file in files)
@@ -0,0 +1,67 @@
+"""Test cases for the debloating server"""
+import threading
+
+from carve.server import DebloatServer, DebloatService, send_request
+
+CONFIG = """
+Libraries:
+    - name: lib
+      locations:
+        - lib
+      language: C
+      extensions:
+        - c
+      debloatable_features:
+        Root:
+          - A
+          - B
+      debloat:
+        - A
+"""
+
+
+def make_library(tmp_path):
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "a.c").write_text("int a = 1;\n///[A]\na = 2;\n///[B]\na = 3;\n")
+    (tmp_path / "lib" / "b.c").write_text("int b;\n")
+    (tmp_path / "config.yaml").write_text(CONFIG)
+
+
+def test_service_reuses_files(tmp_path):
+    make_library(tmp_path)
+    service = DebloatService()
+    request = {"config": "config.yaml", "cwd": str(tmp_path), "output_dir": "out_a"}
+
+    response = service.debloat(request)
+    assert response["libraries"] == [{"name": "lib", "files": 2, "debloated": 1, "skipped": 1}]
+    assert (tmp_path / "out_a" / "lib" / "a.c").read_text() == \
+           "int a = 1;\n/// Statement Debloated.\n\n///[B]\na = 3;\n"
+
+    cached = service.files[str(tmp_path / "lib" / "a.c")]
+    service.debloat(dict(request, features=["B"], output_dir="out_b"))
+    assert service.files[str(tmp_path / "lib" / "a.c")] is cached
+    assert (tmp_path / "out_b" / "lib" / "a.c").read_text() == \
+           "int a = 1;\n///[A]\na = 2;\n/// Statement Debloated.\n\n"
+
+    # Debloating in place changes the file, so it is read again by the next request
+    service.debloat(dict(request, output_dir=None))
+    assert service.debloat(dict(request, output_dir=None))["libraries"][0]["debloated"] == 0
+    assert service.files[str(tmp_path / "lib" / "a.c")] is not cached
+
+
+def test_server_requests(tmp_path):
+    make_library(tmp_path)
+    socket_path = str(tmp_path / "carve.sock")
+    server = DebloatServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        response = send_request(socket_path, {"config": "config.yaml", "cwd": str(tmp_path), "features": ["C"]})
+        assert not response["ok"] and "C" in response["error"]
+        response = send_request(socket_path, {"config": "config.yaml", "cwd": str(tmp_path), "output_dir": "out"})
+        assert response["ok"] and response["libraries"][0]["debloated"] == 1
+        assert send_request(socket_path, {"command": "shutdown"}) == {"ok": True}
+    finally:
+        thread.join(10)
+        server.server_close()
+    assert not thread.is_alive()
@@ -0,0 +1,52 @@
+"""Test cases for the C switch table"""
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.resource_debloater.CSwitchTable import CSwitchTable
+from carve.resource_debloater.EditPlan import Edit, EditPlan
+
+LINES = ["switch (x) {\n",      # 0
+         "  case 1:\n",          # 1
+         "    a();\n",           # 2
+         "    break;\n",         # 3
+         "  ///[A]\n",           # 4
+         "  case 2:\n",          # 5
+         "    b();\n",           # 6
+         "  ///[A]\n",           # 7
+         "  case 3:\n",          # 8
+         "    c();\n",           # 9
+         "  default:\n",         # 10
+         "    d();\n",           # 11
+         "}\n"]                  # 12
+
+
+def make_table(lines=LINES):
+    return CSwitchTable(lines, CResourceDebloater.PREVIOUS_CASE_CLASSIFIER, CResourceDebloater.NEXT_CASE_CLASSIFIER)
+
+
+def test_switch_table_index():
+    table = make_table()
+    assert table.previous_lines == [0, 1, 3, 5, 8]
+    assert table.previous_constructs == ["Switch", "Case", "Break", "Case", "Case"]
+    assert table.next_lines == [1, 3, 5, 8, 10]
+
+
+def test_falls_through():
+    table = make_table()
+    assert table.falls_through(4) is False
+    assert table.falls_through(7) is True
+    assert make_table(["  case 1:\n"]).falls_through(0) is None
+
+    # Lines removed by earlier edits are looked past
+    plan = EditPlan()
+    plan.add([Edit(4, 7, [])])
+    assert table.falls_through(7, plan) is False
+    plan.add([Edit(1, 4, [])])
+    assert table.falls_through(7, plan) is False
+    assert table.falls_through(7, EditPlan()) is True
+
+
+def test_case_stop():
+    table = make_table()
+    assert table.case_stop(2, 12) == (3, True)
+    assert table.case_stop(6, 12) == (8, False)
+    assert table.case_stop(11, 12) == (12, False)
+    assert table.case_stop(11, None) is None
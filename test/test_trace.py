@@ -0,0 +1,80 @@
+"""Test cases for tracing debloating runs"""
+import json
+
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.resource_debloater.PythonResourceDebloater import PythonResourceDebloater
+from carve.runner import debloat_file, run_files
+from carve.trace import start_tracing, stop_tracing, trace_span, write_trace
+
+
+C_SOURCE = \
+"""
+int a = 1;
+///[Variant_A]
+a = 2;
+"""
+
+PYTHON_SOURCE = \
+"""a = 1
+###[Variant_A]~
+a = 2
+###~
+###[Variant_A]
+a = 3
+"""
+
+
+def make_tree(root, count):
+    root.mkdir()
+    files = []
+    for index in range(count):
+        file = root / f"file_{index}.c"
+        file.write_text(C_SOURCE)
+        files.append(file)
+    return files
+
+
+def test_no_events_without_tracing(tmp_path):
+    file = make_tree(tmp_path / "src", 1)[0]
+    result = debloat_file(CResourceDebloater, file, {"Variant_A"})
+    assert result.trace is None
+
+
+def test_file_and_stage_spans(tmp_path):
+    files = make_tree(tmp_path / "src", 3)
+
+    start_tracing()
+    try:
+        with trace_span("library", "library"):
+            run_files(CResourceDebloater, files, {"Variant_A"}, jobs=2)
+    finally:
+        events = stop_tracing()
+
+    file_spans = [event for event in events if event["cat"] == "file"]
+    assert sorted(event["args"]["path"] for event in file_spans) == sorted(str(file) for file in files)
+    for file_span in file_spans:
+        stages = {event["name"] for event in events if event["cat"] == "stage" and event["pid"] == file_span["pid"]
+                  and file_span["ts"] <= event["ts"] <= file_span["ts"] + file_span["dur"]}
+        assert {"read", "debloat", "write", "plan annotations", "apply edits"} <= stages
+    assert [event["name"] for event in events if event["cat"] == "library"] == ["library"]
+
+    path = tmp_path / "trace.json"
+    write_trace(str(path), events)
+    trace = json.loads(path.read_text())
+    assert min(event["ts"] for event in trace["traceEvents"] if event["ph"] == "X") == 0
+    assert any(event["ph"] == "M" and event["args"]["name"] == "carve" for event in trace["traceEvents"])
+
+
+def test_python_pass_spans(tmp_path):
+    file = tmp_path / "module.py"
+    file.write_text(PYTHON_SOURCE)
+
+    start_tracing()
+    try:
+        run_files(PythonResourceDebloater, [file], {"Variant_A"})
+    finally:
+        events = stop_tracing()
+
+    names = [event["name"] for event in events]
+    for name in ("explicit pass", "implicit pass", "parse", "transform", "codegen"):
+        assert names.count(name) == 1
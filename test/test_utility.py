@@ -0,0 +1,96 @@
+"""Test cases for the utility library"""
+import pytest
+
+from carve import utility
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.resource_debloater.PythonResourceDebloater import PythonResourceDebloater
+
+
+def test_file_contains(tmp_path):
+    file = tmp_path / "file.c"
+    file.write_text("int a = 1;\n///[Variant_A]\na = 2;\n")
+    assert utility.file_contains(file, b"///[")
+    assert not utility.file_contains(file, b"###[")
+
+
+def test_file_contains_empty(tmp_path):
+    file = tmp_path / "empty.c"
+    file.write_text("")
+    assert not utility.file_contains(file, b"///[")
+
+
+def test_file_contains_mmap(tmp_path, monkeypatch):
+    monkeypatch.setattr(utility, "MMAP_THRESHOLD", 16)
+    file = tmp_path / "large.c"
+    file.write_text("int a = 1;\n" * 100 + "///[Variant_A]\n")
+    assert utility.file_contains(file, b"///[")
+    assert not utility.file_contains(file, b"///~")
+
+
+def test_has_annotations(tmp_path):
+    c_file = tmp_path / "file.c"
+    c_file.write_text("///[Variant_A]\nint a = 1;\n")
+    py_file = tmp_path / "file.py"
+    py_file.write_text("# ///[Variant_A]\na = 1\n")
+    assert CResourceDebloater.has_annotations(c_file)
+    assert not PythonResourceDebloater.has_annotations(py_file)
+
+
+def test_write_file_atomic(tmp_path):
+    file = tmp_path / "file.c"
+    file.write_text("int a = 1;\n")
+    file.chmod(0o640)
+    utility.write_file_atomic(file, "int a = 2;\n")
+    assert file.read_text() == "int a = 2;\n"
+    assert file.stat().st_mode & 0o777 == 0o640
+    assert [path.name for path in tmp_path.iterdir()] == ["file.c"]
+
+
+def test_write_file_atomic_through_symlink(tmp_path):
+    (tmp_path / "real").mkdir()
+    target = tmp_path / "real" / "file.c"
+    target.write_text("int a = 1;\n")
+    link = tmp_path / "link.c"
+    link.symlink_to(target)
+    utility.write_file_atomic(link, "int a = 2;\n")
+    assert link.is_symlink()
+    assert target.read_text() == "int a = 2;\n"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["link.c", "real"]
+    assert [path.name for path in (tmp_path / "real").iterdir()] == ["file.c"]
+
+
+HIERARCHY = {
+    "Variant_RTU": {
+        "RTU_Read": ["RTU_Read_Bits", "RTU_Read_Registers"],
+        "RTU_Write": ["RTU_Write_Bit"],
+    },
+    "Variant_TCP": {
+        "TCP_Read": ["TCP_Read_Bits"],
+    },
+}
+
+
+def test_compile_hierarchy():
+    index = utility.compile_hierarchy(HIERARCHY)
+    assert index["Variant_RTU"] == {"Variant_RTU", "RTU_Read", "RTU_Read_Bits", "RTU_Read_Registers",
+                                    "RTU_Write", "RTU_Write_Bit"}
+    assert index["RTU_Read"] == {"RTU_Read", "RTU_Read_Bits", "RTU_Read_Registers"}
+    assert index["TCP_Read_Bits"] == {"TCP_Read_Bits"}
+    assert "Variant_Other" not in index
+
+
+def test_compile_hierarchy_matches_search():
+    index = utility.compile_hierarchy(HIERARCHY)
+    for feature in index:
+        assert index[feature] == set(utility.search_hierarchy(feature, HIERARCHY)) | {feature}
+
+
+def test_compile_hierarchy_duplicate():
+    hierarchy = {"Variant_RTU": {"Read": ["Read_Bits"]}, "Variant_TCP": {"Read": ["TCP_Read_Bits"]}}
+    with pytest.raises(ValueError):
+        utility.compile_hierarchy(hierarchy)
+
+
+def test_compile_hierarchy_duplicate_leaf():
+    with pytest.raises(ValueError):
+        utility.compile_hierarchy({"Variant_RTU": ["Read_Bits", "Read_Bits"]})
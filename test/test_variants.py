@@ -0,0 +1,75 @@
+"""Test cases for debloating libraries into variants"""
+import os
+
+import pytest
+
+from carve.resource_debloater.CResourceDebloater import CResourceDebloater
+from carve.resource_debloater.PythonResourceDebloater import PythonResourceDebloater
+from carve.utility import compile_hierarchy
+from carve.variants import Variant, load_variants, run_variants
+
+
+def test_load_variants(tmp_path):
+    hierarchy_index = compile_hierarchy({"Root": ["A", "B"]})
+    variants = load_variants([{"name": "all", "debloat": ["Root"]},
+                              {"name": "a", "debloat": ["A"], "output": str(tmp_path / "a")}],
+                             hierarchy_index, str(tmp_path / "variants"))
+    assert variants == [Variant("all", {"Root", "A", "B"}, tmp_path / "variants" / "all"),
+                        Variant("a", {"A"}, tmp_path / "a")]
+
+    with pytest.raises(ValueError):
+        load_variants([{"name": "a", "debloat": ["A"]}, {"name": "a", "debloat": ["B"]}], hierarchy_index, "")
+    with pytest.raises(KeyError):
+        load_variants([{"name": "c", "debloat": ["C"]}], hierarchy_index, "")
+
+
+def test_run_variants(tmp_path):
+    library = tmp_path / "lib"
+    library.mkdir()
+    (library / "a.c").write_text("int a = 1;\n///[A]\na = 2;\n///[B]\na = 3;\n")
+    (library / "b.c").write_text("int b;\n")
+    (library / "Makefile").write_text("all:\n")
+
+    variants = [Variant("a", {"A"}, tmp_path / "out_a"), Variant("ab", {"A", "B"}, tmp_path / "out_ab"),
+                Variant("a_and_c", {"A", "C"}, tmp_path / "out_a_and_c")]
+    summary = run_variants(CResourceDebloater, [str(library)], ["c"], variants)
+    assert (summary.files, summary.debloated) == (3, 2)
+
+    assert (tmp_path / "out_a" / "lib" / "a.c").read_text() == \
+           "int a = 1;\n/// Statement Debloated.\n\n///[B]\na = 3;\n"
+    assert (tmp_path / "out_ab" / "lib" / "a.c").read_text() == \
+           "int a = 1;\n/// Statement Debloated.\n\n/// Statement Debloated.\n\n"
+    assert os.path.samefile(tmp_path / "out_a" / "lib" / "a.c", tmp_path / "out_a_and_c" / "lib" / "a.c")
+    assert (tmp_path / "out_ab" / "lib" / "Makefile").read_text() == "all:\n"
+    # The library itself is left untouched, and its unchanged files are linked into the output trees
+    assert (library / "a.c").read_text() == "int a = 1;\n///[A]\na = 2;\n///[B]\na = 3;\n"
+    assert os.path.samefile(library / "b.c", tmp_path / "out_a" / "lib" / "b.c")
+
+
+def test_run_variants_overlapping_locations(tmp_path):
+    library = tmp_path / "lib"
+    (library / "src").mkdir(parents=True)
+    (library / "src" / "a.c").write_text("int a = 1;\n///[A]\na = 2;\n")
+    (library / "b.c").write_text("int b;\n")
+
+    variants = [Variant("a", {"A"}, tmp_path / "out_a")]
+    summary = run_variants(CResourceDebloater, [str(library), str(library / "src"), str(library)], ["c"], variants)
+    assert (summary.files, summary.debloated) == (2, 1)
+    assert (tmp_path / "out_a" / "lib" / "src" / "a.c").read_text() == "int a = 1;\n/// Statement Debloated.\n\n"
+    assert sorted(path.name for path in (tmp_path / "out_a").iterdir()) == ["lib"]
+
+
+def test_python_variants_share_parse(tmp_path):
+    file = tmp_path / "file.py"
+    file.write_text("import os\n###[A]\nx = 1\n###[B]\ny = 2\n")
+    debloater = PythonResourceDebloater(file, set())
+    debloater.read_from_disk()
+
+    first = debloater.with_features({"A"})
+    second = debloater.with_features({"B"})
+    first.debloat()
+    second.debloat()
+    assert "x = 1" not in first.get_code() and "y = 2" in first.get_code()
+    assert "x = 1" in second.get_code() and "y = 2" not in second.get_code()
+    assert debloater.source == file.read_text()
+    assert debloater._module is not None
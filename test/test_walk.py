@@ -0,0 +1,62 @@
+"""Test cases for walking a library's locations"""
+import os
+
+from carve.walk import FileWalker, glob_regex, library_filters
+
+
+def make_tree(root, paths):
+    for path in paths:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text("")
+
+
+def relative_files(walker, root, locations=None):
+    return sorted(path.relative_to(root).as_posix() for path in walker.files(locations or [str(root)]))
+
+
+def test_glob_regex():
+    assert glob_regex("*.c").fullmatch("src/a.c")
+    assert not glob_regex("/*.c").fullmatch("src/a.c")
+    assert glob_regex("src/**/*.h").fullmatch("src/a.h")
+    assert glob_regex("src/**/*.h").fullmatch("src/x/y/a.h")
+    assert not glob_regex("src/*.h").fullmatch("src/x/a.h")
+    assert glob_regex("vendor/**").fullmatch("vendor/x/a.c")
+    assert glob_regex("a[!b].c").fullmatch("ac.c") and not glob_regex("a[!b].c").fullmatch("ab.c")
+
+
+def test_exclude_and_include(tmp_path):
+    make_tree(tmp_path, ["a.c", "a.h", "Makefile", "build/gen.c", "src/b.c", "src/test/t.c", "third_party/c.c",
+                         "third_party/keep/d.c"])
+
+    assert relative_files(FileWalker(["c"]), tmp_path) == \
+           ["a.c", "build/gen.c", "src/b.c", "src/test/t.c", "third_party/c.c", "third_party/keep/d.c"]
+    walker = FileWalker(["c", "h"], exclude=["build/", "test", "/third_party/*", "!/third_party/keep/"])
+    assert relative_files(walker, tmp_path) == ["a.c", "a.h", "src/b.c", "third_party/keep/d.c"]
+    assert relative_files(FileWalker(["c"], include=["src", "*/keep/*.c"]), tmp_path) == \
+           ["src/b.c", "src/test/t.c", "third_party/keep/d.c"]
+
+
+def test_gitignore(tmp_path):
+    make_tree(tmp_path, ["a.c", "gen.c", ".git/hooks/h.c", "out/o.c", "sub/b.c", "sub/skip.c", "sub/gen.c"])
+    (tmp_path / ".gitignore").write_text("# generated\ngen.c\nout/\n")
+    (tmp_path / "sub" / ".gitignore").write_text("/skip.c\n!gen.c\n")
+
+    assert relative_files(FileWalker(["c"], gitignore=True), tmp_path) == ["a.c", "sub/b.c", "sub/gen.c"]
+    assert len(FileWalker(["c"]).files([str(tmp_path)])) == 7
+
+
+def test_overlapping_locations(tmp_path):
+    make_tree(tmp_path, ["lib/a.c", "lib/src/b.c"])
+    os.symlink(tmp_path / "lib", tmp_path / "lib" / "src" / "loop")
+
+    walker = FileWalker(["c"])
+    assert relative_files(walker, tmp_path, [str(tmp_path / "lib" / "src"), str(tmp_path / "lib")]) == \
+           ["lib/a.c", "lib/src/b.c"]
+    assert relative_files(walker, tmp_path, [str(tmp_path / "lib"), str(tmp_path / "lib")]) == \
+           ["lib/a.c", "lib/src/b.c"]
+
+
+def test_library_filters():
+    assert library_filters({"name": "lib", "extensions": ["c"]}) is None
+    assert library_filters({"exclude": ["build/"], "gitignore": True, "include": []}) == \
+           {"exclude": ["build/"], "gitignore": True}